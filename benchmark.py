@@ -0,0 +1,463 @@
+"""
+    Benchmark de punta a punta del pipeline de estacionamiento.
+
+    Mide cada etapa (layout, calc_diff por bbox y por mascara, empty_or_not por spot y en
+    lote, recorte y clasificacion en un pool de hilos, recorte rectificado con remap, dibujo
+    y deteccion de movimiento) sobre frames reproducidos, para varias cantidades de spots y
+    resoluciones, y escribe los resultados en JSON para comparar versiones.
+
+    Con --startup mide el tiempo hasta el primer frame procesado de un punto de entrada
+    (proceso nuevo, --max-frames 1) y desglosa sus imports con `python -X importtime`;
+    termina con codigo 1 si la mediana supera --startup-budget.
+
+    Ejemplos:
+        python benchmark.py --spots 50,500,5000 --resolutions 1280x720,1920x1080 --json bench.json
+        python benchmark.py --mask mask.png --source grabacion.mp4 --frames 60
+        python benchmark.py --accuracy dataset/ --stages ''
+        python benchmark.py --spots 5000 --stages classify_threads --threads 1,4,8,16
+        python benchmark.py --startup parking_manager3 --model model.npz --startup-budget 1.5 --stages ''
+    """
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from frame_source import open_source, SPEED_FAST
+from motion_detector import MotionDetector
+from synthetic import SyntheticLot, SyntheticSource
+
+STAGES = ('layout', 'calc_diff', 'mask_diff', 'empty_or_not', 'empty_or_not_batch', 'classify_threads',
+          'warp_crops', 'draw', 'motion')
+STARTUP_ENTRIES = ('parking_manager3', 'parking_manager')
+
+
+def _maxrss_mb(maxrss):
+    # Linux reporta KiB, macOS bytes
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def peak_rss_mb():
+    """Pico de RSS de todo el proceso desde que arranco (no baja entre etapas)."""
+    if resource is None:
+        return None
+    return _maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _proc_status_mb(field):
+    # VmRSS / VmHWM de /proc/self/status (Linux), en MB
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def memory_baseline():
+    """
+    Punto de partida para medir la memoria de una etapa; se pasa a summarize().
+
+    ru_maxrss es el pico de toda la vida del proceso y no baja entre etapas. En Linux el pico
+    (VmHWM) se reinicia al RSS actual escribiendo 5 en /proc/self/clear_refs, asi que la
+    base es el RSS actual; en otros sistemas es el pico hasta ahora y rss_growth_mb solo
+    indica cuanto lo supero la etapa.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return ('hwm', _proc_status_mb('VmRSS'))
+    except OSError:
+        return ('maxrss', peak_rss_mb())
+
+
+def rss_growth_mb(baseline):
+    kind, start = baseline
+    end = _proc_status_mb('VmHWM') if kind == 'hwm' else peak_rss_mb()
+    if start is None or end is None:
+        return None
+    return max(end - start, 0.0)
+
+
+def git_version():
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def time_calls(fn, inputs, repeat=1, warmup=True):
+    """
+    Ejecuta fn sobre cada entrada y devuelve las latencias en segundos. Antes hay una llamada
+    sin medir (carga perezosa del modelo, primeras llamadas de OpenCV / NumPy).
+    """
+    if warmup and len(inputs):
+        fn(inputs[0])
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            t0 = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t0)
+    return np.asarray(latencies)
+
+
+def summarize(stage, latencies, items_per_call, baseline=None, **info):
+    # baseline: memory_baseline() tomado antes de la etapa; rss_growth_mb es el pico de RSS
+    # durante la etapa por encima del RSS al empezarla
+    total = float(latencies.sum())
+    return {
+        'stage': stage,
+        **info,
+        'calls': int(len(latencies)),
+        'items_per_call': items_per_call,
+        'throughput_per_s': (len(latencies) * items_per_call / total) if total > 0 else None,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'rss_growth_mb': rss_growth_mb(baseline) if baseline is not None else None,
+    }
+
+
+def synthetic_case(n_spots, resolution, n_frames, seed=0):
+    """Genera mascara y frames sinteticos, reescalados a la resolucion pedida."""
+    # Mucho movimiento para que calc_diff y la reclasificacion tengan trabajo
+    lot = SyntheticLot(n_spots, arrival_rate=n_spots / 20, departure_rate=0.05, seed=seed)
+    mask, frames = lot.mask, [f for _, f in SyntheticSource(lot, n_frames)]
+    if resolution is not None:
+        mask = cv2.resize(mask, resolution, interpolation=cv2.INTER_NEAREST)
+        frames = [cv2.resize(f, resolution, interpolation=cv2.INTER_AREA) for f in frames]
+    return mask, frames
+
+
+def recorded_case(mask_path, source, n_frames):
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise IOError(f"No se pudo leer la mascara {mask_path}")
+    cap = open_source(source, SPEED_FAST)
+    frames = []
+    for _, frame in cap:
+        frames.append(frame)
+        if len(frames) >= n_frames:
+            break
+    cap.release()
+    if frames and frames[0].shape[:2] != mask.shape:
+        mask = cv2.resize(mask, (frames[0].shape[1], frames[0].shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask, frames
+
+
+def run_case(mask, frames, stages, info, repeat=1, threads=(1,), chunk_size=None):
+    from parking_manager3 import MaskDiff, calc_diff, draw_status, spots_to_check
+    from spot_warp import SpotWarper, get_parking_spots_quads
+    from util import (CHUNK_SIZE, classify_crops, empty_or_not, empty_or_not_batch, extract_crops, get_model,
+                      get_parking_spots_bboxes)
+
+    results = []
+
+    def components(m):
+        _, binary_mask = cv2.threshold(m, 127, 255, cv2.THRESH_BINARY)
+        return cv2.connectedComponentsWithStats(binary_mask, connectivity=4, ltype=cv2.CV_32S)
+
+    def layout(m):
+        return get_parking_spots_bboxes(components(m))
+
+    spots = layout(mask)
+    info = dict(info, spots=len(spots), resolution=f'{mask.shape[1]}x{mask.shape[0]}', frames=len(frames))
+    print(f"{info['spots']} spots, {info['resolution']}, {len(frames)} frames", file=sys.stderr)
+
+    if 'layout' in stages:
+        base = memory_baseline()
+        results.append(summarize('layout', time_calls(layout, [mask] * max(1, repeat * 5)), len(spots), base, **info))
+
+    if 'calc_diff' in stages and len(frames) > 1:
+        base = memory_baseline()
+        diffs = [0.0] * len(spots)
+        pairs = list(zip(frames[1:], frames[:-1]))
+        lat = time_calls(lambda p: spots_to_check(p[0], p[1], spots, diffs), pairs, repeat)
+        results.append(summarize('calc_diff', lat, len(spots), base, **info))
+
+    if 'mask_diff' in stages and len(frames) > 1:
+        base = memory_baseline()
+        # Como en parking_manager3: las medias del ciclo anterior quedan guardadas
+        mask_diff = MaskDiff(components(mask)[1], len(spots))
+        diffs = np.zeros(len(spots))
+        spots_to_check(frames[0], None, spots, diffs, mask_diff)
+        lat = time_calls(lambda f: spots_to_check(f, None, spots, diffs, mask_diff), frames[1:], repeat)
+        results.append(summarize('mask_diff', lat, len(spots), base, **info))
+
+    if 'empty_or_not' in stages:
+        base = memory_baseline()
+        def per_spot(frame):
+            for x, y, w, h in spots:
+                empty_or_not(frame[y:y + h, x:x + w])
+        lat = time_calls(per_spot, frames[:max(1, len(frames) // 10)], repeat)
+        results.append(summarize('empty_or_not', lat, len(spots), base, **info))
+
+    if 'empty_or_not_batch' in stages:
+        base = memory_baseline()
+        def batched(frame):
+            empty_or_not_batch([frame[y:y + h, x:x + w] for x, y, w, h in spots])
+        lat = time_calls(batched, frames[:max(1, len(frames) // 10)], repeat)
+        results.append(summarize('empty_or_not_batch', lat, len(spots), base, **info))
+
+    if 'classify_threads' in stages:
+        # Mismo trabajo que classify_spots con --threads; 1 hilo = sin pool, como referencia
+        model = get_model()
+        chunk_size = chunk_size or CHUNK_SIZE
+        baseline = None
+        for n in threads:
+            base = memory_baseline()
+            pool = ThreadPoolExecutor(n) if n > 1 else None
+
+            def pooled(frame):
+                classify_crops(model, extract_crops(frame, spots, pool, chunk_size), pool, chunk_size)
+            lat = time_calls(pooled, frames[:max(1, len(frames) // 10)], repeat)
+            if pool is not None:
+                pool.shutdown()
+            result = summarize(f'classify_threads:{n}', lat, len(spots), base, threads=n, chunk_size=chunk_size, **info)
+            baseline = baseline or result['mean_ms']
+            result['speedup'] = baseline / result['mean_ms']
+            print(f"    {n:>3} hilos: {result['mean_ms']:.1f} ms, x{result['speedup']:.2f}", file=sys.stderr)
+            results.append(result)
+
+    if 'warp_crops' in stages:
+        base = memory_baseline()
+        # Mapas precalculados una vez (se reporta aparte) y un remap por lote de spots
+        t0 = time.perf_counter()
+        warper = SpotWarper(get_parking_spots_quads(components(mask)))
+        build_s = time.perf_counter() - t0
+        # Como classify_spots: con la lista de spots a reverificar (aqui todos), no indices=None
+        indices = list(range(len(spots)))
+        lat = time_calls(lambda f: warper.extract(f, indices), frames, repeat)
+        result = summarize('warp_crops', lat, len(spots), base, **info)
+        result['maps_build_ms'] = build_s * 1000
+        result['supersample'] = warper.supersample
+        results.append(result)
+        base = memory_baseline()
+        lat = time_calls(lambda f: extract_crops(f, spots), frames, repeat)
+        bbox = summarize('bbox_crops', lat, len(spots), base, **info)
+        results.append(bbox)
+
+    if 'draw' in stages:
+        canvases = [f.copy() for f in frames]  # la copia no es parte de la etapa
+        base = memory_baseline()
+        status = [i % 2 == 0 for i in range(len(spots))]
+        lat = time_calls(lambda f: draw_status(f, spots, status), canvases, repeat)
+        results.append(summarize('draw', lat, len(spots), base, **info))
+
+    if 'motion' in stages:
+        base = memory_baseline()
+        h, w = frames[0].shape[:2]
+        detector = MotionDetector(w, h)
+        lat = time_calls(detector.detect, frames, repeat)
+        results.append(summarize('motion', lat, 1, base, **info))
+
+    return results
+
+
+def accuracy_case(dataset_path, batch_size=4096):
+    """Exactitud y rendimiento de empty_or_not_batch sobre un dataset de recortes etiquetados."""
+    from dataset_store import CropDataset
+    from util import empty_or_not_batch
+
+    base = memory_baseline()
+    dataset = CropDataset.open(dataset_path)
+    confusion = np.zeros((2, 2), dtype=np.int64)  # [real, predicho], 0 = vacio
+    latencies = []
+    for crops, labels in dataset.iter_batches(batch_size):
+        t0 = time.perf_counter()
+        empty = empty_or_not_batch(crops)
+        latencies.append(time.perf_counter() - t0)
+        np.add.at(confusion, (labels.astype(np.intp), (~empty).astype(np.intp)), 1)
+
+    result = summarize('accuracy', np.asarray(latencies), len(dataset) / max(len(latencies), 1), base,
+                       case=dataset_path, spots=len(dataset), resolution='-', frames=0)
+    result['accuracy'] = float(np.trace(confusion) / max(confusion.sum(), 1))
+    result['confusion'] = confusion.tolist()
+    print(f"Exactitud {result['accuracy']:.4f} sobre {len(dataset)} recortes, confusion [real][predicho]: "
+          f"{result['confusion']}", file=sys.stderr)
+    return result
+
+
+def parse_importtime(stderr):
+    """Imports de primer nivel de `-X importtime` como [(modulo, segundos acumulados)], de mayor a menor."""
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith(' ') or name.startswith('  '):
+            continue  # solo los imports directos del punto de entrada, no sus dependencias
+        top.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(top, key=lambda item: item[1], reverse=True)
+
+
+def startup_case(entry, mask_path, source, model=None, runs=5):
+    """
+    Tiempo de pared desde el lanzamiento del proceso hasta terminar el primer frame.
+
+    Cada corrida es un proceso nuevo con --max-frames 1; una corrida extra con -X importtime
+    da el desglose de imports (no se cuenta en los tiempos porque agrega su propio costo).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [os.path.join(here, entry + '.py'),
+           '--source', source, '--speed', SPEED_FAST, '--headless', '--max-frames', '1']
+    if entry == 'parking_manager3':
+        cmd += ['--mask', mask_path] + (['--model', model] if model else [])
+
+    latencies, peaks = [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        if hasattr(os, 'wait4'):
+            # wait4 da el ru_maxrss de esta corrida; RUSAGE_CHILDREN seria el maximo de todos los hijos
+            proc = subprocess.Popen([sys.executable] + cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    cwd=here)
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+            _, status, usage = os.wait4(proc.pid, 0)
+            latencies.append(time.perf_counter() - t0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=stderr)
+            peaks.append(_maxrss_mb(usage.ru_maxrss))
+        else:
+            subprocess.run([sys.executable] + cmd, check=True, capture_output=True, cwd=here)
+            latencies.append(time.perf_counter() - t0)
+
+    out = subprocess.run([sys.executable, '-X', 'importtime'] + cmd, check=True, capture_output=True, text=True,
+                         cwd=here)
+    imports = parse_importtime(out.stderr)
+
+    result = summarize(f'startup:{entry}', np.asarray(latencies), 1, case=entry, spots='-', resolution='-', frames=1)
+    result['peak_rss_mb'] = max(peaks) if peaks else None  # del proceso hijo, no una diferencia
+    result['import_s'] = sum(seconds for _, seconds in imports)
+    result['imports'] = [{'module': name, 'cumulative_s': seconds} for name, seconds in imports]
+    print(f"{entry}: primer frame en {result['p50_ms']:.0f} ms (mediana de {runs}), "
+          f"imports {result['import_s'] * 1000:.0f} ms", file=sys.stderr)
+    for name, seconds in imports[:8]:
+        print(f"    {seconds * 1000:8.1f} ms  {name}", file=sys.stderr)
+    return result
+
+
+def parse_resolutions(text):
+    if not text:
+        return [None]
+    return [tuple(int(v) for v in r.lower().split('x')) for r in text.split(',')]
+
+
+def print_table(results):
+    # +RSS: cuanto subio el RSS durante la etapa sobre el de su inicio; en startup, pico del proceso hijo
+    print(f"{'stage':<26}{'spots':>7}{'resolution':>12}{'calls':>7}{'items/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'+RSS MB':>9}")
+    for r in results:
+        rss = r['peak_rss_mb'] if 'peak_rss_mb' in r else r['rss_growth_mb']
+        rss = f"{rss:.0f}" if rss is not None else '-'
+        print(f"{r['stage']:<26}{r['spots']:>7}{r['resolution']:>12}{r['calls']:>7}"
+              f"{r['throughput_per_s'] or 0:>12.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{rss:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de estacionamiento")
+    parser.add_argument('--spots', default='50,500,5000', help='Cantidades de spots sinteticos, separadas por coma')
+    parser.add_argument('--resolutions', default='',
+                        help='Resoluciones WxH separadas por coma (por defecto la nativa del layout sintetico)')
+    parser.add_argument('--frames', type=int, default=30, help='Frames por caso')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--stages', default=','.join(STAGES), help='Etapas a medir')
+    parser.add_argument('--threads', default='1,4,8,16', help='Cantidades de hilos para classify_threads')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Spots por bloque para classify_threads')
+    parser.add_argument('--mask', help='Mascara real (junto con --source en lugar de datos sinteticos)')
+    parser.add_argument('--source', help='Video o directorio de imagenes grabado')
+    parser.add_argument('--accuracy', help='Dataset de recortes (dataset_store) para medir la exactitud del clasificador')
+    parser.add_argument('--startup', help=f"Puntos de entrada a medir desde el arranque ({', '.join(STARTUP_ENTRIES)})")
+    parser.add_argument('--startup-budget', type=float, default=None,
+                        help='Segundos maximos hasta el primer frame (mediana); si se supera, sale con codigo 1')
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--model', help='Modelo para parking_manager3 en --startup (p. ej. model.npz)')
+    parser.add_argument('--json', help='Archivo donde escribir los resultados')
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Etapas desconocidas: {', '.join(sorted(unknown))}")
+
+    threads = [int(n) for n in args.threads.split(',') if n]
+    entries = [e for e in (args.startup or '').split(',') if e]
+    unknown = set(entries) - set(STARTUP_ENTRIES)
+    if unknown:
+        parser.error(f"Puntos de entrada desconocidos: {', '.join(sorted(unknown))}")
+
+    results = []
+    if args.accuracy:
+        results.append(accuracy_case(args.accuracy))
+
+    over_budget = []
+    if entries:
+        with tempfile.TemporaryDirectory() as tmp:
+            mask_path, source = args.mask, args.source
+            if not (mask_path and source):
+                # Layout sintetico pequeño: lo que se mide es el arranque, no el volumen de spots
+                lot = SyntheticLot(200, seed=0)
+                mask_path, source = os.path.join(tmp, 'mask.png'), os.path.join(tmp, 'frames')
+                os.makedirs(source)
+                cv2.imwrite(mask_path, lot.mask)
+                for i, (_, frame) in enumerate(SyntheticSource(lot, 2)):
+                    cv2.imwrite(os.path.join(source, f'{i:06d}.png'), frame)
+            for entry in entries:
+                result = startup_case(entry, mask_path, source, args.model, args.startup_runs)
+                result['budget_s'] = args.startup_budget
+                results.append(result)
+                if args.startup_budget is not None and result['p50_ms'] / 1000 > args.startup_budget:
+                    over_budget.append(entry)
+
+    if stages and (args.mask or args.source):
+        if not (args.mask and args.source):
+            parser.error("--mask y --source van juntos")
+        mask, frames = recorded_case(args.mask, args.source, args.frames)
+        results += run_case(mask, frames, stages, {'case': args.source}, args.repeat, threads, args.chunk_size)
+    elif stages:
+        for n_spots in (int(n) for n in args.spots.split(',')):
+            for resolution in parse_resolutions(args.resolutions):
+                mask, frames = synthetic_case(n_spots, resolution, args.frames)
+                results += run_case(mask, frames, stages, {'case': 'synthetic'}, args.repeat, threads, args.chunk_size)
+
+    print_table(results)
+
+    if args.json:
+        report = {
+            'version': git_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if over_budget:
+        print(f"Arranque por encima de {args.startup_budget} s: {', '.join(over_budget)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,4 @@
 import cv2
-import pyautogui
 
 def mostrar_camaras(camara1=0, camara2=1):
     """
@@ -21,6 +20,7 @@ def mostrar_camaras(camara1=0, camara2=1):
     width1 = int(cap1.get(cv2.CAP_PROP_FRAME_WIDTH))
     height1 = int(cap1.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
+    import pyautogui  # solo para centrar las ventanas; arrastra todo su arbol de dependencias
     screen_width, screen_height = pyautogui.size()
 
     total_width = width1 * 2
@@ -0,0 +1,188 @@
+"""
+    Almacen de datasets de recortes de spots que no necesitan caber en RAM.
+
+    Un dataset es un directorio con:
+        info.json   - forma de los recortes, cantidad y capacidad
+        crops.u8    - recortes uint8 de tamaño fijo (capacidad x 15 x 15 x 3) en un memmap
+        labels.u8   - etiqueta de cada recorte (0 = vacio, 1 = ocupado, como predice el modelo)
+        meta.csv    - tabla de metadatos: indice, sitio, frame y spot de origen
+    """
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from util import CROP_SIZE
+
+INFO_FILE = 'info.json'
+CROPS_FILE = 'crops.u8'
+LABELS_FILE = 'labels.u8'
+META_FILE = 'meta.csv'
+META_FIELDS = ('index', 'site', 'frame', 'spot')
+
+MIN_CAPACITY = 1024
+
+
+class CropDataset:
+    """
+    Dataset de recortes en memmap con soporte para agregar y lecturas aleatorias por lote.
+
+    Se abre con CropDataset.create() o CropDataset.open(). `crops` y `labels` son vistas
+    memmap de las primeras `len(dataset)` filas.
+    """
+
+    def __init__(self, path, crop_shape, count, capacity, mode):
+        self.path = path
+        self.crop_shape = tuple(crop_shape)
+        self.count = count
+        self.capacity = capacity
+        self.mode = mode
+        self._map()
+
+    @classmethod
+    def create(cls, path, capacity=MIN_CAPACITY, crop_shape=CROP_SIZE):
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, INFO_FILE)):
+            raise FileExistsError(f"Ya existe un dataset en {path}")
+        capacity = max(int(capacity), 1)
+        row = int(np.prod(crop_shape))
+        for name, size in ((CROPS_FILE, capacity * row), (LABELS_FILE, capacity)):
+            with open(os.path.join(path, name), 'wb') as f:
+                f.truncate(size)
+        with open(os.path.join(path, META_FILE), 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(META_FIELDS)
+        dataset = cls(path, crop_shape, 0, capacity, 'r+')
+        dataset._write_info()
+        return dataset
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        with open(os.path.join(path, INFO_FILE), encoding='utf-8') as f:
+            info = json.load(f)
+        return cls(path, info['crop_shape'], info['count'], info['capacity'], mode)
+
+    def _map(self):
+        self._crops = np.memmap(os.path.join(self.path, CROPS_FILE), dtype=np.uint8, mode=self.mode,
+                                shape=(self.capacity,) + self.crop_shape)
+        self._labels = np.memmap(os.path.join(self.path, LABELS_FILE), dtype=np.uint8, mode=self.mode,
+                                 shape=(self.capacity,))
+
+    def _write_info(self):
+        info = {'crop_shape': list(self.crop_shape), 'count': self.count, 'capacity': self.capacity}
+        tmp = os.path.join(self.path, INFO_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        os.replace(tmp, os.path.join(self.path, INFO_FILE))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def crops(self):
+        return self._crops[:self.count]
+
+    @property
+    def labels(self):
+        return self._labels[:self.count]
+
+    def reserve(self, capacity):
+        """Agranda los archivos (al menos al doble) para que quepan `capacity` recortes."""
+        if capacity <= self.capacity:
+            return
+        if self.mode == 'r':
+            raise IOError("Dataset abierto en solo lectura")
+        capacity = max(capacity, 2 * self.capacity)
+        self.flush()
+        del self._crops, self._labels
+        row = int(np.prod(self.crop_shape))
+        for name, size in ((CROPS_FILE, capacity * row), (LABELS_FILE, capacity)):
+            with open(os.path.join(self.path, name), 'r+b') as f:
+                f.truncate(size)
+        self.capacity = capacity
+        self._map()
+        self._write_info()
+
+    def append(self, crops, labels, site='', frames=None, spots=None):
+        """
+        Agrega recortes al final del dataset y devuelve los indices asignados.
+
+        crops (np.ndarray): (N, 15, 15, 3) uint8
+        labels (array): N etiquetas 0/1
+        site (str): Sitio de origen, comun a todo el lote
+        frames, spots (list): Frame y spot de origen de cada recorte (opcionales)
+        """
+        crops = np.asarray(crops, dtype=np.uint8).reshape((-1,) + self.crop_shape)
+        n = len(crops)
+        start = self.count
+        self.reserve(start + n)
+        self._crops[start:start + n] = crops
+        self._labels[start:start + n] = labels
+
+        frames = frames if frames is not None else [''] * n
+        spots = spots if spots is not None else [''] * n
+        with open(os.path.join(self.path, META_FILE), 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerows(zip(range(start, start + n), [site] * n, frames, spots))
+
+        self.count = start + n
+        self.flush()
+        self._write_info()
+        return np.arange(start, start + n)
+
+    def allocate(self, n):
+        """
+        Reserva `n` filas al final para que varios procesos las llenen con write_rows().
+
+        Devuelve el indice de la primera fila. Las filas no cuentan (ni se ven en info.json) hasta
+        commit(); si el llenado falla basta con no llamarlo. Los metadatos se escriben con append_meta().
+        """
+        self.reserve(self.count + n)
+        return self.count
+
+    def commit(self, start, n):
+        """Da por escritas las `n` filas reservadas con allocate() a partir de `start`."""
+        if start != self.count:
+            raise ValueError(f"Las filas reservadas empiezan en {start}, pero el dataset tiene {self.count}")
+        self.flush()
+        self.count = start + n
+        self._write_info()
+
+    def write_rows(self, rows, crops=None, labels=None):
+        if crops is not None:
+            self._crops[rows] = crops
+        if labels is not None:
+            self._labels[rows] = labels
+
+    def append_meta(self, rows, site, frames, spots):
+        with open(os.path.join(self.path, META_FILE), 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(zip(rows, [site] * len(rows), frames, spots))
+
+    def batch(self, indices):
+        """Lee un lote aleatorio; accede al disco en orden y devuelve en el orden pedido."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size and (indices.min() < 0 or indices.max() >= self.count):
+            raise IndexError("Indice fuera del dataset")
+        order = np.argsort(indices, kind='stable')
+        crops = np.empty((len(indices),) + self.crop_shape, dtype=np.uint8)
+        labels = np.empty(len(indices), dtype=np.uint8)
+        crops[order] = self._crops[indices[order]]
+        labels[order] = self._labels[indices[order]]
+        return crops, labels
+
+    def iter_batches(self, batch_size=4096, shuffle=False, seed=0):
+        indices = np.arange(self.count)
+        if shuffle:
+            np.random.default_rng(seed).shuffle(indices)
+        for start in range(0, self.count, batch_size):
+            yield self.batch(indices[start:start + batch_size])
+
+    def metadata(self):
+        with open(os.path.join(self.path, META_FILE), newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    def flush(self):
+        if self.mode != 'r':
+            self._crops.flush()
+            self._labels.flush()
@@ -0,0 +1,208 @@
+"""
+    Escritura de eventos de entrada / salida en segundo plano, por lotes.
+
+    El lazo de captura solo encola (BatchWriter.emit); un hilo de fondo junta hasta
+    batch_size eventos, o los que haya tras flush_interval segundos, y los escribe de una vez
+    en el destino (EventSink). La cola es acotada: con la politica 'drop' un destino lento
+    descarta eventos (y los cuenta) en lugar de frenar los frames; con 'block' el lazo espera.
+
+    Destinos (--event-sink):
+        console             las lineas [ENTRADA] / [SALIDA] de siempre (por defecto)
+        file:RUTA           JSON por linea
+        sqlite:RUTA         tabla events
+        tcp:HOST:PUERTO     JSON por linea sobre un socket, reconectando si se cae
+    """
+
+import json
+import logging
+import queue
+import sqlite3
+import socket
+import threading
+import time
+
+logger = logging.getLogger('parking.events')
+
+POLICIES = ('drop', 'block')
+_STOP = object()
+
+
+def _serializable(event):
+    return {k: v.isoformat() if hasattr(v, 'isoformat') else v for k, v in event.items()}
+
+
+class EventSink:
+    """Destino de eventos: write_batch recibe una lista de dicts ('tipo', 'slot', 'ts', ...)."""
+
+    def write_batch(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(EventSink):
+    def write_batch(self, events):
+        lines = []
+        for event in events:
+            if event['tipo'] == 'entrada':
+                lines.append(f"[ENTRADA] Carro en slot {event['slot']} a las {event['ts']}")
+            elif event['tipo'] == 'salida':
+                lines.append(f"[SALIDA] Slot {event['slot']} liberado a las {event['ts']}")
+            else:
+                lines.append(json.dumps(_serializable(event)))
+        print('\n'.join(lines), flush=True)
+
+
+class JsonlFileSink(EventSink):
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write_batch(self, events):
+        self._file.write(''.join(json.dumps(_serializable(e)) + '\n' for e in events))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink(EventSink):
+    def __init__(self, path):
+        self.path = path
+        self._db = None  # se abre en el hilo del escritor
+
+    def write_batch(self, events):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS events (ts TEXT, tipo TEXT, slot INTEGER, data TEXT)')
+        events = [_serializable(e) for e in events]
+        rows = [(e['ts'], e['tipo'], e.get('slot'), json.dumps(e)) for e in events]
+        with self._db:
+            self._db.executemany('INSERT INTO events VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+class SocketSink(EventSink):
+    """JSON por linea sobre TCP. Si la conexion falla, el lote se pierde y se reconecta en el siguiente."""
+
+    def __init__(self, host, port, timeout=5.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._sock = None
+
+    def write_batch(self, events):
+        data = ''.join(json.dumps(_serializable(e)) + '\n' for e in events).encode('utf-8')
+        try:
+            if self._sock is None:
+                self._sock = socket.create_connection(self.address, self.timeout)
+            self._sock.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def sink_from_spec(spec):
+    kind, _, target = spec.partition(':')
+    if kind == 'console':
+        return ConsoleSink()
+    if kind == 'file' and target:
+        return JsonlFileSink(target)
+    if kind == 'sqlite' and target:
+        return SqliteSink(target)
+    if kind == 'tcp' and target:
+        host, _, port = target.rpartition(':')
+        return SocketSink(host, int(port))
+    raise ValueError(f"Destino de eventos no valido: {spec!r} (console, file:RUTA, sqlite:RUTA, tcp:HOST:PUERTO)")
+
+
+class BatchWriter:
+    """
+    sink (EventSink): Destino
+    max_queue (int): Eventos encolados como maximo
+    policy (str): 'drop' descarta los eventos nuevos con la cola llena; 'block' espera lugar
+    batch_size (int): Eventos por escritura como maximo
+    flush_interval (float): Segundos maximos que un evento espera a completar su lote
+    """
+
+    def __init__(self, sink, max_queue=10000, policy='drop', batch_size=256, flush_interval=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Politica no valida: {policy} ({', '.join(POLICIES)})")
+        self.sink = sink
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Eventos en cola (aproximado, como Queue.qsize)."""
+        return self._queue.qsize()
+
+    def emit(self, event):
+        """Encola un evento; devuelve False si se descarto por la cola llena."""
+        if self.policy == 'block':
+            self._queue.put(event)
+            return True
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            event = self._queue.get()
+            if event is _STOP:
+                break
+            batch = [event]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            try:
+                self.sink.write_batch(batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("No se pudieron escribir %d eventos", len(batch))
+        # El destino se cierra en el mismo hilo que escribe (sqlite3 lo exige)
+        self.sink.close()
+
+    def close(self):
+        """Escribe lo que quede en la cola y cierra el destino."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def add_event_arguments(parser):
+    parser.add_argument('--event-sink', default='console',
+                        help='Destino de los eventos: console, file:RUTA, sqlite:RUTA o tcp:HOST:PUERTO')
+    parser.add_argument('--event-queue', type=int, default=10000, help='Eventos en cola como maximo')
+    parser.add_argument('--event-policy', choices=POLICIES, default='drop',
+                        help='Con la cola llena: descartar eventos (drop) o esperar (block)')
+    return parser
+
+
+def events_from_args(args):
+    return BatchWriter(sink_from_spec(args.event_sink), args.event_queue, args.event_policy)
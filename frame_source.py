@@ -0,0 +1,219 @@
+import os
+import time
+
+import cv2
+
+
+SPEED_NATIVE = "native"      # todos los frames al ritmo del archivo (fps nominal)
+SPEED_REALTIME = "realtime"  # reloj de pared: si el consumidor se atrasa se saltan frames, como una camara en vivo
+SPEED_FAST = "fast"          # tan rapido como se pueda, sin esperas ni saltos
+SPEEDS = (SPEED_NATIVE, SPEED_REALTIME, SPEED_FAST)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class FrameSource:
+    """
+    Fuente de frames con la misma interfaz que cv2.VideoCapture (read / release / isOpened).
+
+    Despues de cada read() exitoso `timestamp` guarda el tiempo del frame en segundos
+    (relativo al inicio de la fuente) y `dropped` cuantos frames se han saltado.
+
+    speed (str): SPEED_NATIVE, SPEED_REALTIME o SPEED_FAST
+    fps (float): Ritmo nominal de la fuente
+    loop (bool): Volver a empezar al llegar al final
+    """
+
+    def __init__(self, speed=SPEED_NATIVE, fps=30.0, loop=False):
+        if speed not in SPEEDS:
+            raise ValueError(f"Velocidad desconocida: {speed}")
+        self.speed = speed
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.loop = loop
+        self.timestamp = None
+        self.frames_read = 0
+        self.dropped = 0
+        self._index = 0
+        self._t0 = None
+
+    # --- A implementar por cada fuente ---
+    def _decode(self):
+        """Devuelve el siguiente frame o None al final."""
+        raise NotImplementedError
+
+    def _skip(self):
+        """Avanza un frame sin decodificarlo; False al final."""
+        return self._decode() is not None
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+    # --- Interfaz comun ---
+    def _next_frame(self):
+        frame = self._decode()
+        if frame is None and self.loop and self._index > 0:
+            self._rewind()
+            frame = self._decode()
+        return frame
+
+    def read(self):
+        if self.speed == SPEED_REALTIME and self._t0 is not None:
+            due = int((time.monotonic() - self._t0) * self.fps)
+            while self._index < due:
+                if not self._skip():
+                    if not self.loop:
+                        return False, None
+                    self._rewind()
+                    continue
+                self._index += 1
+                self.dropped += 1
+
+        frame = self._next_frame()
+        if frame is None:
+            return False, None
+
+        ts = self._index / self.fps
+        if self.speed != SPEED_FAST:
+            now = time.monotonic()
+            if self._t0 is None:
+                self._t0 = now - ts
+            delay = self._t0 + ts - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self._index += 1
+        self.frames_read += 1
+        self.timestamp = ts
+        return True, frame
+
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                return
+            yield self.timestamp, frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CameraSource(FrameSource):
+    """Camara en vivo; el ritmo lo marca el dispositivo y el timestamp es el reloj de pared."""
+
+    def __init__(self, index=0):
+        super().__init__(speed=SPEED_FAST)
+        self.cap = cv2.VideoCapture(index)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        now = time.monotonic()
+        if self._t0 is None:
+            self._t0 = now
+        self.timestamp = now - self._t0
+        self.frames_read += 1
+        return True, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Reproduce un archivo de video; fps se toma del archivo si no se indica."""
+
+    def __init__(self, path, speed=SPEED_NATIVE, fps=None, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"No se pudo abrir el video {path}")
+        super().__init__(speed, fps or self.cap.get(cv2.CAP_PROP_FPS), loop)
+
+    def _decode(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _skip(self):
+        return self.cap.grab()
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """Reproduce las imagenes de un directorio en orden alfabetico."""
+
+    def __init__(self, path, speed=SPEED_NATIVE, fps=None, loop=False):
+        self.path = path
+        self.files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise IOError(f"No hay imagenes en {path}")
+        self._pos = 0
+        super().__init__(speed, fps or 30.0, loop)
+
+    def _decode(self):
+        if self._pos >= len(self.files):
+            return None
+        frame = cv2.imread(self.files[self._pos], cv2.IMREAD_COLOR)
+        self._pos += 1
+        return frame
+
+    def _skip(self):
+        if self._pos >= len(self.files):
+            return False
+        self._pos += 1
+        return True
+
+    def _rewind(self):
+        self._pos = 0
+
+
+def open_source(spec=0, speed=SPEED_NATIVE, fps=None, loop=False):
+    """
+    Abre una fuente de frames a partir de una especificacion de linea de comandos.
+
+    spec (int | str): Indice de camara ("0", "1"...), ruta a un video o a un directorio de imagenes
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, speed, fps, loop)
+    return VideoFileSource(spec, speed, fps, loop)
+
+
+def add_source_arguments(parser):
+    """Agrega --source, --speed, --fps, --loop, --headless y --max-frames a un argparse.ArgumentParser."""
+    parser.add_argument('--source', default='0',
+                        help='Indice de camara, archivo de video o directorio de imagenes (por defecto 0)')
+    parser.add_argument('--speed', choices=SPEEDS, default=SPEED_NATIVE,
+                        help='Ritmo de reproduccion para videos/directorios')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='fps nominal (por defecto el del video, 30 para directorios)')
+    parser.add_argument('--loop', action='store_true', help='Repetir la grabacion al terminar')
+    parser.add_argument('--headless', action='store_true', help='No abrir ventanas (servidores sin pantalla)')
+    parser.add_argument('--max-frames', type=int, default=None, help='Detenerse despues de N frames')
+    return parser
+
+
+def source_from_args(args):
+    return open_source(args.source, args.speed, args.fps, args.loop)
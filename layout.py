@@ -0,0 +1,149 @@
+"""
+    Layout de spots independiente de la resolucion.
+
+    La mascara se analiza una sola vez: los bboxes y cuadrilateros de los spots se guardan
+    normalizados (0..1, con los bordes de pixel como referencia) junto con la imagen de
+    etiquetas original. Para cada resolucion que entregue la fuente de frames se arma un
+    ScaledLayout (bboxes, etiquetas reescaladas y las tablas derivadas: indice espacial,
+    mapas de remap, tablas de MaskDiff...) que queda en cache, de modo que cambiar de camara o
+    de stream no vuelve a leer mask.png ni a recalcular nada ya visto.
+    """
+
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+from spot_index import SpotIndex
+from spot_warp import SpotWarper, get_parking_spots_quads
+from util import get_parking_spots_bboxes
+
+
+class ScaledLayout:
+    """
+    El layout a una resolucion concreta. Las tablas derivadas se construyen al primer uso.
+
+    spots (list): Bboxes [x, y, w, h] en pixeles de esta resolucion
+    quads (np.ndarray): Cuadrilateros (N, 4, 2), con el centro de cada pixel en el entero
+    labels (np.ndarray): Imagen de etiquetas (spot i = etiqueta i + 1)
+    origin (tuple): Esquina (x, y) del layout en el frame; distinta de (0, 0) en el de la ROI
+    """
+
+    def __init__(self, width, height, spots, quads, labels, origin=(0, 0)):
+        self.width = width
+        self.height = height
+        self.spots = spots
+        self.quads = quads
+        self.labels = labels
+        self.origin = origin
+        self._tables = {}
+
+    def __len__(self):
+        return len(self.spots)
+
+    def table(self, name, build):
+        """Tabla derivada `name` a esta resolucion; build(self) solo se llama la primera vez."""
+        value = self._tables.get(name)
+        if value is None:
+            value = self._tables[name] = build(self)
+        return value
+
+    def roi_bounds(self, margin=2):
+        """(x0, y0, x1, y1) del bbox union de los spots, con `margin` pixeles para remap y el grosor del dibujo."""
+        if len(self.spots) == 0:
+            return 0, 0, self.width, self.height
+        boxes = np.asarray(self.spots)
+        x0 = min(boxes[:, 0].min(), int(np.floor(self.quads[..., 0].min()))) - margin
+        y0 = min(boxes[:, 1].min(), int(np.floor(self.quads[..., 1].min()))) - margin
+        x1 = max((boxes[:, 0] + boxes[:, 2]).max(), int(np.ceil(self.quads[..., 0].max())) + 1) + margin
+        y1 = max((boxes[:, 1] + boxes[:, 3]).max(), int(np.ceil(self.quads[..., 1].max())) + 1) + margin
+        return max(int(x0), 0), max(int(y0), 0), min(int(x1), self.width), min(int(y1), self.height)
+
+    def roi(self):
+        """
+        El layout recortado al bbox union de los spots, en coordenadas relativas a la ROI.
+        Se usa con view(frame): deteccion de cambios, recortes y dibujo sin tocar el resto del frame.
+        """
+        return self.table('roi', ScaledLayout._crop_to_spots)
+
+    def _crop_to_spots(self):
+        x0, y0, x1, y1 = self.roi_bounds()
+        spots = [[x - x0, y - y0, w, h] for x, y, w, h in self.spots]
+        quads = self.quads - np.float32([x0, y0])
+        return ScaledLayout(x1 - x0, y1 - y0, spots, quads, self.labels[y0:y1, x0:x1],
+                            (self.origin[0] + x0, self.origin[1] + y0))
+
+    def view(self, frame):
+        """La parte del frame que cubre este layout (una vista, sin copia)."""
+        x, y = self.origin
+        return frame[y:y + self.height, x:x + self.width]
+
+    @cached_property
+    def index(self):
+        return SpotIndex(self.labels, self.spots)
+
+    @cached_property
+    def warper(self):
+        return SpotWarper(self.quads)
+
+
+class ParkingLayout:
+    """
+    boxes (np.ndarray): Bboxes normalizados (N, 4) como (x0, y0, x1, y1) en [0, 1]
+    quads (np.ndarray): Cuadrilateros normalizados (N, 4, 2), esquinas sobre los bordes de pixel
+    labels (np.ndarray): Imagen de etiquetas a la resolucion de la mascara
+    """
+
+    def __init__(self, boxes, quads, labels):
+        self.boxes = boxes
+        self.quads = quads
+        self.labels = labels
+        self._scaled = {}
+
+    @classmethod
+    def from_components(cls, connected_components):
+        labels = connected_components[1]
+        height, width = labels.shape
+        size = np.array([width, height], dtype=np.float64)
+
+        spots = np.asarray(get_parking_spots_bboxes(connected_components), dtype=np.float64).reshape(-1, 4)
+        boxes = np.concatenate([spots[:, :2], spots[:, :2] + spots[:, 2:]], axis=1) / np.tile(size, 2)
+        quads = np.asarray(get_parking_spots_quads(connected_components), dtype=np.float64).reshape(-1, 4, 2)
+        layout = cls(boxes, (quads + 0.5) / size, labels)
+
+        # La resolucion nativa sale directo de los componentes, sin redondeos
+        layout._scaled[(width, height)] = ScaledLayout(width, height, spots.astype(int).tolist(),
+                                                       quads.astype(np.float32), labels)
+        return layout
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def native_size(self):
+        return self.labels.shape[1], self.labels.shape[0]
+
+    def at(self, width, height):
+        """ScaledLayout para frames de width x height; se calcula una vez por resolucion."""
+        key = (int(width), int(height))
+        scaled = self._scaled.get(key)
+        if scaled is None:
+            scaled = self._scaled[key] = self._rescale(*key)
+        return scaled
+
+    def for_frame(self, frame):
+        return self.at(frame.shape[1], frame.shape[0])
+
+    def _rescale(self, width, height):
+        size = np.array([width, height], dtype=np.float64)
+        edges = np.rint(self.boxes * np.tile(size, 2)).astype(int)
+        # Un spot nunca desaparece: al menos un pixel por lado aunque la resolucion sea muy baja
+        x0 = np.clip(edges[:, 0], 0, width - 1)
+        y0 = np.clip(edges[:, 1], 0, height - 1)
+        w = np.maximum(edges[:, 2] - x0, 1)
+        h = np.maximum(edges[:, 3] - y0, 1)
+        spots = np.stack([x0, y0, w, h], axis=1).tolist()
+
+        quads = (self.quads * size - 0.5).astype(np.float32)
+        labels = cv2.resize(self.labels, (width, height), interpolation=cv2.INTER_NEAREST_EXACT)
+        return ScaledLayout(width, height, spots, quads, labels)
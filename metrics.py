@@ -0,0 +1,257 @@
+"""
+    Instrumentacion por etapa para los lazos de estacionamiento.
+
+    Histogramas de latencia por etapa, contadores y gauges, expuestos en formato de texto
+    de Prometheus (GET /metrics) y en una linea de log periodica. Cuando esta desactivada
+    se usa NullMetrics, cuyos metodos no hacen nada.
+    """
+
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger('parking.metrics')
+
+PREFIX = 'parking'
+# Segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el ultimo es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Cuantil aproximado (limite superior del bucket que lo contiene)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for bound, n in zip(self.buckets, self.counts):
+            acc += n
+            if acc >= target:
+                return bound
+        return float('inf')
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Registro de metricas de un proceso.
+
+    stage(name): context manager que mide la latencia de una etapa
+    inc(name, value): incrementa un contador
+    set(name, value): fija un gauge (p. ej. spots reverificados en el ultimo ciclo)
+    """
+
+    enabled = True
+
+    def __init__(self, prefix=PREFIX, log_interval=None):
+        self.prefix = prefix
+        self.log_interval = log_interval
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self._last_log = time.monotonic()
+        self._server = None
+        self.routes = {}
+
+    def stage(self, name):
+        # Un timer por uso: la misma etapa puede medirse anidada o desde varios hilos a la vez
+        return _StageTimer(self, name)
+
+    def observe_stage(self, name, seconds):
+        with self._lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def render(self):
+        """Texto en formato de exposicion de Prometheus."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            if self.stages:
+                lines.append(f'# HELP {p}_stage_seconds Latencia por etapa del lazo')
+                lines.append(f'# TYPE {p}_stage_seconds histogram')
+            for name, hist in sorted(self.stages.items()):
+                acc = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    acc += n
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {acc}')
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {hist.sum:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {hist.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE {p}_{name}_total counter')
+                lines.append(f'{p}_{name}_total {value}')
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f'# TYPE {p}_{name} gauge')
+                lines.append(f'{p}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        with self._lock:
+            stages = ' '.join(f'{name}={hist.sum / hist.count * 1000:.1f}ms/p99<={hist.quantile(0.99) * 1000:g}ms'
+                              for name, hist in sorted(self.stages.items()) if hist.count)
+            counters = ' '.join(f'{name}={value}' for name, value in sorted(self.counters.items()))
+            gauges = ' '.join(f'{name}={value}' for name, value in sorted(self.gauges.items()))
+        return ' '.join(part for part in (stages, counters, gauges) if part)
+
+    def tick(self):
+        """Llamar una vez por frame; escribe la linea de log cuando toca."""
+        if self.log_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            logger.info(self.summary())
+
+    def add_route(self, path, handler):
+        """Registra otra ruta en el servidor HTTP; handler(query) -> (status, content_type, body)."""
+        self.routes[path] = handler
+
+    def wrap_pool(self, pool):
+        # Profiler envuelve el pool de --threads; sin perfilado se usa tal cual
+        return pool
+
+    def serve(self, port, host='127.0.0.1'):
+        """Expone GET /metrics (y las rutas registradas con add_route) en un hilo de fondo."""
+        # Solo se importa si se pide el endpoint, para no alargar el arranque
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlsplit
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == '/metrics':
+                    status, content_type, body = 200, 'text/plain; version=0.0.4', metrics.render()
+                elif url.path in metrics.routes:
+                    try:
+                        status, content_type, body = metrics.routes[url.path](parse_qs(url.query))
+                    except Exception:
+                        logger.exception("Fallo la ruta %s", url.path)
+                        status, content_type, body = 500, 'text/plain', 'internal error\n'
+                else:
+                    status, content_type, body = 404, 'text/plain', 'not found\n'
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Metricas desactivadas: misma interfaz que Metrics con costo casi nulo."""
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_TIMER
+
+    def observe_stage(self, name, seconds):
+        pass
+
+    def inc(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def tick(self):
+        pass
+
+    def add_route(self, path, handler):
+        pass
+
+    def wrap_pool(self, pool):
+        return pool
+
+    def close(self):
+        pass
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Exponer metricas de Prometheus en http://HOST:PORT/metrics')
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help='Interfaz del servidor de metricas; 0.0.0.0 lo expone a la red (sin autenticacion)')
+    parser.add_argument('--metrics-log-interval', type=float, default=None,
+                        help='Escribir un resumen de metricas en el log cada N segundos')
+    return parser
+
+
+def metrics_from_args(args):
+    if args.metrics_port is None and args.metrics_log_interval is None:
+        return NullMetrics()
+    if args.metrics_log_interval is not None:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    metrics = Metrics(log_interval=args.metrics_log_interval)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port, args.metrics_host)
+    return metrics
@@ -0,0 +1,264 @@
+"""
+    Registro de modelos con recarga en caliente.
+
+    Vigila un directorio de modelos (NOMBRE.npz exportado con numpy_model.py, o NOMBRE.p) y un models.json opcional que asigna modelos
+    por sitio y por camara:
+
+        {"default": "model", "sites": {"centro": "model-centro"}, "cameras": {"cam-norte": "model-norte"}}
+
+    Cuando un archivo en uso cambia o models.json elige otro modelo, la nueva version se carga y
+    valida en un hilo de fondo y se publica con una sola asignacion; si la validacion falla (o el
+    archivo no existe) se conserva la version anterior.
+    """
+
+import hashlib
+import json
+import logging
+import io
+import os
+import pickle
+import threading
+import time
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from util import N_FEATURES, model_input, predict_with_confidence
+
+logger = logging.getLogger('parking.models')
+
+MODEL_EXTENSIONS = ('.npz', '.p')  # en orden de preferencia
+SELECTION_FILE = 'models.json'
+DEFAULT_NAME = 'model'
+
+
+class ModelHandle(NamedTuple):
+    model: Any
+    name: str
+    version: str  # NOMBRE@sha256[:12] del archivo
+    loaded_at: float
+
+
+def validate_model(model):
+    """Comprueba que el objeto se pueda usar como clasificador de spots; lanza ValueError si no."""
+    if not hasattr(model, 'predict'):
+        raise ValueError("El objeto no tiene predict()")
+    y_output = np.asarray(model.predict(np.zeros((2, N_FEATURES), dtype=np.float32)))
+    if y_output.shape != (2,) or not set(np.unique(y_output)) <= {0, 1}:
+        raise ValueError(f"predict() devolvio {y_output!r}, se esperaban dos etiquetas 0/1")
+
+
+def load_model_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.npz'):
+        from numpy_model import NumpyModel
+        model = NumpyModel.load(io.BytesIO(data))
+    else:
+        model = pickle.loads(data)
+    validate_model(model)
+    return model, hashlib.sha256(data).hexdigest()[:12]
+
+
+def _check_selection(selection):
+    # resolve() corre en el hilo de inferencia: una seleccion mal formada no debe llegar hasta ahi
+    if not isinstance(selection, dict):
+        raise ValueError(f"{SELECTION_FILE} debe ser un objeto JSON")
+    if not isinstance(selection.get('default', DEFAULT_NAME), str):
+        raise ValueError(f"'default' de {SELECTION_FILE} debe ser un nombre de modelo")
+    for key in ('sites', 'cameras'):
+        names = selection.get(key, {})
+        if not isinstance(names, dict) or not all(isinstance(name, str) for name in names.values()):
+            raise ValueError(f"'{key}' de {SELECTION_FILE} debe asignar nombres de modelo")
+
+
+class ModelRegistry:
+    """
+    directory (str): Directorio con los modelos y el models.json opcional
+    poll_interval (float): Segundos entre revisiones del directorio
+    """
+
+    def __init__(self, directory, poll_interval=5.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.selection = {}
+        self._selection_stamp = None
+        self._handles = {}   # nombre -> ModelHandle
+        self._stamps = {}    # nombre -> (mtime_ns, size) del archivo cargado o del ultimo intento fallido
+        self._active = {}    # (sitio, camara) -> ModelHandle en uso
+        self._waiting = set()  # (sitio, camara, nombre) ya avisados de que el modelo aun no esta cargado
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load_selection()
+
+    def _path(self, name):
+        for extension in MODEL_EXTENSIONS:
+            path = os.path.join(self.directory, name + extension)
+            if os.path.exists(path):
+                return path
+        return path
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load_selection(self):
+        path = os.path.join(self.directory, SELECTION_FILE)
+        try:
+            stamp = self._stamp(path)
+        except FileNotFoundError:
+            self.selection = {}
+            return
+        if stamp == self._selection_stamp:
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                selection = json.load(f)
+            _check_selection(selection)
+        except (OSError, ValueError):
+            logger.exception("No se pudo leer %s; se conserva la seleccion anterior", path)
+            return
+        self.selection = selection
+        self._selection_stamp = stamp
+
+    def resolve(self, site=None, camera=None):
+        """Nombre del modelo para una camara / sitio: camara, luego sitio, luego default."""
+        selection = self.selection
+        name = selection.get('cameras', {}).get(camera) if camera else None
+        if name is None and site:
+            name = selection.get('sites', {}).get(site)
+        return name or selection.get('default', DEFAULT_NAME)
+
+    def _selected_names(self):
+        selection = self.selection
+        names = {selection.get('default', DEFAULT_NAME)}
+        names.update(selection.get('sites', {}).values())
+        names.update(selection.get('cameras', {}).values())
+        return names
+
+    def _load(self, name):
+        path = self._path(name)
+        stamp = self._stamp(path)
+        model, digest = load_model_file(path)
+        handle = ModelHandle(model, name, f'{name}@{digest}', time.time())
+        with self._lock:
+            previous = self._handles.get(name)
+            self._handles[name] = handle
+            self._stamps[name] = stamp
+        if previous is not None and previous.version != handle.version:
+            logger.info("Modelo %s reemplazado: %s -> %s", name, previous.version, handle.version)
+        return handle
+
+    def get(self, site=None, camera=None):
+        """
+        ModelHandle vigente. Solo el primer pedido de un sitio / camara carga en este hilo (y lanza
+        si falla); despues, si models.json elige un modelo que el hilo de fondo aun no cargo (o que
+        no se pudo cargar), se sigue usando el que estaba activo.
+        """
+        key = (site, camera)
+        name = self.resolve(site, camera)
+        handle = self._handles.get(name)
+        active = self._active.get(key)
+        if handle is None:
+            if active is None:
+                handle = self._load(name)
+            else:
+                if (site, camera, name) not in self._waiting:
+                    self._waiting.add((site, camera, name))
+                    logger.warning("Modelo %s aun no cargado para %s; se sigue usando %s",
+                                   name, key, active.version)
+                return active
+        self._active[key] = handle
+        return handle
+
+    def refresh(self):
+        """
+        Carga los modelos recien elegidos en models.json y recarga los que estan en uso cuyo archivo
+        cambio. Devuelve los nombres cargados.
+        """
+        self._load_selection()
+        reloaded = []
+        for name in sorted(self._selected_names() - set(self._handles)):
+            try:
+                stamp = self._stamp(self._path(name))
+            except FileNotFoundError:
+                stamp = None
+            if name in self._stamps and stamp == self._stamps[name]:
+                continue  # ya se intento con este mismo archivo
+            self._stamps[name] = stamp
+            if stamp is None:
+                logger.error("Modelo %s elegido en %s no existe en %s", name, SELECTION_FILE, self.directory)
+                continue
+            try:
+                self._load(name)
+                reloaded.append(name)
+            except Exception:
+                logger.exception("Modelo %s invalido; no se activa", name)
+        for name in list(self._handles):
+            try:
+                stamp = self._stamp(self._path(name))
+            except FileNotFoundError:
+                continue
+            if stamp == self._stamps.get(name) or name in reloaded:
+                continue
+            try:
+                self._load(name)
+                reloaded.append(name)
+            except Exception:
+                # Marcar la version como vista para no reintentar el mismo archivo roto cada vez
+                self._stamps[name] = stamp
+                logger.exception("Modelo %s invalido; se conserva %s", name, self._handles[name].version)
+        return reloaded
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Fallo la revision de %s; se sigue vigilando", self.directory)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class RegistryClassifier:
+    """Clasificador por lotes que siempre usa la version vigente del registro para su sitio / camara."""
+
+    def __init__(self, registry, site=None, camera=None):
+        self.registry = registry
+        self.site = site
+        self.camera = camera
+        self.version = registry.get(site, camera).version
+
+    def classify(self, indices, crops):
+        if len(indices) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+        handle = self.registry.get(self.site, self.camera)  # una sola lectura por lote
+        self.version = handle.version
+        y_output, confidence = predict_with_confidence(handle.model, model_input(handle.model, crops))
+        return y_output == 0, confidence
+
+
+def add_registry_arguments(parser):
+    parser.add_argument('--model-dir', default=None,
+                        help='Directorio de modelos con recarga en caliente (en lugar de model.p)')
+    parser.add_argument('--site', default=None, help='Sitio, para elegir el modelo en models.json')
+    parser.add_argument('--camera', default=None, help='Camara, para elegir el modelo en models.json')
+    parser.add_argument('--model-poll-interval', type=float, default=5.0)
+    return parser
+
+
+def registry_from_args(args):
+    if args.model_dir is None:
+        return None
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    return ModelRegistry(args.model_dir, args.model_poll_interval).start()
@@ -0,0 +1,101 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """
+    Detector de movimiento reutilizable para el lazo de parking_manager.py.
+
+    Todos los buffers intermedios (resize, mascara de fondo, umbral y dilatacion)
+    se reservan una sola vez y OpenCV escribe en ellos mediante `dst=`, por lo que
+    cada frame ya no crea arreglos nuevos.
+
+    width, height (int): Resolucion de trabajo
+    threshold (int): Umbral aplicado a la mascara de MOG2
+    kernel_size (tuple): Tamaño del elemento estructurante
+    dilate_iterations (int): Iteraciones de dilatacion
+    min_area (float): Area minima de un contorno para considerarlo movimiento
+    """
+
+    def __init__(self, width=640, height=480, threshold=200, kernel_size=(5, 5),
+                 dilate_iterations=2, min_area=500):
+        self.size = (width, height)
+        self.threshold = threshold
+        self.dilate_iterations = dilate_iterations
+        self.min_area = min_area
+
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+        self.fgbg = cv2.createBackgroundSubtractorMOG2()
+
+        # Buffers preasignados
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+        self.fgmask = np.empty((height, width), dtype=np.uint8)
+        self.thresh = np.empty((height, width), dtype=np.uint8)
+        self.dilated = np.empty((height, width), dtype=np.uint8)
+
+    def detect(self, frame):
+        """
+        Procesa un frame y devuelve los bounding boxes (x, y, w, h) con movimiento.
+
+        El frame redimensionado queda en `self.frame`; se sobrescribe en la siguiente llamada.
+        """
+        cv2.resize(frame, self.size, dst=self.frame)
+        self.fgbg.apply(self.frame, fgmask=self.fgmask)
+        cv2.threshold(self.fgmask, self.threshold, 255, cv2.THRESH_BINARY, dst=self.thresh)
+        cv2.dilate(self.thresh, self.kernel, dst=self.dilated, iterations=self.dilate_iterations)
+
+        # findContours ya no modifica la imagen de entrada (OpenCV >= 3.2), no hace falta copy()
+        contours, _ = cv2.findContours(self.dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        return [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= self.min_area]
+
+
+def _legacy_detect(frame, fgbg, width, height):
+    # Version original del lazo, solo para comparar asignaciones
+    frame = cv2.resize(frame, (width, height))
+    mask = fgbg.apply(frame)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+    thresh = cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)[1]
+    thresh = cv2.dilate(thresh, kernel, iterations=2)
+    contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= 500]
+
+
+def measure_allocations(frames=200, width=640, height=480, seed=0):
+    """
+    Mide con tracemalloc la memoria temporal reservada por frame (pico sobre la memoria
+    en uso antes del frame) de la version original y de MotionDetector.
+
+    Devuelve un dict {nombre: bytes_por_frame}.
+    """
+    rng = np.random.default_rng(seed)
+    src = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    inputs = [np.roll(src, 8 * i, axis=1) for i in range(8)]
+
+    def run(step):
+        for i in range(10):  # calentamiento
+            step(inputs[i % len(inputs)])
+        total = 0
+        tracemalloc.start()
+        for i in range(frames):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step(inputs[i % len(inputs)])
+            total += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        return total / frames
+
+    fgbg = cv2.createBackgroundSubtractorMOG2()
+    detector = MotionDetector(width, height)
+
+    return {
+        'legacy': run(lambda f: _legacy_detect(f, fgbg, width, height)),
+        'MotionDetector': run(detector.detect),
+    }
+
+
+if __name__ == "__main__":
+    for name, peak in measure_allocations().items():
+        print(f"{name:>15}: {peak / 1024:8.1f} KiB de memoria temporal por frame")
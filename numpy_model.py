@@ -0,0 +1,254 @@
+"""
+    Exporta el clasificador pickled a arreglos de NumPy (.npz) y lo evalua sin scikit-learn.
+
+    Modelos soportados (binarios): lineales (coef_ / intercept_: LogisticRegression, SGDClassifier,
+    LinearSVC...), SVC con kernel linear / rbf / poly / sigmoid, DecisionTreeClassifier y
+    RandomForestClassifier / ExtraTreesClassifier. La exportacion se verifica contra el modelo
+    original y falla si alguna decision difiere.
+
+    Por defecto la escala 1/255 de util.crops_to_features se incorpora a los pesos (pixel_input):
+    el modelo exportado recibe los recortes uint8 tal cual y no hace falta la matriz float32
+    intermedia (N x 675 x 4 bytes) antes de predecir.
+
+    Ejemplo:
+        python numpy_model.py model.p model.npz --check-dataset dataset/
+        python parking_manager3.py --model model.npz
+    """
+
+import argparse
+import pickle
+import sys
+
+import numpy as np
+
+KIND_LINEAR = 'linear'
+KIND_SVC = 'svc'
+KIND_TREES = 'trees'
+
+PIXEL_MAX = 255  # util.crops_to_features divide los uint8 entre 255
+SVC_CHUNK = 2048  # filas por bloque de la matriz de kernel (filas x vectores de soporte float64)
+
+
+def _pack_trees(estimators):
+    # Concatena los arboles en arreglos planos; los hijos se desplazan al indice global
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in estimators:
+        t = est.tree_
+        children_left = t.children_left.astype(np.int64)
+        children_right = t.children_right.astype(np.int64)
+        left.append(np.where(children_left >= 0, children_left + offset, -1))
+        right.append(np.where(children_right >= 0, children_right + offset, -1))
+        feature.append(t.feature.astype(np.int64))
+        threshold.append(t.threshold.astype(np.float64))
+        # Fraccion de cada clase en la hoja, como predict_proba del arbol
+        v = t.value[:, 0, :].astype(np.float64)
+        value.append(v / v.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += t.node_count
+        max_depth = max(max_depth, t.max_depth)
+    return {
+        'left': np.concatenate(left), 'right': np.concatenate(right),
+        'feature': np.concatenate(feature), 'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value), 'roots': np.asarray(roots, dtype=np.int64),
+        'max_depth': np.int64(max_depth),
+    }
+
+
+def fold_pixel_scale(arrays):
+    """
+    Incorpora a los pesos la escala de util.crops_to_features: el modelo resultante sobre los
+    pixeles uint8 da lo mismo que el original sobre pixeles / 255.
+    """
+    arrays = dict(arrays)
+    kind = str(arrays['kind'])
+    if kind == KIND_LINEAR:
+        arrays['coef'] = arrays['coef'] / PIXEL_MAX
+    elif kind == KIND_SVC and str(arrays['kernel']) == 'rbf':
+        # gamma * |x/255 - v|^2 = (gamma / 255^2) * |x - 255 v|^2
+        arrays['support_vectors'] = arrays['support_vectors'] * PIXEL_MAX
+        arrays['gamma'] = arrays['gamma'] / PIXEL_MAX ** 2
+    elif kind == KIND_SVC:
+        # Kernels sobre el producto punto: <x/255, v> = <x, v/255>
+        arrays['support_vectors'] = arrays['support_vectors'] / PIXEL_MAX
+    else:
+        # scikit-learn compara float32(x) / 255 <= t; con 256 valores posibles el umbral pasa a ser
+        # el mayor pixel que cumple la condicion, y la comparacion es exacta
+        values = np.arange(PIXEL_MAX + 1, dtype=np.float32) / PIXEL_MAX
+        cut = np.searchsorted(values, arrays['threshold'], side='right') - 1
+        arrays['threshold'] = np.where(arrays['left'] < 0, arrays['threshold'], cut.astype(np.float64))
+    arrays['pixel_input'] = np.bool_(True)
+    return arrays
+
+
+def export_arrays(model):
+    """Convierte un modelo de scikit-learn en un dict de arreglos. Lanza ValueError si no se soporta."""
+    classes = np.asarray(model.classes_)
+    if len(classes) != 2:
+        raise ValueError("Solo se soportan clasificadores binarios")
+
+    name = type(model).__name__
+    if name in ('SVC', 'NuSVC'):
+        kernel = model.kernel
+        if kernel not in ('linear', 'rbf', 'poly', 'sigmoid'):
+            raise ValueError(f"Kernel no soportado: {kernel}")
+        return {
+            'kind': np.array(KIND_SVC), 'classes': classes, 'kernel': np.array(kernel),
+            'support_vectors': np.asarray(model.support_vectors_, dtype=np.float64),
+            'dual_coef': np.asarray(model.dual_coef_[0], dtype=np.float64),
+            'intercept': np.float64(model.intercept_[0]),
+            'gamma': np.float64(model._gamma), 'coef0': np.float64(model.coef0),
+            'degree': np.int64(model.degree),
+        }
+
+    if hasattr(model, 'estimators_') and name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        return {'kind': np.array(KIND_TREES), 'classes': classes, **_pack_trees(model.estimators_)}
+
+    if name == 'DecisionTreeClassifier':
+        return {'kind': np.array(KIND_TREES), 'classes': classes, **_pack_trees([model])}
+
+    if hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+        return {
+            'kind': np.array(KIND_LINEAR), 'classes': classes,
+            'coef': np.asarray(model.coef_[0], dtype=np.float64),
+            'intercept': np.float64(np.ravel(model.intercept_)[0]),
+        }
+
+    raise ValueError(f"Modelo no soportado: {name}")
+
+
+class NumpyModel:
+    """Clasificador binario evaluado solo con NumPy; misma interfaz que scikit-learn para predict."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.kind = str(arrays['kind'])
+        self.classes_ = np.asarray(arrays['classes'])
+        # True si la escala de los pixeles esta en los pesos: la entrada son los uint8 sin convertir
+        self.pixel_input = bool(arrays.get('pixel_input', False))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({k: data[k] for k in data.files})
+
+    @classmethod
+    def from_model(cls, model, pixel_input=True):
+        arrays = export_arrays(model)
+        return cls(fold_pixel_scale(arrays) if pixel_input else arrays)
+
+    def save(self, path):
+        np.savez(path, **self.arrays)
+
+    def decision_function(self, X):
+        a = self.arrays
+        if self.kind == KIND_LINEAR:
+            X = np.asarray(X)
+            if X.dtype == np.uint8:
+                # Los pixeles son exactos en float32; un solo paso a la matriz del lote
+                return X.astype(np.float32) @ a['coef'].astype(np.float32) + a['intercept']
+            if X.dtype not in (np.float32, np.float64):
+                X = X.astype(np.float64)
+            return X @ a['coef'] + a['intercept']
+
+        if self.kind == KIND_SVC:
+            X = np.asarray(X)
+            if len(X) > SVC_CHUNK:
+                return np.concatenate([self.decision_function(X[i:i + SVC_CHUNK])
+                                       for i in range(0, len(X), SVC_CHUNK)])
+            # libsvm trabaja en float64
+            X = X.astype(np.float64)
+            sv = a['support_vectors']
+            kernel = str(a['kernel'])
+            dot = X @ sv.T
+            if kernel == 'linear':
+                K = dot
+            elif kernel == 'rbf':
+                sq = (X * X).sum(axis=1)[:, None] + (sv * sv).sum(axis=1)[None, :] - 2 * dot
+                K = np.exp(-a['gamma'] * sq)
+            elif kernel == 'poly':
+                K = (a['gamma'] * dot + a['coef0']) ** int(a['degree'])
+            else:
+                K = np.tanh(a['gamma'] * dot + a['coef0'])
+            return K @ a['dual_coef'] + a['intercept']
+
+        # Arboles: probabilidad de la clase positiva menos 0.5
+        return self._tree_proba(X)[:, 1] - 0.5
+
+    @property
+    def predict_proba(self):
+        # Como en scikit-learn, solo existe si el modelo da probabilidades (hasattr lo respeta)
+        if self.kind != KIND_TREES:
+            raise AttributeError("predict_proba solo esta disponible para arboles")
+        return self._tree_proba
+
+    def _tree_proba(self, X):
+        a = self.arrays
+        X = np.asarray(X)
+        if X.dtype != np.uint8:
+            X = X.astype(np.float32)  # scikit-learn compara en float32
+        rows = np.arange(len(X))
+        proba = np.zeros((len(X), a['value'].shape[1]), dtype=np.float64)
+        for root in a['roots']:
+            node = np.full(len(X), root, dtype=np.int64)
+            for _ in range(int(a['max_depth'])):
+                feature = a['feature'][node]
+                leaf = a['left'][node] < 0
+                if leaf.all():
+                    break
+                go_left = X[rows, np.where(leaf, 0, feature)] <= a['threshold'][node]
+                node = np.where(leaf, node, np.where(go_left, a['left'][node], a['right'][node]))
+            proba += a['value'][node]
+        return proba / len(a['roots'])
+
+    def predict(self, X):
+        if self.kind == KIND_TREES:
+            return self.classes_[np.argmax(self._tree_proba(X), axis=1)]
+        return self.classes_[(self.decision_function(X) > 0).astype(np.intp)]
+
+
+def verify(model, exported, crops):
+    """Devuelve el numero de decisiones distintas entre el modelo original y el exportado sobre recortes uint8."""
+    from util import crops_to_features, model_input
+    expected = np.asarray(model.predict(crops_to_features(crops)))
+    return int(np.sum(expected != exported.predict(model_input(exported, crops))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta model.p a un .npz evaluable solo con NumPy")
+    parser.add_argument('model', help='Modelo pickled (model.p)')
+    parser.add_argument('out', help='Archivo .npz de salida')
+    parser.add_argument('--check-dataset', help='Dataset de recortes (dataset_store) para verificar las decisiones')
+    parser.add_argument('--check-samples', type=int, default=5000,
+                        help='Muestras aleatorias adicionales para verificar')
+    parser.add_argument('--float-input', action='store_true',
+                        help='No incorporar la escala 1/255 a los pesos (entrada float en [0, 1] como model.p)')
+    args = parser.parse_args(argv)
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    exported = NumpyModel.from_model(model, pixel_input=not args.float_input)
+
+    rng = np.random.default_rng(0)
+    checks = [('aleatorias', rng.integers(0, 256, (args.check_samples, model.n_features_in_), dtype=np.uint8))]
+    if args.check_dataset:
+        from dataset_store import CropDataset
+        checks.append(('dataset', CropDataset.open(args.check_dataset).crops))
+
+    failed = False
+    for name, X in checks:
+        mismatches = verify(model, exported, X)
+        print(f"{name}: {mismatches} decisiones distintas de {len(X)}")
+        failed |= mismatches > 0
+    if failed:
+        print("La exportacion no reproduce el modelo; no se escribio el archivo", file=sys.stderr)
+        return 1
+
+    exported.save(args.out)
+    print(f"{type(model).__name__} ({exported.kind}) exportado a {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
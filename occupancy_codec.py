@@ -0,0 +1,122 @@
+"""
+    Formato binario compacto de la ocupacion: snapshots de un bit por spot y deltas RLE.
+
+    Todos los enteros fijos son little-endian:
+
+        Snapshot   'S'  seq:u32  n_spots:u32  bits        bits: 1 = vacio, packbits(bitorder='little')
+        Delta      'D'  seq:u32  base_seq:u32 runs        runs: varints LEB128
+
+    Un delta lleva de base_seq a seq. Las corridas alternan spots sin cambio / spots que
+    cambiaron, empezando por sin cambio; la ultima corrida de spots sin cambio no se escribe.
+    Un spot aislado que cambia cuesta ~2 bytes, y un snapshot de 5000 spots son 634 bytes, asi
+    que encode_update nunca manda mas que eso: si el delta es mas grande se envia el snapshot.
+
+    OccupancyDecoder reconstruye el estado del lado del cliente y avisa cuando un delta no
+    corresponde a su seq (hay que esperar o pedir un snapshot).
+    """
+
+import struct
+
+import numpy as np
+
+SNAPSHOT = ord('S')
+DELTA = ord('D')
+_HEADER = struct.Struct('<BII')  # tipo, seq, n_spots (snapshot) o base_seq (delta)
+
+
+def pack(empty):
+    """Estado (bool por spot, True = vacio) a bits."""
+    return np.packbits(np.asarray(empty, dtype=bool), bitorder='little').tobytes()
+
+
+def unpack(bits, n_spots):
+    return np.unpackbits(np.frombuffer(bits, dtype=np.uint8), count=n_spots, bitorder='little').astype(bool)
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(data, offset):
+    values, value, shift = [], 0, 0
+    for byte in data[offset:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    if shift:
+        raise ValueError("Delta truncado")
+    return values
+
+
+def encode_snapshot(seq, bits, n_spots):
+    return _HEADER.pack(SNAPSHOT, seq, n_spots) + bits
+
+
+def encode_delta(base_seq, seq, previous_bits, bits):
+    changed = np.unpackbits(np.bitwise_xor(np.frombuffer(previous_bits, dtype=np.uint8),
+                                           np.frombuffer(bits, dtype=np.uint8)), bitorder='little')
+    # Bordes de las corridas de spots que cambiaron; las longitudes alternan sin cambio / cambio
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], changed, [0]]).astype(np.int8)))
+    out = bytearray(_HEADER.pack(DELTA, seq, base_seq))
+    for length in np.diff(edges, prepend=0).tolist():
+        _write_varint(out, length)
+    return bytes(out)
+
+
+def encode_update(base_seq, seq, previous_bits, bits, n_spots):
+    """El delta desde previous_bits (None: el cliente no tiene estado), o el snapshot si es mas chico."""
+    snapshot = encode_snapshot(seq, bits, n_spots)
+    if previous_bits is None:
+        return snapshot
+    delta = encode_delta(base_seq, seq, previous_bits, bits)
+    return delta if len(delta) < len(snapshot) else snapshot
+
+
+class OccupancyDecoder:
+    """
+    Estado del lado del cliente a partir de los mensajes de encode_snapshot / encode_update.
+
+    empty (np.ndarray): True = vacio por spot; None hasta recibir el primer snapshot
+    """
+
+    def __init__(self):
+        self.seq = None
+        self.empty = None
+
+    @property
+    def available(self):
+        return int(self.empty.sum()) if self.empty is not None else 0
+
+    def apply(self, message):
+        """
+        Aplica un mensaje. Devuelve False si es un delta sobre otro seq (el estado no cambia y
+        hay que esperar un snapshot); lanza ValueError si el mensaje esta mal formado.
+        """
+        kind = message[0]
+        if kind == SNAPSHOT:
+            _, seq, n_spots = _HEADER.unpack_from(message)
+            bits = message[_HEADER.size:]
+            if len(bits) != -(-n_spots // 8):
+                raise ValueError(f"Snapshot de {len(bits)} bytes para {n_spots} spots")
+            self.empty = unpack(bits, n_spots)
+            self.seq = seq
+            return True
+        if kind != DELTA:
+            raise ValueError(f"Tipo de mensaje desconocido: {kind!r}")
+
+        _, seq, base_seq = _HEADER.unpack_from(message)
+        if self.empty is None or base_seq != self.seq:
+            return False
+        edges = np.cumsum(_read_varints(message, _HEADER.size))
+        if len(edges) % 2 or (len(edges) and edges[-1] > len(self.empty)):
+            raise ValueError("Delta con corridas fuera del rango de spots")
+        for start, end in edges.reshape(-1, 2).tolist():
+            self.empty[start:end] ^= True
+        self.seq = seq
+        return True
@@ -0,0 +1,263 @@
+"""
+    Historial de ocupacion en SQLite con rollups por minuto y por hora.
+
+    Se guardan los cambios de estado de cada spot (tabla changes) y, de forma incremental,
+    rollups (tabla rollups) del lote completo (spot = LOT) cada minuto y cada hora, y de cada
+    spot cada hora. Cada fila de rollup acumula:
+
+        occupied_seconds   segundos ocupado (en el lote, spot-segundos ocupados)
+        observed_seconds   segundos con estado conocido (mientras el proceso no corre no cuentan)
+        changes            cambios de estado en el intervalo
+        min/max_occupied   spots ocupados minimo / maximo (solo en el lote)
+
+    Los intervalos se acumulan en memoria y se escriben con un upsert por fila en cada
+    flush(); flush() tambien cierra los intervalos abiertos hasta ese momento, asi que las
+    consultas ven el estado hasta el ultimo flush. Con start() los flush los hace un hilo de
+    fondo y record() (el lazo de video) nunca espera a SQLite. Para un rango de meses basta leer las filas
+    horarias (una por hora), y el detalle de un spot sale de changes por su indice (spot, ts).
+
+    Ejemplo:
+        python parking_manager3.py --history history.db --metrics-port 9100
+        curl 'http://localhost:9100/history?start=1760000000&end=1760086400'
+        curl 'http://localhost:9100/history?spot=12&start=1760000000&end=1760086400&resolution=3600'
+    """
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('parking.history')
+
+LOT = -1  # spot de las filas del lote completo
+MINUTE = 60
+HOUR = 3600
+LOT_RESOLUTIONS = (MINUTE, HOUR)
+SPOT_RESOLUTIONS = (HOUR,)
+FLUSH_INTERVAL = 10.0  # segundos entre escrituras a la base
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    ts REAL NOT NULL,
+    spot INTEGER NOT NULL,
+    empty INTEGER NOT NULL,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS changes_spot_ts ON changes (spot, ts);
+CREATE INDEX IF NOT EXISTS changes_ts ON changes (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    spot INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    occupied_seconds REAL NOT NULL,
+    observed_seconds REAL NOT NULL,
+    changes INTEGER NOT NULL,
+    min_occupied INTEGER,
+    max_occupied INTEGER,
+    PRIMARY KEY (resolution, spot, bucket)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, spot, bucket) DO UPDATE SET
+    occupied_seconds = occupied_seconds + excluded.occupied_seconds,
+    observed_seconds = observed_seconds + excluded.observed_seconds,
+    changes = changes + excluded.changes,
+    min_occupied = min(coalesce(min_occupied, excluded.min_occupied), coalesce(excluded.min_occupied, min_occupied)),
+    max_occupied = max(coalesce(max_occupied, excluded.max_occupied), coalesce(excluded.max_occupied, max_occupied))
+"""
+
+
+def _split(start, end, resolution):
+    # (inicio del intervalo, segundos) de [start, end) repartido en intervalos de `resolution`
+    bucket = int(start // resolution) * resolution
+    while bucket < end:
+        yield bucket, min(end, bucket + resolution) - max(start, bucket)
+        bucket += resolution
+
+
+class OccupancyHistory:
+    """
+    path (str): Archivo SQLite (se crea si no existe)
+    flush_interval (float): Segundos entre escrituras (desde record() o, con start(), desde el hilo de fondo)
+
+    Se puede consultar desde otros hilos (p. ej. la ruta /history del servidor de metricas).
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()     # estado en memoria; record() solo toma este
+        self._db_lock = threading.Lock()  # conexion; flush() lo toma antes que _lock
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._spots = {}  # spot -> [ocupado, desde]
+        self._occupied = 0
+        self._lot_since = None
+        self._rows = {}  # (resolution, spot, bucket) -> [ocupado, observado, cambios, min, max]
+        self._changes = []
+        self._last_flush = time.monotonic()
+
+    def _row(self, resolution, spot, bucket):
+        row = self._rows.get((resolution, spot, bucket))
+        if row is None:
+            row = self._rows[(resolution, spot, bucket)] = [0.0, 0.0, 0, None, None]
+        return row
+
+    def _advance_lot(self, now):
+        # Acumula el lote con los conteos vigentes desde la ultima vez hasta `now`
+        if self._lot_since is not None and now > self._lot_since:
+            for resolution in LOT_RESOLUTIONS:
+                for bucket, seconds in _split(self._lot_since, now, resolution):
+                    row = self._row(resolution, LOT, bucket)
+                    row[0] += seconds * self._occupied
+                    row[1] += seconds * len(self._spots)
+                    self._bound(row)
+        self._lot_since = now
+
+    def _bound(self, row):
+        row[3] = self._occupied if row[3] is None else min(row[3], self._occupied)
+        row[4] = self._occupied if row[4] is None else max(row[4], self._occupied)
+
+    def _advance_spot(self, spot, now):
+        state = self._spots[spot]
+        occupied, since = state
+        if now > since:
+            for resolution in SPOT_RESOLUTIONS:
+                for bucket, seconds in _split(since, now, resolution):
+                    row = self._row(resolution, spot, bucket)
+                    row[0] += seconds * occupied
+                    row[1] += seconds
+        state[1] = now
+
+    def record(self, changes, ts=None):
+        """
+        Registra los cambios de un ciclo, (spot, empty, confidence), todos en el instante `ts`
+        (por defecto ahora). Sin start(), escribe a la base cada flush_interval segundos.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._advance_lot(ts)
+            n = 0
+            for spot, empty, confidence in changes:
+                spot, occupied = int(spot), int(not empty)
+                if spot in self._spots:
+                    self._advance_spot(spot, ts)
+                    self._occupied += occupied - self._spots[spot][0]
+                    self._spots[spot][0] = occupied
+                else:
+                    self._spots[spot] = [occupied, ts]
+                    self._occupied += occupied
+                for resolution in SPOT_RESOLUTIONS:
+                    self._row(resolution, spot, int(ts // resolution) * resolution)[2] += 1
+                self._changes.append((ts, spot, 1 - occupied, None if confidence is None else float(confidence)))
+                n += 1
+            for resolution in LOT_RESOLUTIONS:
+                row = self._row(resolution, LOT, int(ts // resolution) * resolution)
+                row[2] += n
+                self._bound(row)
+        if self._thread is None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, now=None):
+        """
+        Cierra los intervalos abiertos hasta `now` y escribe todo lo pendiente en una transaccion.
+        La escritura se hace fuera de _lock: record() puede seguir acumulando mientras tanto.
+        """
+        now = time.time() if now is None else now
+        with self._db_lock:
+            with self._lock:
+                self._advance_lot(now)
+                for spot in self._spots:
+                    self._advance_spot(spot, now)
+                rows = [(r, s, b, *values) for (r, s, b), values in self._rows.items()]
+                changes = self._changes
+                self._rows = {}
+                self._changes = []
+                self._last_flush = time.monotonic()
+            with self._db:
+                self._db.executemany(_UPSERT, rows)
+                self._db.executemany('INSERT INTO changes VALUES (?, ?, ?, ?)', changes)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("No se pudo escribir el historial en %s", self.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='occupancy-history', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def rollups(self, start, end, spot=LOT, resolution=None):
+        """
+        Filas de rollup de `spot` (LOT: el lote) con bucket en [start, end). Sin `resolution`
+        se usa por minuto hasta un dia de rango y por hora desde ahi (solo hay horas por spot).
+        """
+        if resolution is None:
+            resolution = MINUTE if spot == LOT and end - start <= 86400 else HOUR
+        with self._db_lock:
+            cursor = self._db.execute(
+                'SELECT bucket, occupied_seconds, observed_seconds, changes, min_occupied, max_occupied '
+                'FROM rollups WHERE resolution = ? AND spot = ? AND bucket >= ? AND bucket < ? ORDER BY bucket',
+                (resolution, spot, int(start // resolution) * resolution, end))
+            rows = cursor.fetchall()
+        return [{'bucket': bucket, 'occupancy': occupied / observed if observed else None,
+                 'observed_seconds': observed, 'changes': changes,
+                 'min_occupied': low, 'max_occupied': high}
+                for bucket, occupied, observed, changes, low, high in rows]
+
+    def spot_changes(self, spot, start, end):
+        """Cambios (ts, empty, confidence) de un spot con ts en [start, end)."""
+        with self._db_lock:
+            cursor = self._db.execute('SELECT ts, empty, confidence FROM changes '
+                                      'WHERE spot = ? AND ts >= ? AND ts < ? ORDER BY ts', (spot, start, end))
+            return [{'ts': ts, 'empty': bool(empty), 'confidence': confidence} for ts, empty, confidence in cursor]
+
+    def http_handler(self, query):
+        """Ruta /history: ?start=&end= [&spot=] [&resolution=60|3600] [&raw=1] (segundos epoch)."""
+        try:
+            end = float(query['end'][0]) if 'end' in query else time.time()
+            start = float(query['start'][0]) if 'start' in query else end - 86400
+            spot = int(query['spot'][0]) if 'spot' in query else LOT
+            resolution = int(query['resolution'][0]) if 'resolution' in query else None
+        except ValueError:
+            return 400, 'text/plain', 'start, end, spot y resolution deben ser numeros\n'
+        if resolution not in (None, MINUTE, HOUR):
+            return 400, 'text/plain', f'resolution debe ser {MINUTE} o {HOUR}\n'
+        if 'raw' in query and spot == LOT:
+            return 400, 'text/plain', 'raw=1 requiere spot\n'
+        if 'raw' in query:
+            rows = self.spot_changes(spot, start, end)
+        else:
+            rows = self.rollups(start, end, spot, resolution)
+        return 200, 'application/json', json.dumps(rows) + '\n'
+
+
+def add_history_arguments(parser):
+    parser.add_argument('--history', default=None,
+                        help='Archivo SQLite para el historial de ocupacion (con rollups por minuto y hora)')
+    return parser
+
+
+def history_from_args(args):
+    if args.history is None:
+        return None
+    return OccupancyHistory(args.history).start()
@@ -0,0 +1,350 @@
+"""
+    Cambios de ocupacion publicados por Server-Sent Events y WebSocket.
+
+    Un servidor asyncio en un hilo de fondo atiende a todos los suscriptores desde un solo
+    proceso:
+
+        GET /events             text/event-stream, un evento por lote de cambios
+        GET /ws                 WebSocket (RFC 6455), un mensaje de texto por lote
+        GET /ws?format=binary   WebSocket con el formato de occupancy_codec (bits + deltas RLE)
+        GET /occupancy          estado completo en JSON
+        GET /occupancy.bin      snapshot de occupancy_codec
+
+    Cada mensaje es un JSON compacto:
+
+        {"seq": 42, "available": 118, "total": 300, "changes": [[spot, empty, confidence, ts], ...]}
+
+    con empty 1 / 0, confidence en [0.5, 1] (null si el modelo no la da) y ts en segundos
+    desde epoch. Un suscriptor nuevo recibe primero el estado de todos los spots conocidos.
+
+    Cada cliente guarda sus cambios pendientes por spot: si lee mas lento de lo que cambian
+    los spots, los cambios de un mismo spot se combinan y solo se envia el ultimo. La memoria
+    por cliente queda acotada por el numero de spots, y un cliente lento no frena al lazo de
+    video ni a los demas clientes (solo su propia tarea espera a drain()).
+
+    En formato binario cada cliente recuerda los bits del ultimo mensaje enviado y recibe un
+    solo delta desde ese seq hasta el actual (la combinacion equivalente), con un snapshot
+    cada SNAPSHOT_INTERVAL mensajes. Los clientes con la misma base comparten el mensaje.
+
+    Ejemplo:
+        python parking_manager3.py --stream-port 8765
+        curl -N http://localhost:8765/events
+    """
+
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import struct
+import threading
+import time
+
+import numpy as np
+
+from occupancy_codec import encode_snapshot, encode_update, pack
+
+logger = logging.getLogger('parking.stream')
+
+MAX_BATCH = 1024  # cambios por mensaje
+HEARTBEAT = 15.0  # segundos sin mensajes antes de un keepalive (detecta clientes caidos)
+HEADER_TIMEOUT = 10.0
+WRITE_BUFFER_HIGH = 16 * 1024  # bytes pendientes en el socket antes de esperar a drain() y combinar
+MAX_CLIENT_FRAME = 4096  # los clientes solo mandan frames de control
+SNAPSHOT_INTERVAL = 100  # mensajes binarios entre snapshots completos
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def _ws_frame(payload, opcode=OP_TEXT):
+    # Frame del servidor: FIN, sin mascara
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+def _ws_accept(key):
+    return base64.b64encode(hashlib.sha1(key.encode('ascii') + WS_GUID).digest()).decode('ascii')
+
+
+class _Client:
+    __slots__ = ('pending', 'wake', 'closed', 'binary', 'sent_bits', 'sent_seq', 'sent')
+
+    def __init__(self, wake, snapshot, binary=False):
+        self.pending = {} if binary else dict(snapshot)  # spot -> (empty, confidence, ts) aun no enviado
+        self.wake = wake
+        self.closed = False
+        # Formato binario: bits y seq del ultimo mensaje enviado, y mensajes enviados
+        self.binary = binary
+        self.sent_bits = None
+        self.sent_seq = None
+        self.sent = 0
+        if self.pending or binary:
+            wake.set()
+
+    def take(self, limit):
+        # En orden de llegada: un spot combinado conserva el lugar de su primer cambio pendiente
+        spots = list(itertools.islice(self.pending, limit))
+        return [[spot, *self.pending.pop(spot)] for spot in spots]
+
+
+class OccupancyPublisher:
+    """
+    n_spots (int): Spots del layout, para el total de los mensajes
+    host (str), port (int): Direccion del servidor (port 0 elige uno libre; ver .port)
+    max_clients (int): Suscriptores simultaneos; los siguientes reciben 503
+    """
+
+    def __init__(self, n_spots, host='0.0.0.0', port=8765, max_clients=10000):
+        self.total = n_spots
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        # Solo los modifica el hilo del servidor; el resto de los hilos solo los lee
+        self.state = {}
+        self.empty = np.zeros(n_spots, dtype=bool)
+        self.available = 0
+        self.seq = 0
+        self.clients = set()
+        self.coalesced = 0
+        self._writers = {}  # conexiones abiertas (writer -> tarea), para cortarlas al detener el servidor
+        self._bits = None
+        self._encoded = {}  # base_seq (None = snapshot) -> mensaje binario para el seq actual
+        self._loop = None
+        self._stopped = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='occupancy-stream', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        """Cierra el servidor y todas las conexiones; se puede llamar mas de una vez."""
+        if self._loop is not None and self._thread.is_alive():
+            try:
+                self._loop.call_soon_threadsafe(self._shutdown)
+            except RuntimeError:
+                pass  # el lazo ya termino
+        if self._thread is not None:
+            self._thread.join()
+
+    def _shutdown(self):
+        if not self._stopped.done():
+            self._stopped.set_result(None)
+
+    def publish(self, changes):
+        """
+        Publica los cambios del ciclo, (spot, empty, confidence); se puede llamar desde cualquier hilo.
+        """
+        ts = round(time.time(), 3)
+        items = [(int(spot), int(bool(empty)), None if confidence is None else round(float(confidence), 3), ts)
+                 for spot, empty, confidence in changes]
+        if items and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._apply, items)
+
+    def _apply(self, items):
+        updates = {}
+        for spot, empty, confidence, ts in items:
+            previous = self.state.get(spot)
+            self.available += empty - (previous[0] if previous is not None else 0)
+            self.state[spot] = updates[spot] = (empty, confidence, ts)
+            self.empty[spot] = empty
+        self.seq += 1
+        self._bits = None
+        self._encoded.clear()
+        # Un dict.update por cliente: los spots que ya estaban pendientes se combinan
+        for client in self.clients:
+            if client.binary:
+                client.wake.set()
+                continue
+            pending = len(client.pending)
+            client.pending.update(updates)
+            self.coalesced += len(updates) - (len(client.pending) - pending)
+            client.wake.set()
+
+    def _message(self, changes):
+        return json.dumps({'seq': self.seq, 'available': self.available, 'total': self.total,
+                           'changes': changes}, separators=(',', ':')).encode('utf-8')
+
+    def _binary_message(self, client):
+        if self._bits is None:
+            self._bits = pack(self.empty)
+        base = None if client.sent % SNAPSHOT_INTERVAL == 0 else client.sent_seq
+        message = self._encoded.get(base)
+        if message is None:
+            if base is None:
+                message = encode_snapshot(self.seq, self._bits, self.total)
+            else:
+                message = encode_update(base, self.seq, client.sent_bits, self._bits, self.total)
+            self._encoded[base] = message
+        client.sent_bits, client.sent_seq = self._bits, self.seq
+        client.sent += 1
+        return message
+
+    def _run(self):
+        # Solo se importa si se pide el stream, para no alargar el arranque
+        import asyncio
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        import asyncio
+        self._loop = asyncio.get_running_loop()
+        self._stopped = self._loop.create_future()
+        try:
+            server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        logger.info("Publicando ocupacion en http://%s:%d/events y ws://%s:%d/ws",
+                    self.host, self.port, self.host, self.port)
+        await self._stopped
+        server.close()
+        for client in list(self.clients):
+            client.closed = True
+            client.wake.set()
+        # Un cliente que no lee deja su tarea en drain() para siempre y wait_closed() no volveria
+        for writer in list(self._writers):
+            writer.transport.abort()
+        if self._writers:
+            await asyncio.wait(list(self._writers.values()), timeout=HEADER_TIMEOUT)
+        await server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        import asyncio
+        self._writers[writer] = asyncio.current_task()
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            path, _, query = target.partition('?')
+
+            if method != 'GET':
+                await self._reply(writer, '405 Method Not Allowed', 'text/plain', b'solo GET\n')
+            elif path == '/occupancy':
+                snapshot = [[spot, *value] for spot, value in sorted(self.state.items())]
+                await self._reply(writer, '200 OK', 'application/json', self._message(snapshot))
+            elif path == '/occupancy.bin':
+                message = encode_snapshot(self.seq, pack(self.empty), self.total)
+                await self._reply(writer, '200 OK', 'application/octet-stream', message)
+            elif path not in ('/events', '/ws'):
+                await self._reply(writer, '404 Not Found', 'text/plain', b'not found\n')
+            elif len(self.clients) >= self.max_clients:
+                await self._reply(writer, '503 Service Unavailable', 'text/plain', b'demasiados suscriptores\n')
+            elif path == '/events':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                             b'Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n')
+                await self._stream(reader, writer, websocket=False)
+            elif headers.get('upgrade', '').lower() == 'websocket' and 'sec-websocket-key' in headers:
+                writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                              f"Sec-WebSocket-Accept: {_ws_accept(headers['sec-websocket-key'])}\r\n\r\n")
+                             .encode('ascii'))
+                binary = 'format=binary' in query.split('&')
+                await self._stream(reader, writer, websocket=True, binary=binary)
+            else:
+                await self._reply(writer, '400 Bad Request', 'text/plain', b'se esperaba Upgrade: websocket\n')
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    async def _reply(writer, status, content_type, body):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+                     f'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'.encode('ascii') + body)
+        await writer.drain()
+
+    async def _stream(self, reader, writer, websocket, binary=False):
+        import asyncio
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        client = _Client(asyncio.Event(), self.state, binary)
+        self.clients.add(client)
+
+        # El lector detecta la desconexion (y en WebSocket contesta ping y close)
+        def closed(_):
+            client.closed = True
+            client.wake.set()
+        watcher = asyncio.ensure_future(self._ws_read(reader, writer) if websocket else reader.read())
+        watcher.add_done_callback(closed)
+        try:
+            while not client.closed:
+                try:
+                    await asyncio.wait_for(client.wake.wait(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    writer.write(_ws_frame(b'', OP_PING) if websocket else b': keepalive\n\n')
+                    await writer.drain()
+                    continue
+                client.wake.clear()
+                # Binario: un mensaje desde lo ultimo enviado mientras el seq avance durante drain()
+                while binary and client.sent_seq != self.seq and not client.closed:
+                    writer.write(_ws_frame(self._binary_message(client), OP_BINARY))
+                    await writer.drain()
+                # Mientras drain() espera, los cambios nuevos se combinan en client.pending
+                while client.pending and not client.closed:
+                    message = self._message(client.take(MAX_BATCH))
+                    writer.write(_ws_frame(message) if websocket
+                                 else b'id: %d\ndata: %s\n\n' % (self.seq, message))
+                    await writer.drain()
+        finally:
+            self.clients.discard(client)
+            watcher.cancel()
+
+    @staticmethod
+    async def _ws_read(reader, writer):
+        import asyncio
+        try:
+            while True:
+                first, second = await reader.readexactly(2)
+                opcode, length = first & 0x0F, second & 0x7F
+                if length == 126:
+                    (length,) = struct.unpack('!H', await reader.readexactly(2))
+                elif length == 127:
+                    (length,) = struct.unpack('!Q', await reader.readexactly(8))
+                if length > MAX_CLIENT_FRAME:
+                    writer.write(_ws_frame(struct.pack('!H', 1009), OP_CLOSE))
+                    return
+                mask = await reader.readexactly(4) if second & 0x80 else b'\0\0\0\0'
+                payload = bytes(b ^ mask[i & 3] for i, b in enumerate(await reader.readexactly(length)))
+                if opcode == OP_CLOSE:
+                    writer.write(_ws_frame(payload[:2], OP_CLOSE))
+                    return
+                if opcode == OP_PING:
+                    writer.write(_ws_frame(payload, OP_PONG))
+                # Texto, binario y pong del cliente se ignoran
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+
+def add_stream_arguments(parser):
+    parser.add_argument('--stream-port', type=int, default=None,
+                        help='Publicar los cambios de ocupacion por SSE (/events) y WebSocket (/ws) en este puerto')
+    parser.add_argument('--stream-host', default='0.0.0.0')
+    parser.add_argument('--stream-max-clients', type=int, default=10000)
+    return parser
+
+
+def stream_from_args(args, n_spots):
+    if args.stream_port is None:
+        return None
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    return OccupancyPublisher(n_spots, args.stream_host, args.stream_port, args.stream_max_clients).start()
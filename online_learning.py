@@ -0,0 +1,256 @@
+"""
+    Adaptacion en linea del clasificador con estados de spots confirmados.
+
+    Los spots cuya prediccion se mantiene estable y con alta confianza durante varios ciclos
+    se muestrean (como recortes uint8) en un buffer de repeticion acotado. Un hilo de fondo
+    actualiza con partial_fit una copia de un modelo lineal compatible y la publica con una
+    sola asignacion, de modo que la inferencia nunca espera al entrenamiento.
+
+    El lazo solo reclasifica los spots que cambiaron, que son los menos estables; con --online
+    se clasifica el lote completo cada --online-full-every ciclos para que los spots quietos
+    tambien lleguen al buffer. Un candidato se publica solo si acierta sobre un dataset
+    etiquetado (--online-validation) o, sin el, si coincide con el modelo base sobre el holdout:
+    las etiquetas del buffer salen del propio modelo y no sirven para validarlo.
+    """
+
+import copy
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+
+from util import crops_to_features, model_input, predict_with_confidence
+
+logger = logging.getLogger('parking.online')
+
+CLASSES = np.array([0, 1])  # 0 = vacio, 1 = ocupado
+VALIDATION_SAMPLES = 5000  # recortes de --online-validation que se cargan en memoria
+
+
+class ReplayBuffer:
+    """
+    Buffer acotado y balanceado por clase de recortes uint8 con su etiqueta.
+
+    Una fraccion de lo que entra se aparta como holdout: nunca se usa para entrenar, solo para
+    validar el modelo candidato antes de publicarlo.
+
+    capacity (int): Recortes maximos por clase; los mas viejos se descartan
+    holdout_fraction (float): Probabilidad de que un recorte vaya al holdout
+    """
+
+    def __init__(self, capacity=2000, seed=0, holdout_fraction=0.2):
+        self.capacity = capacity
+        self.holdout_fraction = holdout_fraction
+        self._items = {int(label): deque(maxlen=capacity) for label in CLASSES}
+        holdout_capacity = max(1, int(capacity * holdout_fraction))
+        self._holdout = {int(label): deque(maxlen=holdout_capacity) for label in CLASSES}
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self.added = 0
+
+    def add(self, crops, labels):
+        with self._lock:
+            held = self._rng.random(len(labels)) < self.holdout_fraction
+            for crop, label, holdout in zip(crops, labels, held):
+                (self._holdout if holdout else self._items)[int(label)].append(crop)
+            self.added += len(labels)
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    def sample(self, batch_size, holdout=False):
+        """Lote con la misma cantidad de recortes de cada clase (si la hay), del holdout si holdout=True."""
+        with self._lock:
+            per_class = batch_size // len(CLASSES)
+            crops, labels = [], []
+            for label, items in (self._holdout if holdout else self._items).items():
+                if not items:
+                    continue
+                idx = self._rng.choice(len(items), size=min(per_class, len(items)), replace=False)
+                crops.extend(items[i] for i in idx)
+                labels.extend([label] * len(idx))
+        if not crops:
+            return None, None
+        return np.stack(crops), np.asarray(labels)
+
+
+class StabilityTracker:
+    """
+    Confirma el estado de un spot cuando la misma prediccion se repite `min_cycles` ciclos
+    seguidos, todas con confianza >= `min_confidence`.
+    """
+
+    def __init__(self, n_spots, min_cycles=3, min_confidence=0.85):
+        self.min_cycles = min_cycles
+        self.min_confidence = min_confidence
+        self.last = np.full(n_spots, -1, dtype=np.int64)
+        self.streak = np.zeros(n_spots, dtype=np.int64)
+
+    def update(self, indices, labels, confidence):
+        """Devuelve la mascara (sobre `indices`) de los spots confirmados en este ciclo."""
+        indices = np.asarray(indices, dtype=np.intp)
+        confident = confidence >= self.min_confidence
+        same = self.last[indices] == labels
+        self.streak[indices] = np.where(confident & same, self.streak[indices] + 1, np.where(confident, 1, 0))
+        self.last[indices] = labels
+        return self.streak[indices] >= self.min_cycles
+
+
+class OnlineLearner:
+    """
+    Clasificador con actualizacion incremental en segundo plano.
+
+    Si el modelo base tiene partial_fit se actualiza una copia de el. Si no (p. ej. el SVC de
+    train.py) se entrena un SGDClassifier lineal con los estados confirmados y reemplaza al
+    modelo base cuando ha visto `warmup` muestras.
+
+    model: Modelo base (el de util.get_model())
+    n_spots (int): Numero de spots del layout
+    sample_rate (float): Probabilidad de guardar un spot confirmado en el buffer
+    batch_size (int): Tamaño de cada lote de partial_fit
+    interval (float): Segundos entre actualizaciones
+    min_accuracy (float): Exactitud sobre `validation`, o coincidencia con el modelo base sobre el
+        holdout, necesaria para publicar un candidato
+    validation (tuple): (recortes uint8, etiquetas) etiquetados a mano, p. ej. de un CropDataset
+    """
+
+    def __init__(self, model, n_spots, sample_rate=0.2, batch_size=256, interval=30.0,
+                 min_cycles=3, min_confidence=0.85, buffer_capacity=2000, warmup=1000,
+                 min_accuracy=0.95, validation=None, seed=0):
+        self.model = model  # el que se usa para inferencia; se reemplaza de una sola vez
+        self.base_model = model  # referencia fija para validar sin datos etiquetados
+        self.validation = validation
+        self.version = 0
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.interval = interval
+        self.warmup = warmup
+        self.min_accuracy = min_accuracy
+
+        self.buffer = ReplayBuffer(buffer_capacity, seed)
+        self.tracker = StabilityTracker(n_spots, min_cycles, min_confidence)
+        self._rng = np.random.default_rng(seed)
+
+        if hasattr(model, 'partial_fit'):
+            self._student = None
+        else:
+            # scikit-learn solo se importa con --online y un modelo sin partial_fit
+            from sklearn.linear_model import SGDClassifier
+            self._student = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=seed)
+        self._student_seen = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def classify(self, indices, crops):
+        """
+        Clasifica los recortes uint8 de los spots `indices` con el modelo vigente y alimenta el buffer.
+
+        Devuelve (vacio, confianza) por spot.
+        """
+        if len(indices) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+        model = self.model  # una sola lectura: el hilo de fondo puede reemplazarlo
+        y_output, confidence = predict_with_confidence(model, model_input(model, crops))
+
+        confirmed = self.tracker.update(indices, y_output, confidence)
+        chosen = confirmed & (self._rng.random(len(indices)) < self.sample_rate)
+        if chosen.any():
+            self.buffer.add(crops[chosen], y_output[chosen])
+        return y_output == 0, confidence
+
+    def update(self):
+        """Un paso de partial_fit sobre una copia del modelo y reemplazo atomico. Devuelve True si hubo cambio."""
+        crops, labels = self.buffer.sample(self.batch_size)
+        if crops is None or len(np.unique(labels)) < len(CLASSES):
+            return False
+        X = crops_to_features(crops)
+
+        if self._student is None:
+            candidate = copy.deepcopy(self.model)
+            candidate.partial_fit(X, labels, classes=CLASSES)
+        else:
+            self._student.partial_fit(X, labels, classes=CLASSES)
+            self._student_seen += len(labels)
+            if self._student_seen < self.warmup:
+                return False
+            candidate = copy.deepcopy(self._student)
+
+        if not self._accept(candidate):
+            return False
+
+        self.model = candidate
+        self.version += 1
+        return True
+
+    def _accept(self, candidate):
+        # Con datos etiquetados: exactitud minima y no peor que el modelo vigente. Sin ellos:
+        # coincidencia con el modelo base sobre el holdout (recortes con los que no se entreno)
+        if self.validation is not None:
+            crops, labels = self.validation
+            accuracy = np.mean(candidate.predict(model_input(candidate, crops)) == labels)
+            current = np.mean(self.model.predict(model_input(self.model, crops)) == labels)
+            if accuracy < max(self.min_accuracy, current):
+                logger.warning("Modelo en linea descartado: exactitud %.3f sobre la validacion (vigente %.3f)",
+                               accuracy, current)
+                return False
+            return True
+
+        crops, _ = self.buffer.sample(self.batch_size, holdout=True)
+        if crops is None:
+            return False
+        expected = self.base_model.predict(model_input(self.base_model, crops))
+        if len(np.unique(expected)) < len(CLASSES):
+            return False
+        agreement = np.mean(candidate.predict(model_input(candidate, crops)) == expected)
+        if agreement < self.min_accuracy:
+            logger.warning("Modelo en linea descartado: coincidencia %.3f con el modelo base", agreement)
+            return False
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.update():
+                    logger.info("Modelo en linea actualizado (version %d, buffer %d)", self.version, len(self.buffer))
+            except Exception:
+                logger.exception("Fallo la actualizacion en linea; se conserva el modelo actual")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='online-learning', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def add_online_arguments(parser):
+    parser.add_argument('--online', action='store_true',
+                        help='Adaptar el modelo en linea con los estados confirmados de los spots')
+    parser.add_argument('--online-interval', type=float, default=30.0, help='Segundos entre actualizaciones')
+    parser.add_argument('--online-sample-rate', type=float, default=0.2,
+                        help='Fraccion de spots confirmados que entran al buffer')
+    parser.add_argument('--online-full-every', type=int, default=10,
+                        help='Clasificar todos los spots cada N ciclos, para muestrear tambien los estables')
+    parser.add_argument('--online-validation', default=None,
+                        help='Dataset de recortes etiquetados (dataset_store) para aceptar los modelos en linea')
+    return parser
+
+
+def learner_from_args(args, model, n_spots):
+    if not args.online:
+        return None
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    validation = None
+    if args.online_validation is not None:
+        from dataset_store import CropDataset
+        dataset = CropDataset.open(args.online_validation)
+        rows = np.random.default_rng(0).permutation(len(dataset))[:VALIDATION_SAMPLES]
+        crops, labels = dataset.batch(rows)
+        validation = (crops, labels.astype(np.int64))
+    return OnlineLearner(model, n_spots, sample_rate=args.online_sample_rate,
+                         interval=args.online_interval, validation=validation).start()
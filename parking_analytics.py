@@ -0,0 +1,253 @@
+"""
+    Estadisticas de estancia, rotacion y ocupacion pico, actualizadas evento por evento.
+
+    Con cada entrada / salida se actualizan contadores del lote, del spot y de la zona por la
+    que entro el vehiculo; no se guardan los eventos. Las estadisticas de zona son siempre de la
+    zona de entrada: la salida se cuenta en la zona por la que entro el vehiculo, no en la que
+    sale. La rotacion por zona (vehiculos por spot y por dia) necesita "capacity" en la zona
+    (zones.json); sin ella solo se informan las entradas por dia. Las estancias van a un sketch de
+    cuantiles con error relativo acotado (QuantileSketch, al estilo de DDSketch) y las tasas
+    de llegada a un promedio con decaimiento exponencial (DecayingRate). Las consultas no
+    recorren eventos: conteos, tasas, picos y medias son O(1), y los cuantiles recorren los
+    buckets del sketch (unos cientos como maximo entre 1 s y 30 dias al 1 %).
+
+    Ejemplo:
+        python parking_manager.py --metrics-port 9100
+        curl http://localhost:9100/analytics
+        curl 'http://localhost:9100/analytics?spot=3'
+    """
+
+import bisect
+import json
+import math
+import threading
+import time
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """
+    Cuantiles con error relativo `relative_accuracy`: cada valor cuenta en el bucket
+    ceil(log_gamma(x)) y un cuantil se responde con el centro de su bucket.
+
+    min_value (float): Los valores menores cuentan como min_value (p. ej. estancias de 0 s)
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1.0):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.counts = {}  # bucket -> conteo
+        self._keys = []   # buckets ordenados
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def add(self, value):
+        key = math.ceil(math.log(max(value, self.min_value)) / self._log_gamma)
+        if key not in self.counts:
+            bisect.insort(self._keys, key)
+            self.counts[key] = 0
+        self.counts[key] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            if key not in self.counts:
+                bisect.insort(self._keys, key)
+                self.counts[key] = 0
+            self.counts[key] += count
+        self.count += other.count
+        self.sum += other.sum
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in self._keys:
+            seen += self.counts[key]
+            if seen > rank:
+                return min(2 * self.gamma ** key / (self.gamma + 1), self.max)
+        return self.max
+
+
+class DecayingRate:
+    """Eventos por hora, promediados con decaimiento exponencial de vida media `half_life` segundos."""
+
+    def __init__(self, half_life=3600.0):
+        self.tau = half_life / math.log(2)
+        self.value = 0.0
+        self.ts = None
+
+    def _decayed(self, ts):
+        if self.ts is None:
+            return 0.0
+        return self.value * math.exp(-max(ts - self.ts, 0.0) / self.tau)
+
+    def add(self, ts, n=1):
+        self.value = self._decayed(ts) + n
+        self.ts = ts
+
+    def per_hour(self, ts):
+        return self._decayed(ts) / self.tau * 3600
+
+
+class _Group:
+    # Estadisticas de un spot, una zona o el lote completo
+    __slots__ = ('capacity', 'dwell', 'arrivals', 'entries', 'exits', 'occupied', 'peak', 'peak_ts',
+                 'occupied_seconds', 'since', 'first_ts')
+
+    def __init__(self, capacity, half_life, relative_accuracy):
+        self.capacity = capacity
+        self.dwell = QuantileSketch(relative_accuracy)
+        self.arrivals = DecayingRate(half_life)
+        self.entries = 0
+        self.exits = 0
+        self.occupied = 0
+        self.peak = 0
+        self.peak_ts = None
+        self.occupied_seconds = 0.0
+        self.since = None
+        self.first_ts = None
+
+    def _advance(self, ts):
+        if self.since is None:
+            self.first_ts = ts
+        else:
+            self.occupied_seconds += self.occupied * max(ts - self.since, 0.0)
+        self.since = ts
+
+    def arrive(self, ts):
+        self._advance(ts)
+        self.entries += 1
+        self.arrivals.add(ts)
+        self.occupied += 1
+        if self.occupied > self.peak:
+            self.peak, self.peak_ts = self.occupied, ts
+
+    def depart(self, ts, dwell):
+        self._advance(ts)
+        self.exits += 1
+        self.occupied -= 1
+        self.dwell.add(dwell)
+
+    def stats(self, ts):
+        observed = ts - self.first_ts if self.first_ts is not None else 0.0
+        occupied_seconds = self.occupied_seconds
+        if self.since is not None:
+            occupied_seconds += self.occupied * max(ts - self.since, 0.0)
+        result = {
+            'entries': self.entries, 'exits': self.exits, 'occupied': self.occupied,
+            'peak_occupied': self.peak, 'peak_ts': self.peak_ts,
+            'arrivals_per_hour': round(self.arrivals.per_hour(ts), 3),
+            'dwell_count': self.dwell.count, 'dwell_mean': self.dwell.mean, 'dwell_max': self.dwell.max,
+        }
+        for q in QUANTILES:
+            result[f'dwell_p{round(q * 100)}'] = self.dwell.quantile(q)
+        # Sin capacidad (una zona de entrada sin "capacity") la rotacion queda en entradas por dia
+        result['entries_per_day'] = self.entries / (observed / 86400) if observed else None
+        if self.capacity:
+            # Rotacion: vehiculos por spot y por dia; utilizacion: fraccion del tiempo ocupado
+            result['turnover_per_day'] = self.entries / self.capacity / (observed / 86400) if observed else None
+            result['utilization'] = occupied_seconds / (self.capacity * observed) if observed else None
+        return result
+
+
+class ParkingAnalytics:
+    """
+    n_spots (int): Spots del lote
+    half_life (float): Vida media en segundos de las tasas de llegada
+    relative_accuracy (float): Error relativo de los cuantiles de estancia
+    zone_capacity (dict): Spots a los que da acceso cada zona (nombre -> capacidad), para la
+        rotacion y la utilizacion por zona
+
+    Se puede consultar desde otros hilos (la ruta /analytics del servidor de metricas).
+    """
+
+    def __init__(self, n_spots, half_life=3600.0, relative_accuracy=0.01, zone_capacity=None):
+        self._args = (half_life, relative_accuracy)
+        self.zone_capacity = dict(zone_capacity or {})
+        self.lot = _Group(n_spots, *self._args)
+        self.spots = [_Group(1, *self._args) for _ in range(n_spots)]
+        self.zones = {}
+        self._parked = {}  # spot -> (ts de entrada, zona)
+        self._lock = threading.RLock()
+
+    def entry(self, spot, ts=None, zone=None):
+        """Un vehiculo ocupa `spot` en `ts` (segundos epoch), habiendo entrado por `zone`."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if spot in self._parked:
+                # Entrada sin salida registrada: se cierra la estancia anterior
+                self.exit(spot, ts)
+            if zone is not None and zone not in self.zones:
+                self.zones[zone] = _Group(self.zone_capacity.get(zone), *self._args)
+            self._parked[spot] = (ts, zone)
+            for group in self._groups(spot, zone):
+                group.arrive(ts)
+
+    def exit(self, spot, ts=None):
+        """
+        El vehiculo de `spot` sale en `ts`; devuelve la estancia en segundos (None si no habia entrada).
+
+        La salida se cuenta en la zona por la que entro el vehiculo; la zona de salida no se registra.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            parked = self._parked.pop(spot, None)
+            if parked is None:
+                return None
+            entered, zone = parked
+            dwell = max(ts - entered, 0.0)
+            for group in self._groups(spot, zone):
+                group.depart(ts, dwell)
+        return dwell
+
+    def _groups(self, spot, zone):
+        groups = [self.lot, self.spots[spot]]
+        if zone is not None:
+            groups.append(self.zones[zone])
+        return groups
+
+    def lot_stats(self, ts=None):
+        with self._lock:
+            return self.lot.stats(time.time() if ts is None else ts)
+
+    def spot_stats(self, spot, ts=None):
+        with self._lock:
+            return self.spots[spot].stats(time.time() if ts is None else ts)
+
+    def zone_stats(self, zone, ts=None):
+        with self._lock:
+            return self.zones[zone].stats(time.time() if ts is None else ts)
+
+    def http_handler(self, query):
+        """Ruta /analytics: el lote y las zonas, o ?spot=N / ?zone=NOMBRE."""
+        ts = time.time()
+        if 'spot' in query:
+            try:
+                spot = int(query['spot'][0])
+                if not 0 <= spot < len(self.spots):
+                    raise ValueError(spot)
+            except ValueError:
+                return 400, 'text/plain', f'spot debe ser un entero entre 0 y {len(self.spots) - 1}\n'
+            body = {'spot': spot, **self.spot_stats(spot, ts)}
+        elif 'zone' in query:
+            zone = query['zone'][0]
+            if zone not in self.zones:
+                return 404, 'text/plain', f'zona sin eventos: {zone}\n'
+            body = {'zone': zone, **self.zone_stats(zone, ts)}
+        else:
+            with self._lock:
+                body = {'lot': self.lot_stats(ts), 'zones': {zone: self.zone_stats(zone, ts) for zone in self.zones}}
+        return 200, 'application/json', json.dumps(body) + '\n'
@@ -1,7 +1,17 @@
+import argparse
+
 import cv2
 import numpy as np
 from datetime import datetime
 
+from event_sink import add_event_arguments, events_from_args
+from frame_source import add_source_arguments, source_from_args
+from metrics import add_metrics_arguments, metrics_from_args
+from profiling import add_profiling_arguments, profiler_from_args
+from motion_detector import MotionDetector
+from parking_analytics import ParkingAnalytics
+from zones import ZoneMap
+
 # Simulación de la base de datos MongoDB
 parking_slots = [{"ocupado": False, "entrada": None, "salida": None} for _ in range(16)]
 
@@ -11,13 +21,8 @@ FRAME_HEIGHT = 480
 SLOT_WIDTH = 60
 SLOT_HEIGHT = 80
 
-# Zona de entrada/salida
-ENTRY_ZONE = (FRAME_WIDTH - 120, FRAME_HEIGHT - 100, 100, 80)  # (x, y, w, h)
-EXIT_ZONE = (20, 20, 100, 80)
-
-# Inicializar cámara y background subtractor
-cap = cv2.VideoCapture(0)
-fgbg = cv2.createBackgroundSubtractorMOG2()
+# Zonas de entrada/salida (poligonos en coordenadas del frame)
+ZONES_PATH = './zones.json'
 
 # Definir posiciones de los slots (en el centro del frame, 8 a la izquierda y 8 a la derecha)
 slot_positions = []
@@ -30,15 +35,17 @@ for row in range(2):  # 2 filas
         y = start_y + row * SLOT_HEIGHT
         slot_positions.append((x, y))
 
-def detectar_direccion(cx, cy):
-    ex, ey, ew, eh = ENTRY_ZONE
-    sx, sy, sw, sh = EXIT_ZONE
+def detectar_zonas(zone_map, boxes):
+    # Una sola busqueda en el mapa de zonas para todos los centroides
+    if not boxes:
+        return np.zeros(0, dtype=np.intp)
+    b = np.asarray(boxes)
+    cx = b[:, 0] + b[:, 2] // 2
+    cy = b[:, 1] + b[:, 3] // 2
+    return zone_map.lookup(cx, cy)
 
-    if ex <= cx <= ex + ew and ey <= cy <= ey + eh:
-        return "entrada"
-    elif sx <= cx <= sx + sw and sy <= cy <= sy + sh:
-        return "salida"
-    return None
+def detectar_direccion(zone_map, boxes):
+    return zone_map.kind(detectar_zonas(zone_map, boxes))
 
 def asignar_slot():
     for idx, slot in enumerate(parking_slots):
@@ -46,43 +53,36 @@ def asignar_slot():
             return idx
     return None
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
-    mask = fgbg.apply(frame)
-
-    # Detección de movimiento
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-    thresh = cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)[1]
-    thresh = cv2.dilate(thresh, kernel, iterations=2)
-    contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    for c in contours:
-        if cv2.contourArea(c) < 500:
-            continue
-
-        (x, y, w, h) = cv2.boundingRect(c)
-        cx, cy = x + w // 2, y + h // 2
-        direccion = detectar_direccion(cx, cy)
-
+def registrar_movimientos(direcciones, zonas=None, analytics=None, eventos=None):
+    # zonas: nombre de la zona de cada movimiento; analytics: ParkingAnalytics con estancias y rotacion
+    # eventos: BatchWriter que escribe las entradas / salidas fuera del lazo de captura
+    for k, direccion in enumerate(direcciones):
         if direccion == "entrada":
-            slot_id = asignar_slot()  
+            slot_id = asignar_slot()
             if slot_id is not None and not parking_slots[slot_id]["ocupado"]:
                 parking_slots[slot_id]["ocupado"] = True
                 parking_slots[slot_id]["entrada"] = datetime.now()
-                print(f"[ENTRADA] Carro en slot {slot_id + 1} a las {parking_slots[slot_id]['entrada']}")
+                if eventos is not None:
+                    eventos.emit({'tipo': 'entrada', 'slot': slot_id + 1, 'ts': parking_slots[slot_id]['entrada'],
+                                  'zona': zonas[k] if zonas is not None else None})
+                if analytics is not None:
+                    analytics.entry(slot_id, parking_slots[slot_id]["entrada"].timestamp(),
+                                    zonas[k] if zonas is not None else None)
 
         elif direccion == "salida":
             for idx in range(len(parking_slots)-1, -1, -1):
                 if parking_slots[idx]["ocupado"]:
                     parking_slots[idx]["ocupado"] = False
                     parking_slots[idx]["salida"] = datetime.now()
-                    print(f"[SALIDA] Slot {idx + 1} liberado a las {parking_slots[idx]['salida']}")
+                    if eventos is not None:
+                        eventos.emit({'tipo': 'salida', 'slot': idx + 1, 'ts': parking_slots[idx]['salida']})
+                    if analytics is not None:
+                        analytics.exit(idx, parking_slots[idx]["salida"].timestamp())
                     break
 
+def dibujar(frame, boxes, zone_map):
+    for (x, y, w, h) in boxes:
+        cx, cy = x + w // 2, y + h // 2
         cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
         cv2.circle(frame, (cx, cy), 5, (0, 255, 255), -1)
 
@@ -93,23 +93,76 @@ while True:
         cv2.putText(frame, str(idx + 1), (x + 5, y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
 
     # Dibujar zonas de entrada/salida
-    cv2.rectangle(frame, (ENTRY_ZONE[0], ENTRY_ZONE[1]),
-                  (ENTRY_ZONE[0] + ENTRY_ZONE[2], ENTRY_ZONE[1] + ENTRY_ZONE[3]),
-                  (255, 0, 0), 2)
-    cv2.putText(frame, "ENTRADA", (ENTRY_ZONE[0], ENTRY_ZONE[1] - 5),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-
-    cv2.rectangle(frame, (EXIT_ZONE[0], EXIT_ZONE[1]),
-                  (EXIT_ZONE[0] + EXIT_ZONE[2], EXIT_ZONE[1] + EXIT_ZONE[3]),
-                  (0, 255, 255), 2)
-    cv2.putText(frame, "SALIDA", (EXIT_ZONE[0], EXIT_ZONE[1] - 5),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-
-    # Mostrar
-    cv2.imshow("Estacionamiento", frame)
-    key = cv2.waitKey(30)
-    if key == 27:
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+    zone_map.draw(frame)
+
+def main(argv=None):
+    parser = add_source_arguments(argparse.ArgumentParser(description="Entradas y salidas del estacionamiento"))
+    add_metrics_arguments(parser)
+    add_profiling_arguments(parser)
+    add_event_arguments(parser)
+    args = parser.parse_args(argv)
+
+    zone_map = ZoneMap.from_config(ZONES_PATH, FRAME_WIDTH, FRAME_HEIGHT)
+
+    # Inicializar cámara y detector de movimiento (buffers reservados una sola vez)
+    cap = source_from_args(args)
+    detector = MotionDetector(FRAME_WIDTH, FRAME_HEIGHT)
+    metrics = profiler_from_args(args, metrics_from_args(args))
+    dropped = 0
+
+    # Estancias, rotacion y picos por slot y por zona de entrada, consultables en /analytics
+    # ("capacity" en zones.json: spots a los que da acceso la zona; sin ella la zona solo informa
+    # entradas por dia, no rotacion)
+    zone_capacity = {zone.get("name", str(zone_id)): zone["capacity"]
+                     for zone_id, zone in zone_map.zones.items() if "capacity" in zone}
+    analytics = ParkingAnalytics(len(parking_slots), zone_capacity=zone_capacity)
+    metrics.add_route('/analytics', analytics.http_handler)
+    # Entradas y salidas por una cola acotada: un destino lento no frena los frames
+    eventos = events_from_args(args)
+
+    frame_nmr = 0
+    while args.max_frames is None or frame_nmr < args.max_frames:
+        with metrics.stage('decode'):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        metrics.inc('frames_processed')
+        if cap.dropped != dropped:
+            metrics.inc('frames_dropped', cap.dropped - dropped)
+            dropped = cap.dropped
+
+        # Detección de movimiento
+        with metrics.stage('motion'):
+            boxes = detector.detect(frame)
+        frame = detector.frame
+
+        with metrics.stage('zones'):
+            zone_ids = detectar_zonas(zone_map, boxes)
+            direcciones = zone_map.kind(zone_ids)
+        registrar_movimientos(direcciones, zone_map.name(zone_ids), analytics, eventos)
+        metrics.set('event_queue_depth', eventos.depth)
+        metrics.set('events_dropped', eventos.dropped)
+        metrics.set('moving_objects', len(boxes))
+
+        with metrics.stage('draw'):
+            dibujar(frame, boxes, zone_map)
+        frame_nmr += 1
+
+        # Mostrar
+        if not args.headless:
+            with metrics.stage('display'):
+                cv2.imshow("Estacionamiento", frame)
+                key = cv2.waitKey(30)
+            if key == 27:
+                break
+
+        metrics.tick()
+
+    cap.release()
+    eventos.close()
+    metrics.close()
+    if not args.headless:
+        cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
-""" 
-    Necesitamos de una mascara con las marcas exactas en los spots para que esto funcione 
+"""
+    Necesitamos de una mascara con las marcas exactas en los spots para que esto funcione
     """
 
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
-from util import get_parking_spots_bboxes, empty_or_not
+from frame_source import add_source_arguments, source_from_args
+from layout import ParkingLayout
+from metrics import add_metrics_arguments, metrics_from_args
+from model_registry import RegistryClassifier, add_registry_arguments, registry_from_args
+from occupancy_history import add_history_arguments, history_from_args
+from occupancy_stream import add_stream_arguments, stream_from_args
+from online_learning import add_online_arguments, learner_from_args
+from profiling import add_profiling_arguments, profiler_from_args
+from spot_index import NO_SPOT
+import util
+from util import CHUNK_SIZE, classify_crops, empty_or_not, extract_crops, get_model, get_parking_spots_bboxes
 
 MASK_PATH = './mask.png'
 DRAW_INTERVAL = 30
@@ -17,57 +31,197 @@ def calc_diff(im1, im2):
     return np.abs(np.mean(im1) - np.mean(im2))
 
 
-# Leer la máscara en escala de grises
-mask = cv2.imread(MASK_PATH, cv2.IMREAD_GRAYSCALE)
+def load_components(mask_path=MASK_PATH):
+    # Leer la máscara en escala de grises
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise IOError(f"No se pudo leer la mascara {mask_path}")
+
+    # Convertir a binaria
+    _, binary_mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+    # Asegurar tipo correcto
+    binary_mask = binary_mask.astype(np.uint8)
+
+    # Obtener componentes conectados
+    return cv2.connectedComponentsWithStats(binary_mask, connectivity=4, ltype=cv2.CV_32S)
+
+
+def load_spots(mask_path=MASK_PATH):
+    return get_parking_spots_bboxes(load_components(mask_path))
+
+
+class MaskDiff:
+    """
+    Cambio del brillo medio de cada spot entre ciclos, solo sobre los pixeles de su componente
+    en la mascara (en spots en diagonal el bbox incluye vecinos y carril).
+
+    Los pixeles se ordenan por etiqueta una sola vez; en cada frame las medias de todos los
+    spots salen de un take y un add.reduceat, y se guardan para el ciclo siguiente, asi que
+    no hace falta conservar una copia del frame anterior. El frame puede ser una vista (la ROI
+    de los spots): los indices se ajustan al paso de fila del frame completo y no se copia.
+
+    label_ids (np.ndarray): Imagen de etiquetas de connectedComponentsWithStats (0 = fondo)
+    """
 
-cap = cv2.VideoCapture(0)
+    def __init__(self, label_ids, n_spots):
+        flat = label_ids.ravel()
+        counts = np.bincount(flat, minlength=n_spots + 1)
+        self.shape = label_ids.shape
+        self.pixels = np.argsort(flat, kind='stable')[counts[0]:]
+        self._pitch_pixels = {}  # paso de fila del frame (en pixeles) -> indices
+        if len(counts) > n_spots + 1:
+            raise ValueError(f"La mascara tiene etiquetas hasta {len(counts) - 1}, pero solo {n_spots} spots")
+        self.n_spots = n_spots
+        # reduceat solo sobre los spots con pixeles: con un segmento vacio devolveria el primer pixel
+        # del siguiente (o fallaria si es el ultimo). Los spots vacios, posibles en una mascara
+        # reescalada a muy baja resolucion, quedan con suma y media 0
+        self.nonempty = np.flatnonzero(counts[1:])
+        self.all_nonempty = len(self.nonempty) == n_spots
+        self.starts = np.concatenate([[0], np.cumsum(counts[1:][self.nonempty])[:-1]]).astype(np.intp)
+        self.counts = np.maximum(counts[1:], 1)
+        self.previous = None
 
-# Convertir a binaria
-_, binary_mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-# Asegurar tipo correcto
-binary_mask = binary_mask.astype(np.uint8)
+    @classmethod
+    def for_layout(cls, scaled):
+        """MaskDiff de un layout.ScaledLayout (para ScaledLayout.table)."""
+        return cls(scaled.labels, len(scaled))
 
-# Obtener componentes conectados
-num_labels, labels = cv2.connectedComponents(binary_mask, connectivity=4, ltype=cv2.CV_32S)
+    def reset(self):
+        """Olvida las medias guardadas: el siguiente update() vuelve a marcar todos los spots."""
+        self.previous = None
 
-spots = get_parking_spots_bboxes(labels)
+    def means(self, frame):
+        if frame.shape[:2] != self.shape:
+            raise ValueError(f"El frame ({frame.shape[1]}x{frame.shape[0]}) no coincide con la mascara "
+                             f"({self.shape[1]}x{self.shape[0]})")
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        values = self._gather(frame, channels)
+        if not len(self.nonempty):
+            return np.zeros(self.n_spots)
+        sums = np.add.reduceat(values, self.starts, axis=0, dtype=np.uint32).sum(axis=1)
+        if not self.all_nonempty:
+            sums, nonempty_sums = np.zeros(self.n_spots, dtype=sums.dtype), sums
+            sums[self.nonempty] = nonempty_sums
+        return sums / (self.counts * channels)
 
-spots_status = [False] * len(spots)
-diffs = [0.0] * len(spots)
-previous_frame = None
-frame_nmr = 0
+    def _gather(self, frame, channels):
+        # Pixeles de los spots, (n, channels), sin copiar el frame aunque sea una vista (la ROI)
+        height, width = frame.shape[:2]
+        if frame.flags.c_contiguous:
+            return np.take(frame.reshape(-1, channels), self.pixels, axis=0)
+        row_stride, pixel_stride = frame.strides[:2]
+        if pixel_stride <= 0 or row_stride <= 0 or row_stride % pixel_stride:
+            return np.take(np.ascontiguousarray(frame).reshape(-1, channels), self.pixels, axis=0)
+        pitch = row_stride // pixel_stride
+        pixels = self._pitch_pixels.get(pitch)
+        if pixels is None:
+            rows, cols = np.divmod(self.pixels, width)
+            pixels = self._pitch_pixels[pitch] = rows * pitch + cols
+        channel_stride = frame.strides[2] if frame.ndim == 3 else frame.itemsize
+        flat = np.lib.stride_tricks.as_strided(frame, shape=((height - 1) * pitch + width, channels),
+                                               strides=(pixel_stride, channel_stride), writeable=False)
+        return np.take(flat, pixels, axis=0)
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    def update(self, frame):
+        """|media actual - media del ciclo anterior| por spot; None la primera vez."""
+        means = self.means(frame)
+        previous, self.previous = self.previous, means
+        return None if previous is None else np.abs(means - previous)
 
-    if frame_nmr % DRAW_INTERVAL == 0:
-        if previous_frame is not None:
-            for i, (x, y, w, h) in enumerate(spots):
-                current_crop = frame[y:y + h, x:x + w]
-                prev_crop = previous_frame[y:y + h, x:x + w]
-                diffs[i] = calc_diff(current_crop, prev_crop)
 
-        # Determinar qué espacios verificar
+def spots_to_check(frame, previous_frame, spots, diffs, mask_diff=None):
+    # Con mask_diff (MaskDiff) se ignora previous_frame: las medias anteriores ya estan guardadas
+    if mask_diff is not None:
+        changes = mask_diff.update(frame)
+        if changes is None:
+            return range(len(spots))
+        diffs[:] = changes
+    else:
         if previous_frame is None:
-            indices_to_check = range(len(spots))
-        else:
-            max_diff = np.max(diffs)
-            indices_to_check = [i for i, d in enumerate(diffs) if d / max_diff > DIFF_THRESHOLD]
+            return range(len(spots))
+
+        for i, (x, y, w, h) in enumerate(spots):
+            current_crop = frame[y:y + h, x:x + w]
+            prev_crop = previous_frame[y:y + h, x:x + w]
+            diffs[i] = calc_diff(current_crop, prev_crop)
+
+    # Determinar qué espacios verificar
+    max_diff = np.max(diffs)
+    if max_diff == 0:
+        return []
+    return np.flatnonzero(np.asarray(diffs) / max_diff > DIFF_THRESHOLD).tolist()
+
 
-        # Clasificar espacios
-        for i in indices_to_check:
+def classify_spots(frame, spots, indices, spots_status, classifier=None, spots_version=None,
+                   pool=None, chunk_size=CHUNK_SIZE, warper=None, spots_confidence=None):
+    # Devuelve el numero de llamadas al clasificador.
+    # classifier: OnlineLearner o RegistryClassifier (por lotes); None usa empty_or_not por spot,
+    # o get_model() por bloques si hay pool, warper o spots_confidence.
+    # pool: ThreadPoolExecutor para recortar (y, sin classifier, predecir) por bloques de chunk_size spots
+    # warper: spot_warp.SpotWarper; los recortes salen rectificados de un solo remap en vez de los bboxes
+    # spots_confidence: lista que recibe la confianza de cada spot clasificado
+    if classifier is None and pool is None and warper is None and spots_confidence is None:
+        for i in indices:
             x, y, w, h = spots[i]
-            spot_crop = frame[y:y + h, x:x + w]
-            spots_status[i] = empty_or_not(spot_crop)
+            spots_status[i] = empty_or_not(frame[y:y + h, x:x + w])
+        return len(indices)
+
+    if len(indices) == 0:
+        return 0
+    if warper is not None:
+        crops = warper.extract(frame, indices)
+    else:
+        crops = extract_crops(frame, [spots[i] for i in indices], pool, chunk_size)
+    if classifier is None:
+        if spots_confidence is not None:
+            empty, confidence = classify_crops(get_model(), crops, pool, chunk_size, with_confidence=True)
+        else:
+            empty, confidence = classify_crops(get_model(), crops, pool, chunk_size), None
+        calls = -(-len(indices) // chunk_size) if pool is not None else 1
+    else:
+        # El clasificador guarda estado por spot (OnlineLearner): una sola llamada con todo el lote
+        empty, confidence = classifier.classify(indices, crops)
+        calls = 1
+    for k, i in enumerate(indices):
+        spots_status[i] = bool(empty[k])
+        if spots_confidence is not None:
+            spots_confidence[i] = float(confidence[k])
+        if spots_version is not None and classifier is not None:
+            spots_version[i] = classifier.version
+    return calls
+
+
+def spot_route(get_index, describe):
+    """
+    Ruta /spot para el servidor de metricas: GET /spot?x=..&y=.. devuelve el spot en ese punto y
+    GET /spot?x=..&y=..&w=..&h=.. los spots con pixeles dentro del rectangulo, en JSON.
+
+    get_index: Devuelve el SpotIndex vigente (cambia con la resolucion de los frames)
+    """
+    def handler(query):
+        index = get_index()
+        try:
+            x, y = int(query['x'][0]), int(query['y'][0])
+            w, h = (int(query['w'][0]), int(query['h'][0])) if 'w' in query else (None, None)
+        except (KeyError, ValueError):
+            return 400, 'text/plain', 'Se esperan x, y (y opcionalmente w, h) enteros\n'
+        if w is None:
+            ids = [i for i in index.at([x], [y]).tolist() if i != NO_SPOT]
+        else:
+            ids = index.overlapping(x, y, w, h, exact=True).tolist()
+        return 200, 'application/json', json.dumps([describe(i) for i in ids]) + '\n'
+    return handler
 
-        previous_frame = frame.copy()
 
-    # Dibujar resultados
-    for i, (x, y, w, h) in enumerate(spots):
-        color = (0, 255, 0) if spots_status[i] else (0, 0, 255)
-        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+def draw_status(frame, spots, spots_status, warper=None, view=None):
+    # view: vista del frame (la ROI) en cuyas coordenadas estan spots / warper; el contador va en el frame
+    canvas = frame if view is None else view
+    if warper is not None:
+        warper.draw(canvas, spots_status)
+    else:
+        for i, (x, y, w, h) in enumerate(spots):
+            color = (0, 255, 0) if spots_status[i] else (0, 0, 255)
+            cv2.rectangle(canvas, (x, y), (x + w, y + h), color, 2)
 
     # Mostrar contador de espacios disponibles
     available = sum(spots_status)
@@ -76,13 +230,177 @@ while True:
     cv2.putText(frame, f'Available spots: {available} / {total}', (100, 60),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
 
-    # Mostrar frame
-    cv2.namedWindow('frame', cv2.WINDOW_NORMAL)
-    cv2.imshow('frame', frame)
-    if cv2.waitKey(25) & 0xFF == ord('q'):
-        break
 
-    frame_nmr += 1
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Espacios disponibles a partir de la mascara de spots")
+    parser.add_argument('--mask', default=MASK_PATH, help='Mascara con los spots marcados')
+    parser.add_argument('--model', default=util.MODEL_PATH,
+                        help='Modelo pickled (.p) o exportado con numpy_model.py (.npz, sin scikit-learn)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Hilos para recortar y clasificar los spots por bloques (0 = todo en el hilo principal)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Spots por bloque con --threads')
+    parser.add_argument('--polygons', action='store_true',
+                        help='Spots como cuadrilateros del contorno de la mascara, rectificados con remap '
+                             '(para spots en angulo; el modelo debe entrenarse con train.py --polygons)')
+    parser.add_argument('--full-frame', action='store_true',
+                        help='Procesar el frame completo en lugar de solo la ROI (bbox union de los spots)')
+    add_source_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profiling_arguments(parser)
+    add_online_arguments(parser)
+    add_registry_arguments(parser)
+    add_stream_arguments(parser)
+    add_history_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.online and args.model_dir is not None:
+        # El aprendiz adapta su propia copia del modelo: las versiones del registro no le llegarian
+        parser.error("--online no se puede combinar con --model-dir")
+    util.MODEL_PATH = args.model
+
+    # La mascara se analiza una vez; bboxes, indice y mapas se reescalan a la resolucion de los frames.
+    # scaled esta en coordenadas del frame (inspeccion); work, en las de la ROI salvo con --full-frame,
+    # y es el que usan la deteccion de cambios, los recortes y el dibujo sobre work.view(frame)
+    layout = ParkingLayout.from_components(load_components(args.mask))
+    cap = source_from_args(args)
+    metrics = profiler_from_args(args, metrics_from_args(args))
+    metrics.set('spots', len(layout))
+
+    def use_layout(scaled):
+        work = scaled if args.full_frame else scaled.roi()
+        metrics.set('frame_width', scaled.width)
+        metrics.set('frame_height', scaled.height)
+        metrics.set('roi_fraction', work.width * work.height / (scaled.width * scaled.height))
+        return scaled, work, work.table('mask_diff', MaskDiff.for_layout)
+
+    scaled, work, mask_diff = use_layout(layout.at(*layout.native_size))
+
+    # Modelo: --model fijo, o la version vigente del registro para este sitio / camara
+    registry = registry_from_args(args)
+    classifier = RegistryClassifier(registry, args.site, args.camera) if registry is not None else None
+    base_model = registry.get(args.site, args.camera).model if registry is not None else get_model()
+    learner = learner_from_args(args, base_model, len(layout))
+    if learner is not None:
+        classifier = learner
+    pool = ThreadPoolExecutor(args.threads, thread_name_prefix='spots') if args.threads > 0 else None
+    if pool is not None:
+        pool = metrics.wrap_pool(pool)  # con --profile, las tareas tambien entran en el perfil de CPU
+    metrics.set('classify_threads', args.threads)
+    dropped = 0
+
+    spots_status = [False] * len(layout)
+    spots_version = [None] * len(layout)  # version del modelo que produjo cada estado
+    # Suscriptores (SSE / WebSocket) e historial: solo los spots cuyo estado cambio desde lo ultimo reportado
+    publisher = stream_from_args(args, len(layout))
+    history = history_from_args(args)
+    if history is not None:
+        metrics.add_route('/history', history.http_handler)
+    report = publisher is not None or history is not None
+    spots_confidence = [None] * len(layout) if report else None
+    reported = [None] * len(layout)
+    diffs = np.zeros(len(layout))
+    frame_nmr = 0
+    cycle = 0
+    recheck = False
+
+    # Inspeccion de spots por punto o rectangulo: clic en la ventana o /spot en --metrics-port
+    def describe(i):
+        return {'spot': i, 'bbox': list(scaled.spots[i]), 'empty': bool(spots_status[i]),
+                'diff': float(diffs[i]), 'model': spots_version[i]}
+    metrics.add_route('/spot', spot_route(lambda: scaled.index, describe))
+
+    if not args.headless:
+        cv2.namedWindow('frame', cv2.WINDOW_NORMAL)
+
+        def on_mouse(event, x, y, flags, param):
+            if event == cv2.EVENT_LBUTTONDOWN:
+                i = int(scaled.index.at(x, y))
+                if i != NO_SPOT:
+                    print(describe(i))
+        cv2.setMouseCallback('frame', on_mouse)
+
+    while args.max_frames is None or frame_nmr < args.max_frames:
+        with metrics.stage('decode'):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        metrics.inc('frames_processed')
+        if cap.dropped != dropped:
+            metrics.inc('frames_dropped', cap.dropped - dropped)
+            dropped = cap.dropped
+
+        if frame.shape[:2] != (scaled.height, scaled.width):
+            # Otra resolucion (cambio de camara o de stream): layout en cache, sin releer la mascara
+            with metrics.stage('layout'):
+                scaled, work, mask_diff = use_layout(layout.for_frame(frame))
+                mask_diff.reset()
+            metrics.inc('layout_switches')
+            recheck = True
+        spots = work.spots
+        warper = work.warper if args.polygons else None
+        view = work.view(frame)
+
+        if frame_nmr % DRAW_INTERVAL == 0 or recheck:
+            recheck = False
+            with metrics.stage('calc_diff'):
+                indices_to_check = spots_to_check(view, None, spots, diffs, mask_diff)
+            if learner is not None and cycle % args.online_full_every == 0:
+                # Lote completo de vez en cuando: los spots estables tambien alimentan al aprendiz
+                indices_to_check = range(len(spots))
+            cycle += 1
+
+            # Clasificar espacios
+            with metrics.stage('empty_or_not'):
+                calls = classify_spots(view, spots, indices_to_check, spots_status, classifier, spots_version,
+                                       pool, args.chunk_size, warper, spots_confidence)
+            if report:
+                changed = [i for i in indices_to_check if spots_status[i] != reported[i]]
+                changes = [(i, spots_status[i], spots_confidence[i]) for i in changed]
+                for i in changed:
+                    reported[i] = spots_status[i]
+            if publisher is not None:
+                publisher.publish(changes)
+                metrics.set('stream_clients', len(publisher.clients))
+                metrics.set('stream_coalesced', publisher.coalesced)
+            if history is not None:
+                with metrics.stage('history'):
+                    history.record(changes)
+            metrics.set('spots_rechecked_last_cycle', len(indices_to_check))
+            metrics.set('classifier_calls_last_cycle', calls)
+            metrics.inc('spots_rechecked', len(indices_to_check))
+            metrics.inc('classifier_calls', calls)
+            if learner is not None:
+                metrics.set('online_model_version', learner.version)
+
+        # Dibujar resultados
+        with metrics.stage('draw'):
+            draw_status(frame, spots, spots_status, warper, view)
+
+        # Mostrar frame
+        if not args.headless:
+            with metrics.stage('display'):
+                cv2.imshow('frame', frame)
+                key = cv2.waitKey(25) & 0xFF
+            if key == ord('q'):
+                break
+
+        frame_nmr += 1
+        metrics.tick()
+
+    cap.release()
+    metrics.close()
+    if pool is not None:
+        pool.shutdown()
+    if learner is not None:
+        learner.stop()
+    if registry is not None:
+        registry.stop()
+    if publisher is not None:
+        publisher.stop()
+    if history is not None:
+        history.close()
+    if not args.headless:
+        cv2.destroyAllWindows()
+
 
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
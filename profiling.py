@@ -0,0 +1,272 @@
+"""
+    Perfilado bajo demanda de los lazos de estacionamiento, sin reiniciar el proceso.
+
+    Con --profile las etapas indicadas (por defecto decode, calc_diff y empty_or_not)
+    quedan envueltas por un Profiler. Una ventana de perfilado se dispara con una señal
+    (SIGUSR1 = cProfile, SIGUSR2 = tracemalloc) o, con --profile-http, con
+    GET /profile?mode=cpu&seconds=30 en el puerto de metricas, y al terminar el reporte se
+    escribe en --profile-dir. cProfile solo ve el hilo que lo activa: las tareas del pool de
+    --threads se perfilan aparte (Profiler.wrap_pool) y se suman al reporte.
+    """
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger('parking.profiling')
+
+MODE_CPU = 'cpu'     # cProfile, solo mientras se ejecutan las etapas envueltas
+MODE_MEMORY = 'mem'  # tracemalloc, todo el proceso durante la ventana
+MODES = (MODE_CPU, MODE_MEMORY)
+
+DEFAULT_STAGES = ('decode', 'calc_diff', 'empty_or_not')
+TOP_N = 40
+
+
+class _ProfiledStage:
+    __slots__ = ('profiler', 'inner')
+
+    def __init__(self, profiler, inner):
+        self.profiler = profiler
+        self.inner = inner
+
+    def __enter__(self):
+        self.inner.__enter__()
+        cpu = self.profiler._cpu
+        if cpu is not None:
+            cpu.enable()
+        return self
+
+    def __exit__(self, *exc):
+        cpu = self.profiler._cpu
+        if cpu is not None:
+            cpu.disable()
+        return self.inner.__exit__(*exc)
+
+
+class _ProfiledPool:
+    """Pool (concurrent.futures) cuyas tareas se perfilan en su hilo mientras hay una ventana de CPU."""
+
+    def __init__(self, profiler, pool):
+        self.profiler = profiler
+        self.pool = pool
+
+    def submit(self, fn, *args, **kwargs):
+        if self.profiler._cpu is None:
+            return self.pool.submit(fn, *args, **kwargs)
+        return self.pool.submit(self.profiler._profiled_task, fn, args, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class Profiler:
+    """
+    Envuelve un objeto de metricas (Metrics o NullMetrics) y agrega ventanas de perfilado.
+
+    Expone la misma interfaz que las metricas, por lo que los lazos no cambian. Las ventanas
+    se piden desde cualquier hilo con trigger() y se abren/cierran en tick(), dentro del
+    hilo del lazo, que es el que ejecuta las etapas.
+
+    metrics: Metrics o NullMetrics a envolver
+    output_dir (str): Directorio donde se escriben los reportes
+    window (float): Duracion por defecto de una ventana en segundos
+    stages (tuple): Etapas que se perfilan con cProfile
+    """
+
+    def __init__(self, metrics, output_dir='profiles', window=30.0, stages=DEFAULT_STAGES):
+        self.metrics = metrics
+        self.output_dir = output_dir
+        self.window = window
+        self.stages = frozenset(stages)
+        self.reports = []
+
+        self._lock = threading.Lock()
+        self._pending = None      # (modo, segundos) pedido por trigger()
+        self._signalled = None    # modo pedido por señal; el handler no toma el lock
+        self._windows = 0         # ventanas abiertas, para que los reportes no se pisen
+        self._mode = None         # modo de la ventana activa
+        self._deadline = None
+        self._started = None
+        self._cpu = None
+        self._task_profiles = []  # cProfile de las tareas del pool terminadas en la ventana
+
+    # --- Interfaz de metricas ---
+    @property
+    def enabled(self):
+        return self.metrics.enabled
+
+    def stage(self, name):
+        inner = self.metrics.stage(name)
+        if name not in self.stages:
+            return inner
+        return _ProfiledStage(self, inner)
+
+    def observe_stage(self, name, seconds):
+        self.metrics.observe_stage(name, seconds)
+
+    def inc(self, name, value=1):
+        self.metrics.inc(name, value)
+
+    def set(self, name, value):
+        self.metrics.set(name, value)
+
+    def add_route(self, path, handler):
+        self.metrics.add_route(path, handler)
+
+    def wrap_pool(self, pool):
+        """Envuelve el pool de --threads para que sus tareas entren en las ventanas de cProfile."""
+        return _ProfiledPool(self, self.metrics.wrap_pool(pool))
+
+    def _profiled_task(self, fn, args, kwargs):
+        # Un perfil por tarea, activado y desactivado en el hilo del pool que la ejecuta
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._task_profiles.append(profile)
+
+    def tick(self):
+        self.metrics.tick()
+        if self._signalled is not None:
+            mode, self._signalled = self._signalled, None
+            self.trigger(mode)
+        if self._pending is None and self._deadline is None:
+            return
+        now = time.monotonic()
+        if self._deadline is not None and now >= self._deadline:
+            self._finish()
+        if self._pending is not None and self._deadline is None:
+            with self._lock:
+                mode, seconds = self._pending
+                self._pending = None
+            self._start(mode, seconds, now)
+
+    def close(self):
+        if self._deadline is not None:
+            self._finish()
+        self.metrics.close()
+
+    # --- Ventanas ---
+    def trigger(self, mode=MODE_CPU, seconds=None):
+        """Pide una ventana de perfilado; se abre en el siguiente tick() del lazo."""
+        if mode not in MODES:
+            raise ValueError(f"Modo de perfilado desconocido: {mode}")
+        with self._lock:
+            if self._pending is not None or self._deadline is not None:
+                return False
+            self._pending = (mode, seconds or self.window)
+        return True
+
+    def _start(self, mode, seconds, now):
+        self._mode = mode
+        self._windows += 1
+        self._started = time.time()
+        self._deadline = now + seconds
+        if mode == MODE_CPU:
+            with self._lock:
+                self._task_profiles = []
+            self._cpu = cProfile.Profile()
+        else:
+            tracemalloc.start(25)
+        logger.info("Perfilado %s iniciado por %.0f s", mode, seconds)
+
+    def _finish(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self._started))
+        base = os.path.join(self.output_dir, f'profile-{self._mode}-{stamp}-{os.getpid()}-{self._windows}')
+
+        if self._mode == MODE_CPU:
+            cpu, self._cpu = self._cpu, None
+            with self._lock:
+                profiles, self._task_profiles = [cpu] + self._task_profiles, []
+            out = io.StringIO()
+            stats = None
+            for profile in profiles:
+                if not profile.getstats():
+                    continue
+                if stats is None:
+                    stats = pstats.Stats(profile, stream=out)
+                else:
+                    stats.add(profile)
+            if stats is not None:
+                stats.dump_stats(base + '.prof')
+                stats.sort_stats('cumulative').print_stats(TOP_N)
+            else:
+                cpu.dump_stats(base + '.prof')
+                out.write('Ninguna etapa perfilada se ejecuto durante la ventana\n')
+            paths = [base + '.prof', base + '.txt']
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            snapshot.dump(base + '.tracemalloc')
+            out = io.StringIO()
+            for stat in snapshot.statistics('lineno')[:TOP_N]:
+                out.write(f'{stat}\n')
+            paths = [base + '.tracemalloc', base + '.txt']
+
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+
+        self.reports.extend(paths)
+        self._mode = self._deadline = self._started = None
+        logger.info("Reporte de perfilado escrito en %s", base + '.txt')
+
+    # --- Disparadores ---
+    def install_signal_handlers(self):
+        """
+        SIGUSR1 abre una ventana de cProfile y SIGUSR2 una de tracemalloc (no existe en Windows).
+
+        El handler corre en el hilo del lazo, posiblemente dentro de tick() con el lock tomado, asi
+        que solo anota el modo; el pedido se hace en el siguiente tick().
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            return False
+        signal.signal(signal.SIGUSR1, lambda *_: setattr(self, '_signalled', MODE_CPU))
+        signal.signal(signal.SIGUSR2, lambda *_: setattr(self, '_signalled', MODE_MEMORY))
+        return True
+
+    def http_handler(self, query):
+        mode = query.get('mode', [MODE_CPU])[0]
+        try:
+            seconds = float(query['seconds'][0]) if 'seconds' in query else None
+            accepted = self.trigger(mode, seconds)
+        except ValueError as e:
+            return 400, 'text/plain', f'{e}\n'
+        if not accepted:
+            return 409, 'text/plain', 'Ya hay una ventana de perfilado en curso\n'
+        return 202, 'text/plain', f'Perfilado {mode} programado, reporte en {self.output_dir}\n'
+
+
+def add_profiling_arguments(parser):
+    parser.add_argument('--profile', action='store_true',
+                        help='Habilitar perfilado bajo demanda con las señales SIGUSR1/SIGUSR2')
+    parser.add_argument('--profile-http', action='store_true',
+                        help='Permitir tambien GET /profile en --metrics-port (sin autenticacion)')
+    parser.add_argument('--profile-dir', default='profiles', help='Directorio para los reportes')
+    parser.add_argument('--profile-window', type=float, default=30.0, help='Duracion de la ventana en segundos')
+    parser.add_argument('--profile-stages', default=','.join(DEFAULT_STAGES),
+                        help='Etapas perfiladas con cProfile, separadas por coma')
+    return parser
+
+
+def profiler_from_args(args, metrics):
+    """Devuelve `metrics` tal cual si el perfilado no esta habilitado."""
+    if not args.profile:
+        return metrics
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    profiler = Profiler(metrics, args.profile_dir, args.profile_window,
+                        [s for s in args.profile_stages.split(',') if s])
+    profiler.install_signal_handlers()
+    if args.profile_http:
+        profiler.add_route('/profile', profiler.http_handler)
+    return profiler
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+NO_SPOT = -1
+
+
+class SpotIndex:
+    """
+    Indice espacial de los spots, construido una sola vez con el layout.
+
+    Los puntos se resuelven con la imagen de etiquetas de la mascara (una indexacion de
+    arreglo, pixel exacto). Las consultas por rectangulo usan una grilla uniforme: cada celda
+    guarda los spots cuyo bbox la toca, asi que solo se revisan los spots cercanos.
+
+    label_ids (np.ndarray): Imagen de etiquetas de connectedComponentsWithStats (spot i = etiqueta i + 1)
+    spots (list): Bboxes (x, y, w, h) en el mismo orden, como los de get_parking_spots_bboxes
+    cell_size (int): Lado de las celdas; por defecto el lado mediano de los spots
+    """
+
+    def __init__(self, label_ids, spots, cell_size=None):
+        self.labels = label_ids
+        self.height, self.width = label_ids.shape
+        self.boxes = np.asarray(spots, dtype=np.int64).reshape(-1, 4)
+        if cell_size is None:
+            cell_size = int(np.median(self.boxes[:, 2:].max(axis=1))) if len(self.boxes) else 64
+        self.cell_size = max(1, cell_size)
+        self.areas = np.bincount(label_ids.ravel(), minlength=len(self.boxes) + 1)[1:len(self.boxes) + 1]
+        self.grid_w = -(-self.width // self.cell_size)
+        self.grid_h = -(-self.height // self.cell_size)
+
+        # Grilla en formato CSR: los spots de la celda c son cell_spots[cell_start[c]:cell_start[c + 1]]
+        ranges = self._cell_ranges(self.boxes)
+        span_x = ranges[:, 2] - ranges[:, 0] + 1
+        n_cells = span_x * (ranges[:, 3] - ranges[:, 1] + 1)
+        owners = np.repeat(np.arange(len(self.boxes)), n_cells)
+        k = np.arange(len(owners)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        cells = ((ranges[owners, 1] + k // span_x[owners]) * self.grid_w
+                 + ranges[owners, 0] + k % span_x[owners])
+        order = np.argsort(cells, kind='stable')
+        self.cell_spots = owners[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.grid_w * self.grid_h + 1))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell_ranges(self, boxes):
+        # Celdas (x0, y0, x1, y1) inclusivas que toca cada rectangulo, recortadas a la grilla
+        x0 = np.clip(boxes[:, 0] // self.cell_size, 0, self.grid_w - 1)
+        y0 = np.clip(boxes[:, 1] // self.cell_size, 0, self.grid_h - 1)
+        x1 = np.clip((boxes[:, 0] + boxes[:, 2] - 1) // self.cell_size, 0, self.grid_w - 1)
+        y1 = np.clip((boxes[:, 1] + boxes[:, 3] - 1) // self.cell_size, 0, self.grid_h - 1)
+        return np.stack([x0, y0, x1, y1], axis=1)
+
+    def at(self, xs, ys):
+        """Indice del spot en cada punto (xs, ys); NO_SPOT fuera de todo spot o del frame."""
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        ids = np.full(xs.shape, NO_SPOT, dtype=np.int64)
+        ids[inside] = self.labels[ys[inside], xs[inside]].astype(np.int64) - 1
+        return ids
+
+    def _candidates(self, x, y, w, h):
+        cs = self.cell_size
+        x0, x1 = min(max(x // cs, 0), self.grid_w - 1), min(max((x + w - 1) // cs, 0), self.grid_w - 1)
+        y0, y1 = min(max(y // cs, 0), self.grid_h - 1), min(max((y + h - 1) // cs, 0), self.grid_h - 1)
+        # Las celdas de una fila de la grilla son contiguas en el CSR: un slice por fila
+        rows = np.arange(y0, y1 + 1) * self.grid_w
+        starts, ends = self.cell_start[rows + x0], self.cell_start[rows + x1 + 1]
+        if len(rows) == 1:
+            return np.unique(self.cell_spots[starts[0]:ends[0]])
+        return np.unique(np.concatenate([self.cell_spots[s:e] for s, e in zip(starts, ends)]))
+
+    def overlapping(self, x, y, w, h, exact=False):
+        """
+        Indices (ordenados) de los spots que se solapan con el rectangulo (x, y, w, h).
+
+        exact (bool): Contar solo los spots con algun pixel de su mascara dentro del rectangulo,
+            en lugar de los que solo tocan con su bbox (importa en spots en diagonal)
+        """
+        if w <= 0 or h <= 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = self._candidates(x, y, w, h)
+        bx, by, bw, bh = self.boxes[candidates].T
+        hit = (bx < x + w) & (x < bx + bw) & (by < y + h) & (y < by + bh)
+        candidates = candidates[hit]
+        if exact and len(candidates):
+            present = self.pixels_in(x, y, w, h)
+            candidates = candidates[present[candidates] > 0]
+        return candidates
+
+    def pixels_in(self, x, y, w, h):
+        """Pixeles de cada spot dentro del rectangulo (arreglo de largo len(self))."""
+        x0, y0 = max(int(x), 0), max(int(y), 0)
+        x1, y1 = min(int(x + w), self.width), min(int(y + h), self.height)
+        counts = np.zeros(len(self) + 1, dtype=np.int64)
+        if x1 > x0 and y1 > y0:
+            region = self.labels[y0:y1, x0:x1].ravel()
+            counts += np.bincount(region, minlength=len(self) + 1)[:len(self) + 1]
+        return counts[1:]
+
+    def assign(self, boxes, min_overlap=0.3):
+        """
+        Spot de cada rectangulo (p. ej. un vehiculo detectado): el que mas pixeles de su mascara
+        comparte con el, si cubre al menos `min_overlap` del spot; NO_SPOT si ninguno.
+        """
+        result = np.full(len(boxes), NO_SPOT, dtype=np.int64)
+        for k, (x, y, w, h) in enumerate(boxes):
+            candidates = self.overlapping(x, y, w, h)
+            if len(candidates) == 0:
+                continue
+            shared = self.pixels_in(x, y, w, h)[candidates]
+            best = int(np.argmax(shared))
+            if shared[best] >= min_overlap * self.areas[candidates[best]]:
+                result[k] = candidates[best]
+        return result
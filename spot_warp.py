@@ -0,0 +1,179 @@
+"""
+    Spots como cuadrilateros (del contorno de cada componente de la mascara) y recorte
+    rectificado con mapas de cv2.remap precalculados.
+
+    Cada spot se lleva a la entrada del clasificador (15x15) con una transformacion de
+    perspectiva; los mapas de todos los spots se apilan, de modo que recortar un lote es un
+    solo cv2.remap mas un promedio por bloques (supermuestreo, hace de anti-aliasing).
+    remap admite hasta 32767 filas, asi que los layouts muy grandes se reparten en pocos remaps.
+
+    Los mapas ocupan 6 bytes por muestra (x, y en int16 y la fraccion en uint16): 15 * 15 *
+    supersample^2 * 6 bytes por spot, unos 240 MB con 5000 spots y supersample 6, y se guardan
+    una vez por resolucion. El supermuestreo se reduce si los mapas pasarian de MAX_MAPS_BYTES.
+    """
+
+import cv2
+import numpy as np
+
+from util import CROP_SIZE
+
+MAX_SUPERSAMPLE = 8
+MAX_REMAP_ROWS = 32766  # cv2.remap exige menos de SHRT_MAX filas
+MAX_MAPS_BYTES = 256 * 1024 * 1024
+MAP_BYTES_PER_SAMPLE = 6
+MAX_GAP = 4  # spots sin pedir que se recortan igual para unir dos tramos en un solo remap
+
+
+def _order_corners(quad):
+    # Sentido horario empezando por la esquina superior izquierda: el lado de arriba del
+    # recorte es el del spot mas cercano a la horizontal, como con los bboxes
+    center = quad.mean(axis=0)
+    quad = quad[np.argsort(np.arctan2(quad[:, 1] - center[1], quad[:, 0] - center[0]))]
+    return np.roll(quad, -int(np.argmin(quad.sum(axis=1))), axis=0)
+
+
+def component_quad(component):
+    """
+    Cuadrilatero (4x2, float32, coordenadas de pixel) de una mascara binaria de un solo spot.
+
+    Usa los 4 vertices del contorno simplificado si existen (spots en perspectiva) y si no el
+    rectangulo rotado minimo. Las esquinas se extienden medio pixel para cubrir los pixeles
+    del borde, igual que un bbox.
+    """
+    contours, _ = cv2.findContours(component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contour = cv2.convexHull(max(contours, key=cv2.contourArea))
+    perimeter = cv2.arcLength(contour, True)
+    quad = None
+    for epsilon in (0.02, 0.04, 0.08):
+        approx = cv2.approxPolyDP(contour, epsilon * perimeter, True)
+        if len(approx) == 4:
+            quad = approx.reshape(4, 2).astype(np.float32)
+            break
+    if quad is None:
+        quad = cv2.boxPoints(cv2.minAreaRect(contour)).astype(np.float32)
+    quad = _order_corners(quad)
+    return quad + 0.5 * np.sign(quad - quad.mean(axis=0))
+
+
+def get_parking_spots_quads(connected_components):
+    """Cuadrilateros de los spots, en el mismo orden que util.get_parking_spots_bboxes."""
+    (totalLabels, label_ids, values, centroid) = connected_components
+
+    quads = []
+    for i in range(1, totalLabels):
+        x, y = values[i, cv2.CC_STAT_LEFT], values[i, cv2.CC_STAT_TOP]
+        w, h = values[i, cv2.CC_STAT_WIDTH], values[i, cv2.CC_STAT_HEIGHT]
+        component = (label_ids[y:y + h, x:x + w] == i).astype(np.uint8)
+        quads.append(component_quad(component) + np.float32([x, y]))
+    return quads
+
+
+class SpotWarper:
+    """
+    Recorta y rectifica lotes de spots a CROP_SIZE con un solo cv2.remap.
+
+    quads (list): Cuadrilateros 4x2 (tl, tr, br, bl) en coordenadas del frame
+    supersample (int): Muestras por lado de cada pixel de salida; por defecto segun el tamaño
+        tipico de los spots, para que las muestras queden a ~1 pixel del frame
+    """
+
+    def __init__(self, quads, supersample=None):
+        self.quads = np.asarray(quads, dtype=np.float32).reshape(-1, 4, 2)
+        out_h, out_w = CROP_SIZE[:2]
+        if supersample is None:
+            supersample = self.supersample_for(self.quads)
+        self.supersample = supersample
+        self.tile = (out_h * supersample, out_w * supersample)
+        self.spots_per_remap = MAX_REMAP_ROWS // self.tile[0]
+
+        # Centros de las muestras en coordenadas del recorte (0..15)
+        v, u = np.mgrid[0:self.tile[0], 0:self.tile[1]].astype(np.float64)
+        grid = np.stack([(u.ravel() + 0.5) / supersample, (v.ravel() + 0.5) / supersample,
+                         np.ones(u.size)])
+        target = np.float32([[0, 0], [out_w, 0], [out_w, out_h], [0, out_h]])
+
+        map_x = np.empty((len(self.quads),) + self.tile, dtype=np.float32)
+        map_y = np.empty_like(map_x)
+        for i, quad in enumerate(self.quads):
+            # El cuadrilatero ya esta en coordenadas con el centro de cada pixel en el entero, como remap
+            m = cv2.getPerspectiveTransform(target, quad).astype(np.float64)
+            p = m @ grid
+            map_x[i] = (p[0] / p[2]).reshape(self.tile)
+            map_y[i] = (p[1] / p[2]).reshape(self.tile)
+
+        # Mapas en punto fijo: remap mas rapido y la mitad de memoria que los float32
+        n = len(self.quads)
+        if n == 0:
+            # convertMaps no acepta mapas vacios (mascara sin spots)
+            self.maps_xy = np.empty((0,) + self.tile + (2,), dtype=np.int16)
+            self.maps_a = np.empty((0,) + self.tile, dtype=np.uint16)
+            return
+        maps_xy, maps_a = cv2.convertMaps(map_x.reshape(n * self.tile[0], self.tile[1]),
+                                          map_y.reshape(n * self.tile[0], self.tile[1]), cv2.CV_16SC2)
+        self.maps_xy = maps_xy.reshape((n,) + self.tile + (2,))
+        self.maps_a = maps_a.reshape((n,) + self.tile)
+
+    @staticmethod
+    def supersample_for(quads):
+        """
+        Supermuestreo por defecto para un layout: depende del conjunto completo de spots, y se
+        limita para que los mapas no pasen de MAX_MAPS_BYTES.
+        """
+        quads = np.asarray(quads, dtype=np.float32).reshape(-1, 4, 2)
+        if not len(quads):
+            return 1
+        sides = np.linalg.norm(np.diff(quads, axis=1, append=quads[:, :1]), axis=2)
+        typical = np.percentile(sides.max(axis=1), 90)
+        supersample = int(np.clip(np.ceil(typical / max(CROP_SIZE[:2])), 1, MAX_SUPERSAMPLE))
+        per_spot = CROP_SIZE[0] * CROP_SIZE[1] * MAP_BYTES_PER_SAMPLE
+        while supersample > 1 and len(quads) * per_spot * supersample ** 2 > MAX_MAPS_BYTES:
+            supersample -= 1
+        return supersample
+
+    def __len__(self):
+        return len(self.quads)
+
+    def extract(self, frame, indices=None):
+        """Recortes uint8 (N, 15, 15, 3) de los spots `indices` (todos si es None), en ese orden."""
+        if indices is None:
+            crops = np.empty((len(self),) + CROP_SIZE, dtype=np.uint8)
+            self._remap_range(frame, 0, len(self), crops)
+            return crops
+        indices = np.asarray(indices, dtype=np.intp)
+        crops = np.empty((len(indices),) + CROP_SIZE, dtype=np.uint8)
+        if not len(indices):
+            return crops
+        # Tramos de spots consecutivos (con huecos de hasta MAX_GAP): cada uno es un remap sobre una
+        # vista de los mapas, sin copiar los mapas de los spots pedidos en cada ciclo
+        order = np.argsort(indices, kind='stable')
+        ordered = indices[order]
+        position = 0
+        for run in np.split(ordered, np.flatnonzero(np.diff(ordered) > MAX_GAP + 1) + 1):
+            start, end = int(run[0]), int(run[-1]) + 1
+            block = np.empty((end - start,) + CROP_SIZE, dtype=np.uint8)
+            self._remap_range(frame, start, end, block)
+            crops[order[position:position + len(run)]] = block[run - start]
+            position += len(run)
+        return crops
+
+    def _remap_range(self, frame, start, end, out):
+        # Recortes de los spots start..end-1 en out; maps_xy[a:b] es una vista contigua
+        tile_h, tile_w = self.tile
+        for first in range(start, end, self.spots_per_remap):
+            last = min(first + self.spots_per_remap, end)
+            n = last - first
+            samples = cv2.remap(frame, self.maps_xy[first:last].reshape(n * tile_h, tile_w, 2),
+                                self.maps_a[first:last].reshape(n * tile_h, tile_w),
+                                cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+            if self.supersample > 1:
+                # Bloques enteros: INTER_AREA promedia exactamente cada supersample x supersample
+                samples = cv2.resize(samples, (CROP_SIZE[1], n * CROP_SIZE[0]), interpolation=cv2.INTER_AREA)
+            out[first - start:last - start] = samples.reshape((n,) + CROP_SIZE)
+
+    def draw(self, frame, spots_status):
+        # Contornos de los spots: verde libre, rojo ocupado (dos llamadas en total)
+        status = np.asarray(spots_status, dtype=bool)
+        # floor(q + 0.5) y no rint (redondeo al par): el contorno no cambia al desplazar el layout a la ROI
+        quads = np.floor(self.quads + 0.5).astype(np.int32)
+        for mask, color in ((status, (0, 255, 0)), (~status, (0, 0, 255))):
+            cv2.polylines(frame, list(quads[mask]), True, color, 2)
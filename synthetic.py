@@ -0,0 +1,210 @@
+"""
+    Generador de estacionamientos sinteticos para pruebas de carga sin camaras.
+
+    Ejemplo:
+        python synthetic.py --spots 1000 --frames 300 --out /tmp/lot
+        python parking_manager3.py --mask /tmp/lot/mask.png --source /tmp/lot/frames --speed fast --headless
+    """
+
+import argparse
+import math
+import os
+
+import cv2
+import numpy as np
+
+from frame_source import FrameSource, SPEED_FAST
+
+SPOT_SIZE = (40, 80)  # (ancho, alto) en pixeles
+SPOT_GAP = 8
+MARGIN = 20
+
+ASPHALT = 70
+LINE_COLOR = (220, 220, 220)
+
+
+def lot_geometry(n_spots, spot_size=SPOT_SIZE, gap=SPOT_GAP, margin=MARGIN, columns=None):
+    """
+    Calcula la posicion de N spots en filas (x, y, w, h) y el tamaño del frame.
+
+    Devuelve (bboxes, (width, height)). El orden es el mismo que produce
+    get_parking_spots_bboxes sobre la mascara: por filas, de izquierda a derecha.
+    """
+    w, h = spot_size
+    if columns is None:
+        # Aproximadamente 16:9
+        columns = max(1, math.ceil(math.sqrt(n_spots * (16 / 9) * (h + gap) / (w + gap))))
+    rows = math.ceil(n_spots / columns)
+
+    bboxes = []
+    for i in range(n_spots):
+        row, col = divmod(i, columns)
+        bboxes.append([margin + col * (w + gap), margin + row * (h + gap), w, h])
+
+    width = 2 * margin + columns * (w + gap) - gap
+    height = 2 * margin + rows * (h + gap) - gap
+    return bboxes, (width, height)
+
+
+def make_mask(n_spots, spot_size=SPOT_SIZE, gap=SPOT_GAP, margin=MARGIN, columns=None):
+    """Genera una mascara binaria (0/255) con N spots rectangulares separados."""
+    bboxes, (width, height) = lot_geometry(n_spots, spot_size, gap, margin, columns)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for x, y, w, h in bboxes:
+        mask[y:y + h, x:x + w] = 255
+    return mask
+
+
+class SyntheticLot:
+    """
+    Simula la ocupacion de un estacionamiento y dibuja los frames correspondientes.
+
+    Llegan en promedio `arrival_rate` carros por segundo (proceso de Poisson,
+    a spots libres elegidos al azar) y cada carro estacionado se va con probabilidad
+    `departure_rate` por segundo.
+
+    n_spots (int): Numero de spots
+    fps (float): Frames por segundo simulados
+    arrival_rate (float): Llegadas por segundo para todo el estacionamiento
+    departure_rate (float): Salidas por segundo por carro estacionado
+    initial_occupancy (float): Fraccion de spots ocupados al inicio
+    noise (int): Amplitud del ruido de sensor (0 para desactivarlo)
+    seed (int): Semilla para que las secuencias sean reproducibles
+    """
+
+    def __init__(self, n_spots, fps=30.0, arrival_rate=0.5, departure_rate=0.01,
+                 initial_occupancy=0.5, noise=6, seed=0, spot_size=SPOT_SIZE, columns=None):
+        self.n_spots = n_spots
+        self.fps = fps
+        self.arrival_rate = arrival_rate
+        self.departure_rate = departure_rate
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        self.bboxes, (self.width, self.height) = lot_geometry(n_spots, spot_size, columns=columns)
+        self.mask = make_mask(n_spots, spot_size, columns=columns)
+        self.occupied = self.rng.random(n_spots) < initial_occupancy
+        self.frame_nmr = 0
+
+        # Fondo con las lineas de cada spot; los frames se actualizan solo donde cambia algo
+        self.background = np.full((self.height, self.width, 3), ASPHALT, dtype=np.uint8)
+        for x, y, w, h in self.bboxes:
+            cv2.rectangle(self.background, (x - 2, y - 2), (x + w + 1, y + h + 1), LINE_COLOR, 1)
+        self.canvas = self.background.copy()
+        for i in np.flatnonzero(self.occupied):
+            self._paint_car(i)
+
+        self.frame = np.empty_like(self.canvas)
+        if noise:
+            self.noise_pool = [self.rng.integers(0, 2 * noise + 1, size=self.canvas.shape, dtype=np.uint8)
+                               for _ in range(4)]
+            self.canvas_offset = np.full_like(self.canvas, noise)
+
+    def _paint_car(self, i):
+        x, y, w, h = self.bboxes[i]
+        color = tuple(int(c) for c in self.rng.integers(30, 256, size=3))
+        cv2.rectangle(self.canvas, (x + 4, y + 6), (x + w - 5, y + h - 7), color, -1)
+        # Parabrisas
+        cv2.rectangle(self.canvas, (x + 7, y + h // 4), (x + w - 8, y + h // 4 + h // 6), (40, 40, 40), -1)
+
+    def _clear_spot(self, i):
+        x, y, w, h = self.bboxes[i]
+        self.canvas[y:y + h, x:x + w] = self.background[y:y + h, x:x + w]
+
+    def step(self):
+        """Avanza la simulacion un frame. Devuelve (llegadas, salidas) como arreglos de indices."""
+        dt = 1.0 / self.fps
+
+        leaving = np.flatnonzero(self.occupied & (self.rng.random(self.n_spots) < self.departure_rate * dt))
+        free = np.flatnonzero(~self.occupied)
+        n_arrivals = min(self.rng.poisson(self.arrival_rate * dt), len(free))
+        arriving = self.rng.choice(free, size=n_arrivals, replace=False) if n_arrivals else free[:0]
+
+        for i in leaving:
+            self._clear_spot(i)
+        for i in arriving:
+            self._paint_car(i)
+        self.occupied[leaving] = False
+        self.occupied[arriving] = True
+        self.frame_nmr += 1
+        return arriving, leaving
+
+    def render(self):
+        """Dibuja el frame actual (con ruido) en un buffer reutilizado."""
+        if not self.noise:
+            np.copyto(self.frame, self.canvas)
+        else:
+            cv2.subtract(self.canvas, self.canvas_offset, dst=self.frame)
+            cv2.add(self.frame, self.noise_pool[self.frame_nmr % len(self.noise_pool)], dst=self.frame)
+        return self.frame
+
+
+class SyntheticSource(FrameSource):
+    """FrameSource que entrega los frames de un SyntheticLot; `lot.occupied` es la verdad de cada frame."""
+
+    def __init__(self, lot, n_frames=None, speed=SPEED_FAST):
+        super().__init__(speed, lot.fps)
+        self.lot = lot
+        self.n_frames = n_frames
+        self._produced = 0
+
+    def _decode(self):
+        if self.n_frames is not None and self._produced >= self.n_frames:
+            return None
+        if self._produced:
+            self.lot.step()
+        self._produced += 1
+        # Copia para que el consumidor pueda quedarse con el frame (p. ej. previous_frame)
+        return self.lot.render().copy()
+
+    def _rewind(self):
+        # La simulacion sigue avanzando; solo se reinicia el contador de frames
+        self._produced = 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera una mascara y una secuencia de frames sinteticos")
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--arrival-rate', type=float, default=0.5, help='Llegadas por segundo')
+    parser.add_argument('--departure-rate', type=float, default=0.01, help='Salidas por segundo por carro')
+    parser.add_argument('--occupancy', type=float, default=0.5, help='Ocupacion inicial')
+    parser.add_argument('--noise', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--video', action='store_true', help='Escribir lot.avi en lugar de un directorio de imagenes')
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    lot = SyntheticLot(args.spots, args.fps, args.arrival_rate, args.departure_rate,
+                       args.occupancy, args.noise, args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    cv2.imwrite(os.path.join(args.out, 'mask.png'), lot.mask)
+
+    if args.video:
+        writer = cv2.VideoWriter(os.path.join(args.out, 'lot.avi'), cv2.VideoWriter_fourcc(*'MJPG'),
+                                 args.fps, (lot.width, lot.height))
+    else:
+        frames_dir = os.path.join(args.out, 'frames')
+        os.makedirs(frames_dir, exist_ok=True)
+
+    # Verdad por frame: True = ocupado
+    occupancy = np.zeros((args.frames, args.spots), dtype=bool)
+    for i in range(args.frames):
+        if i:
+            lot.step()
+        occupancy[i] = lot.occupied
+        frame = lot.render()
+        if args.video:
+            writer.write(frame)
+        else:
+            cv2.imwrite(os.path.join(frames_dir, f'{i:06d}.png'), frame)
+
+    if args.video:
+        writer.release()
+    np.save(os.path.join(args.out, 'occupancy.npy'), occupancy)
+    print(f"{args.spots} spots, {args.frames} frames de {lot.width}x{lot.height} en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
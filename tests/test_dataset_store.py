@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+import pytest
+
+from dataset_store import CropDataset
+from train import build_dataset
+
+
+def test_append_and_batch(tmp_path):
+    dataset = CropDataset.create(str(tmp_path / 'ds'), capacity=2)
+    crops = np.random.default_rng(0).integers(0, 256, (5, 15, 15, 3), dtype=np.uint8)
+    assert dataset.append(crops, [0, 1, 0, 1, 1]).tolist() == [0, 1, 2, 3, 4]
+
+    reopened = CropDataset.open(str(tmp_path / 'ds'))
+    assert len(reopened) == 5 and reopened.capacity >= 5
+    batch, labels = reopened.batch([4, 0, 2])
+    assert np.array_equal(batch, crops[[4, 0, 2]])
+    assert labels.tolist() == [1, 0, 0]
+
+
+def test_failed_extraction_leaves_dataset_unchanged(tmp_path):
+    frame_path = str(tmp_path / 'frame.png')
+    cv2.imwrite(frame_path, np.random.default_rng(1).integers(0, 256, (50, 50, 3), dtype=np.uint8))
+    spots = [(0, 0, 20, 20), (20, 20, 20, 20)]
+    path = str(tmp_path / 'ds')
+    build_dataset([(frame_path, 0, 0), (frame_path, 1, 1)], spots, path, n_jobs=1)
+
+    with pytest.raises(IOError):
+        build_dataset([(frame_path, 0, 1), (str(tmp_path / 'missing.png'), 1, 0)], spots, path, n_jobs=1)
+    dataset = CropDataset.open(path)
+    assert len(dataset) == 2
+    assert len(dataset.metadata()) == 2
+    assert dataset.labels.tolist() == [0, 1]
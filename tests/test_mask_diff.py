@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from parking_manager3 import MaskDiff
+
+
+def _brute_force_means(labels, n_spots, frame):
+    means = np.zeros(n_spots)
+    for spot in range(n_spots):
+        pixels = frame[labels == spot + 1]
+        if pixels.size:
+            means[spot] = pixels.mean()
+    return means
+
+
+def _random_labels(rng, shape, n_spots):
+    labels = np.zeros(shape, dtype=np.int32)
+    for spot in range(1, n_spots + 1):
+        y, x = rng.integers(0, shape[0] - 8), rng.integers(0, shape[1] - 8)
+        labels[y:y + rng.integers(1, 8), x:x + rng.integers(1, 8)] = spot
+    return labels
+
+
+def test_means_match_brute_force():
+    rng = np.random.default_rng(0)
+    labels = _random_labels(rng, (60, 80), 12)
+    frame = rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    np.testing.assert_allclose(MaskDiff(labels, 12).means(frame), _brute_force_means(labels, 12, frame))
+
+
+def test_empty_spots_read_zero():
+    # Spots 2 y 4 sin pixeles (mascara reescalada a muy baja resolucion), incluido el ultimo
+    labels = np.zeros((20, 30), dtype=np.int32)
+    labels[2:5, 2:6] = 1
+    labels[10:15, 10:20] = 3
+    frame = np.random.default_rng(1).integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    means = MaskDiff(labels, 4).means(frame)
+    np.testing.assert_allclose(means, _brute_force_means(labels, 4, frame))
+    assert means[1] == 0 and means[3] == 0
+
+
+def test_roi_view_matches_contiguous_frame():
+    rng = np.random.default_rng(2)
+    labels = _random_labels(rng, (40, 50), 6)
+    frame = rng.integers(0, 256, (100, 120, 3), dtype=np.uint8)
+    view = frame[30:70, 40:90]
+    mask_diff = MaskDiff(labels, 6)
+    np.testing.assert_allclose(mask_diff.means(view), mask_diff.means(np.ascontiguousarray(view)))
+
+
+def test_update_reports_changes_against_previous_cycle():
+    labels = np.zeros((10, 10), dtype=np.int32)
+    labels[:5] = 1
+    labels[5:] = 2
+    mask_diff = MaskDiff(labels, 2)
+    frame = np.zeros((10, 10), dtype=np.uint8)
+    assert mask_diff.update(frame) is None
+    frame[:5] = 100
+    np.testing.assert_allclose(mask_diff.update(frame), [100, 0])
+
+
+def test_labels_beyond_n_spots_are_rejected():
+    labels = np.zeros((10, 10), dtype=np.int32)
+    labels[0, 0], labels[5, 5] = 1, 3
+    with pytest.raises(ValueError):
+        MaskDiff(labels, 2)
@@ -0,0 +1,35 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import Metrics
+
+
+@pytest.fixture
+def served():
+    metrics = Metrics()
+    server = metrics.serve(0)
+    yield metrics, 'http://%s:%d' % server.server_address
+    metrics.close()
+
+
+def test_serve_binds_to_localhost_by_default(served):
+    metrics, base = served
+    assert base.startswith('http://127.0.0.1:')
+    with urllib.request.urlopen(base + '/metrics') as response:
+        assert response.status == 200
+
+
+def test_failing_route_returns_500(served):
+    metrics, base = served
+
+    def broken(query):
+        raise RuntimeError('boom')
+
+    metrics.add_route('/broken', broken)
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        urllib.request.urlopen(base + '/broken')
+    assert excinfo.value.code == 500
+    with urllib.request.urlopen(base + '/metrics') as response:
+        assert response.status == 200
@@ -0,0 +1,81 @@
+import json
+import pickle
+import time
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from model_registry import ModelRegistry
+from util import N_FEATURES
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    X = np.random.default_rng(0).random((10, N_FEATURES)).astype(np.float32)
+    model = LogisticRegression().fit(X, [0, 1] * 5)
+    with open(tmp_path / 'model.p', 'wb') as f:
+        pickle.dump(model, f)
+    return tmp_path, model
+
+
+def _select(directory, camera, name):
+    with open(directory / 'models.json', 'w', encoding='utf-8') as f:
+        json.dump({'cameras': {camera: name}}, f)
+
+
+def test_new_selection_loads_in_refresh_not_in_get(model_dir):
+    directory, model = model_dir
+    registry = ModelRegistry(str(directory))
+    first = registry.get(camera='norte')
+    assert first.name == 'model'
+
+    with open(directory / 'nuevo.p', 'wb') as f:
+        pickle.dump(model, f)
+    _select(directory, 'norte', 'nuevo')
+    registry._load_selection()
+    assert registry.get(camera='norte') is first  # aun no cargado: sigue el activo
+
+    assert registry.refresh() == ['nuevo']
+    assert registry.get(camera='norte').name == 'nuevo'
+
+
+@pytest.mark.parametrize('contents', [None, b'no es un pickle'])
+def test_missing_or_broken_selection_keeps_active_model(model_dir, contents):
+    directory, _ = model_dir
+    registry = ModelRegistry(str(directory))
+    first = registry.get(camera='norte')
+    if contents is not None:
+        (directory / 'roto.p').write_bytes(contents)
+    _select(directory, 'norte', 'roto')
+
+    assert registry.refresh() == []
+    assert registry.get(camera='norte') is first
+
+
+@pytest.mark.parametrize('contents', ['{"sites": ["centro"]}', '{"cameras": {"norte": "nue', '[]'])
+def test_malformed_selection_keeps_previous_one(model_dir, contents):
+    directory, _ = model_dir
+    _select(directory, 'norte', 'model')
+    registry = ModelRegistry(str(directory))
+    (directory / 'models.json').write_text(contents, encoding='utf-8')
+    registry.refresh()
+    assert registry.selection == {'cameras': {'norte': 'model'}}
+    assert registry.get(camera='norte').name == 'model'
+
+
+def test_watcher_survives_refresh_errors(model_dir, monkeypatch):
+    directory, _ = model_dir
+    registry = ModelRegistry(str(directory), poll_interval=0.01)
+    calls = []
+
+    def failing_refresh():
+        calls.append(1)
+        raise RuntimeError('falla')
+    monkeypatch.setattr(registry, 'refresh', failing_refresh)
+    registry.start()
+    try:
+        time.sleep(0.1)
+        assert registry._thread.is_alive() and len(calls) > 1
+    finally:
+        registry.stop()
@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+from motion_detector import MotionDetector, _legacy_detect
+
+
+def _frames(n=12, size=(720, 1280)):
+    # Fondo con ruido fijo y un rectangulo claro que cruza la escena
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 80, size + (3,), dtype=np.uint8)
+    frames = []
+    for i in range(n):
+        frame = background.copy()
+        x = 100 + 80 * i
+        frame[300:450, x:x + 200] = 220
+        frames.append(frame)
+    return frames
+
+
+def test_detect_matches_legacy_loop():
+    detector = MotionDetector(640, 480)
+    fgbg = cv2.createBackgroundSubtractorMOG2()
+    seen = 0
+    for frame in _frames():
+        boxes = detector.detect(frame)
+        assert sorted(boxes) == sorted(_legacy_detect(frame, fgbg, 640, 480))
+        seen += len(boxes)
+    assert seen > 0
+
+
+def test_detect_reuses_buffers():
+    detector = MotionDetector(320, 240)
+    buffers = [detector.frame, detector.fgmask, detector.thresh, detector.dilated]
+    for frame in _frames(4, (480, 640)):
+        detector.detect(frame)
+    assert all(a is b for a, b in zip(buffers, [detector.frame, detector.fgmask, detector.thresh,
+                                                 detector.dilated]))
+    assert detector.frame.shape == (240, 320, 3)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import SVC
+
+from numpy_model import NumpyModel, verify
+from util import CROP_SIZE, crops_to_features, model_input
+
+
+@pytest.fixture(scope='module')
+def crops():
+    # Recortes "vacios" oscuros y "ocupados" claros, con ruido para que haya vectores de soporte
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, 400)
+    base = np.where(labels, 170, 80)[:, None, None, None]
+    noise = rng.normal(0, 40, (len(labels),) + CROP_SIZE)
+    return np.clip(base + noise, 0, 255).astype(np.uint8), labels
+
+
+MODELS = {
+    'linear': lambda: LogisticRegression(max_iter=500),
+    'rbf': lambda: SVC(gamma=0.01, C=10),
+    'poly': lambda: SVC(kernel='poly', degree=2, gamma=0.01),
+    'forest': lambda: RandomForestClassifier(n_estimators=10, max_depth=6, random_state=0),
+}
+
+
+@pytest.mark.parametrize('name', sorted(MODELS))
+@pytest.mark.parametrize('pixel_input', [True, False])
+def test_exported_model_matches_sklearn(crops, name, pixel_input, tmp_path):
+    X, y = crops
+    model = MODELS[name]().fit(crops_to_features(X), y)
+    exported = NumpyModel.from_model(model, pixel_input=pixel_input)
+    unseen = np.random.default_rng(1).integers(0, 256, (500,) + CROP_SIZE, dtype=np.uint8)
+    assert verify(model, exported, X) == 0
+    assert verify(model, exported, unseen) == 0
+
+    exported.save(tmp_path / 'model.npz')
+    loaded = NumpyModel.load(tmp_path / 'model.npz')
+    assert np.array_equal(loaded.predict(model_input(loaded, unseen)),
+                          exported.predict(model_input(exported, unseen)))
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from occupancy_codec import (OccupancyDecoder, encode_delta, encode_snapshot, encode_update, pack, unpack)
+
+
+@pytest.mark.parametrize('n_spots', [1, 7, 8, 9, 300, 5000])
+def test_pack_round_trip(n_spots):
+    empty = np.random.default_rng(n_spots).random(n_spots) < 0.5
+    assert np.array_equal(unpack(pack(empty), n_spots), empty)
+
+
+def test_snapshot_then_deltas_reconstruct_state():
+    rng = np.random.default_rng(0)
+    n_spots = 1000
+    state = rng.random(n_spots) < 0.5
+    decoder = OccupancyDecoder()
+    assert decoder.apply(encode_snapshot(0, pack(state), n_spots))
+    for seq in range(1, 50):
+        previous = pack(state)
+        state = state.copy()
+        flips = rng.choice(n_spots, size=rng.integers(0, 20), replace=False)
+        state[flips] ^= True
+        assert decoder.apply(encode_update(seq - 1, seq, previous, pack(state), n_spots))
+        assert decoder.seq == seq
+        assert np.array_equal(decoder.empty, state)
+        assert decoder.available == int(state.sum())
+
+
+def test_delta_of_isolated_change_is_small_and_large_change_falls_back_to_snapshot():
+    n_spots = 5000
+    before = np.zeros(n_spots, dtype=bool)
+    after = before.copy()
+    after[2500] = True
+    snapshot = encode_snapshot(1, pack(after), n_spots)
+    delta = encode_update(0, 1, pack(before), pack(after), n_spots)
+    assert delta[0] == ord('D') and len(delta) < 16
+
+    noisy = np.random.default_rng(1).random(n_spots) < 0.5
+    assert encode_update(0, 1, pack(before), pack(noisy), n_spots) == encode_snapshot(1, pack(noisy), n_spots)
+    assert len(snapshot) == 9 + n_spots // 8
+
+
+def test_delta_on_another_seq_is_ignored():
+    decoder = OccupancyDecoder()
+    bits = pack(np.zeros(16, dtype=bool))
+    decoder.apply(encode_snapshot(5, bits, 16))
+    assert not decoder.apply(encode_delta(4, 6, bits, pack(np.ones(16, dtype=bool))))
+    assert decoder.seq == 5 and not decoder.empty.any()
+
+
+def test_malformed_messages_raise():
+    with pytest.raises(ValueError):
+        OccupancyDecoder().apply(encode_snapshot(0, b'\x00', 16))
+    with pytest.raises(ValueError):
+        OccupancyDecoder().apply(b'X' + bytes(8))
@@ -0,0 +1,36 @@
+import pytest
+
+from occupancy_history import HOUR, LOT, MINUTE, OccupancyHistory
+
+T0 = 1760000400  # inicio de una hora
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = OccupancyHistory(str(tmp_path / 'history.db'))
+    yield history
+    history.close()
+
+
+def test_rollups_accumulate_occupied_seconds(history):
+    history.record([(0, True, 0.9), (1, False, 0.8)], ts=T0)
+    history.record([(0, False, 0.9)], ts=T0 + 30)
+    history.flush(now=T0 + 2 * MINUTE)
+
+    first, second = history.rollups(T0, T0 + 2 * MINUTE, resolution=MINUTE)
+    assert first['observed_seconds'] == 2 * MINUTE
+    assert first['occupancy'] == pytest.approx(90 / 120)
+    assert (first['min_occupied'], first['max_occupied']) == (1, 2)
+    assert second['occupancy'] == 1.0
+    [spot_hour] = history.rollups(T0, T0 + HOUR, spot=0)
+    assert spot_hour['observed_seconds'] == 2 * MINUTE and spot_hour['changes'] == 2
+
+
+def test_http_handler(history):
+    history.record([(3, True, None)], ts=T0)
+    history.flush(now=T0 + 1)
+    status, _, body = history.http_handler({'raw': ['1'], 'spot': ['3'], 'start': [str(T0)], 'end': [str(T0 + 1)]})
+    assert status == 200 and '"empty": true' in body
+    assert history.http_handler({'raw': ['1']})[0] == 400
+    assert history.http_handler({'resolution': ['5']})[0] == 400
+    assert history.rollups(T0, T0 + 1, spot=LOT, resolution=MINUTE)
@@ -0,0 +1,46 @@
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from online_learning import OnlineLearner, ReplayBuffer
+from util import CROP_SIZE, crops_to_features
+
+
+def _crops(n, seed=0):
+    # Vacios oscuros (0), ocupados claros (1)
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 2, n)
+    crops = np.clip(np.where(labels, 180, 60)[:, None, None, None] + rng.normal(0, 20, (n,) + CROP_SIZE), 0, 255)
+    return crops.astype(np.uint8), labels
+
+
+def _base_model():
+    crops, labels = _crops(200, seed=1)
+    return SGDClassifier(loss='log_loss', random_state=0).fit(crops_to_features(crops), labels)
+
+
+def test_holdout_is_never_sampled_for_training():
+    buffer = ReplayBuffer(capacity=1000, holdout_fraction=0.5)
+    crops, labels = _crops(400)
+    buffer.add(crops, labels)
+    train, _ = buffer.sample(1000)
+    held, _ = buffer.sample(1000, holdout=True)
+    assert len(train) + len(held) == 400
+    assert not {c.tobytes() for c in train} & {c.tobytes() for c in held}
+
+
+def test_candidate_must_agree_with_base_model():
+    learner = OnlineLearner(_base_model(), 10, min_accuracy=0.9)
+    crops, labels = _crops(400, seed=2)
+    # Etiquetas invertidas en el buffer: el candidato aprende lo contrario que el modelo base
+    learner.buffer.add(crops, 1 - learner.model.predict(crops_to_features(crops)))
+    for _ in range(5):
+        learner.update()
+    assert learner.version == 0 and learner.model is learner.base_model
+
+
+def test_labelled_validation_gates_promotion():
+    crops, labels = _crops(400, seed=3)
+    learner = OnlineLearner(_base_model(), 10, min_accuracy=0.9, validation=_crops(200, seed=4))
+    learner.buffer.add(crops, labels)
+    assert learner.update()
+    assert learner.version == 1
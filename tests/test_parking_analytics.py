@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from parking_analytics import ParkingAnalytics, QuantileSketch
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.05])
+def test_quantile_sketch_relative_error(relative_accuracy):
+    values = np.random.default_rng(0).lognormal(mean=7, sigma=1.5, size=20000)
+    sketch = QuantileSketch(relative_accuracy)
+    for value in values:
+        sketch.add(value)
+    ordered = np.sort(values)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= relative_accuracy * exact * (1 + 1e-9)
+    assert sketch.count == len(values)
+    assert sketch.max == values.max()
+
+
+def test_quantile_sketch_merge_matches_single_sketch():
+    values = np.random.default_rng(1).exponential(3600, size=5000)
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+    assert left.counts == whole.counts
+    for q in (0.5, 0.9, 0.99):
+        assert left.quantile(q) == whole.quantile(q)
+
+
+def test_zone_turnover():
+    analytics = ParkingAnalytics(4, zone_capacity={'norte': 2})
+    for spot in range(4):
+        analytics.entry(spot, ts=spot, zone='norte' if spot < 2 else 'sur')
+    day = 86400
+    north = analytics.zone_stats('norte', ts=day)
+    south = analytics.zone_stats('sur', ts=day + 2)
+    assert north['entries'] == 2
+    assert north['turnover_per_day'] == pytest.approx(1.0)
+    assert 'turnover_per_day' not in south
+    assert south['entries_per_day'] == pytest.approx(2.0)
+
+
+def test_exit_counts_in_entry_zone():
+    analytics = ParkingAnalytics(2, zone_capacity={'ENTRADA': 2})
+    analytics.entry(0, ts=0, zone='ENTRADA')
+    assert analytics.exit(0, ts=60) == 60
+    stats = analytics.zone_stats('ENTRADA', ts=120)
+    assert stats['exits'] == 1
+    assert stats['occupied'] == 0
+    assert stats['dwell_count'] == 1
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import NullMetrics
+from profiling import MODE_CPU, Profiler
+
+
+def busy_pool_task(n):
+    return sum(i * i for i in range(n))
+
+
+def test_cpu_window_includes_pool_tasks(tmp_path):
+    profiler = Profiler(NullMetrics(), output_dir=str(tmp_path), window=60)
+    with ThreadPoolExecutor(2) as executor:
+        pool = profiler.wrap_pool(executor)
+        assert profiler.trigger(MODE_CPU)
+        profiler.tick()
+        with profiler.stage('empty_or_not'):
+            futures = [pool.submit(busy_pool_task, 10000) for _ in range(4)]
+            assert [f.result() for f in futures] == [busy_pool_task(10000)] * 4
+        profiler.close()
+
+    report = [p for p in profiler.reports if p.endswith('.txt')][0]
+    with open(report, encoding='utf-8') as f:
+        assert 'busy_pool_task' in f.read()
+
+
+def test_pool_runs_tasks_unprofiled_outside_window(tmp_path):
+    profiler = Profiler(NullMetrics(), output_dir=str(tmp_path))
+    with ThreadPoolExecutor(1) as executor:
+        pool = profiler.wrap_pool(executor)
+        assert pool.submit(busy_pool_task, 10).result() == busy_pool_task(10)
+    assert profiler._task_profiles == []
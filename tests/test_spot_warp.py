@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import spot_warp
+from spot_warp import SpotWarper
+
+
+def _quads(n):
+    # Spots de 40x60 en fila, algunos en perspectiva
+    quads = []
+    for i in range(n):
+        x = 50 * i
+        skew = 6 * (i % 3)
+        quads.append([[x + skew, 0], [x + 40, 0], [x + 40 - skew, 60], [x, 60]])
+    return np.float32(quads)
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return np.random.default_rng(0).integers(0, 256, (70, 50 * 40, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('indices', [[0], [3, 1, 2], [39, 0, 20, 21, 20], list(range(40)), [5, 12, 30]])
+def test_indexed_extract_matches_full_extract(frame, indices):
+    warper = SpotWarper(_quads(40))
+    assert np.array_equal(warper.extract(frame, indices), warper.extract(frame)[indices])
+
+
+def test_remaps_are_split_when_layout_exceeds_remap_rows(frame, monkeypatch):
+    warper = SpotWarper(_quads(40))
+    monkeypatch.setattr(warper, 'spots_per_remap', 3)
+    expected = SpotWarper(_quads(40)).extract(frame)
+    assert np.array_equal(warper.extract(frame), expected)
+    assert np.array_equal(warper.extract(frame, [2, 3, 4, 17]), expected[[2, 3, 4, 17]])
+
+
+def test_empty_layout():
+    warper = SpotWarper([])
+    assert warper.extract(np.zeros((10, 10, 3), dtype=np.uint8)).shape == (0, 15, 15, 3)
+
+
+def test_supersample_is_capped_by_map_memory(monkeypatch):
+    quads = _quads(40)
+    assert SpotWarper.supersample_for(quads) == 5  # lado mayor ~60 px / 15
+    per_spot = 15 * 15 * spot_warp.MAP_BYTES_PER_SAMPLE
+    monkeypatch.setattr(spot_warp, 'MAX_MAPS_BYTES', 40 * per_spot * 4)
+    assert SpotWarper.supersample_for(quads) == 2
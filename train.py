@@ -0,0 +1,203 @@
+"""
+    Entrenamiento del clasificador de spots (model.p) a partir de frames grabados.
+
+    Las etiquetas pueden venir de un CSV con columnas frame,spot,label (label: empty / not_empty,
+    o 0 / 1 como las predicciones del modelo) o de un occupancy.npy (frames x spots, True = ocupado)
+    como el que escribe synthetic.py.
+
+    Los recortes se agregan a un dataset (dataset_store.CropDataset), de modo que se pueden
+    acumular varios sitios y reentrenar sin volver a leer los frames.
+
+    Ejemplos:
+        python train.py --mask mask.png --frames grabacion/ --labels labels.csv --site centro
+        python train.py --mask /tmp/lot/mask.png --frames /tmp/lot/frames --occupancy /tmp/lot/occupancy.npy --frame-step 10
+        python train.py --mask mask.png --frames grabacion/ --labels labels.csv --polygons   # en angulo
+        python train.py --dataset dataset/   # solo reentrenar con lo ya acumulado
+    """
+
+import argparse
+import csv
+import os
+import pickle
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.svm import SVC
+
+from dataset_store import CropDataset
+from frame_source import IMAGE_EXTENSIONS
+from parking_manager3 import load_components
+from spot_warp import SpotWarper, get_parking_spots_quads
+from util import MODEL_PATH, N_FEATURES, crops_to_features, get_parking_spots_bboxes, spot_crop
+
+LABEL_EMPTY = 0
+LABEL_NOT_EMPTY = 1
+LABEL_NAMES = {'empty': LABEL_EMPTY, 'not_empty': LABEL_NOT_EMPTY, '0': LABEL_EMPTY, '1': LABEL_NOT_EMPTY}
+
+PARAM_GRID = {'gamma': [0.01, 0.001, 0.0001], 'C': [1, 10, 100, 1000]}
+
+
+def read_labels_csv(path, frames_dir):
+    """Devuelve una lista de (ruta_frame, spot, etiqueta)."""
+    samples = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            label = LABEL_NAMES.get(row['label'].strip().lower())
+            if label is None:
+                raise ValueError(f"Etiqueta desconocida en {path}: {row['label']}")
+            samples.append((os.path.join(frames_dir, row['frame']), int(row['spot']), label))
+    return samples
+
+
+def read_occupancy(path, frames_dir, frame_step=1):
+    occupancy = np.load(path)
+    files = sorted(f for f in os.listdir(frames_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if len(files) != len(occupancy):
+        raise ValueError(f"{path} tiene {len(occupancy)} frames pero {frames_dir} tiene {len(files)} imagenes")
+
+    samples = []
+    for i in range(0, len(files), frame_step):
+        frame_path = os.path.join(frames_dir, files[i])
+        for spot, occupied in enumerate(occupancy[i]):
+            samples.append((frame_path, spot, LABEL_NOT_EMPTY if occupied else LABEL_EMPTY))
+    return samples
+
+
+def _extract_frame(frame_path, spots, jobs, dataset_path, quads=None, supersample=None):
+    # Se ejecuta en un proceso trabajador: escribe sus recortes directamente en el memmap
+    frame = cv2.imread(frame_path, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise IOError(f"No se pudo leer {frame_path}")
+    dataset = CropDataset.open(dataset_path, mode='r+')
+    rows = [row for row, _ in jobs]
+    if quads is not None:
+        # Mismo recorte rectificado que parking_manager3 --polygons: el supermuestreo es el del
+        # layout completo, no el de los spots de este frame
+        crops = SpotWarper([quads[spot] for _, spot in jobs], supersample).extract(frame)
+    else:
+        crops = np.stack([spot_crop(frame[y:y + h, x:x + w]) for x, y, w, h in (spots[spot] for _, spot in jobs)])
+    dataset.write_rows(rows, crops)
+    dataset.flush()
+    return len(jobs)
+
+
+def build_dataset(samples, spots, dataset_path, site='', n_jobs=-1, quads=None):
+    """
+    Recorta y agrega todas las muestras al dataset en paralelo, un frame por tarea.
+    Con quads (spot_warp) los recortes son los rectificados en lugar de los bboxes.
+
+    Devuelve el dataset abierto en solo lectura.
+    """
+    if os.path.exists(os.path.join(dataset_path, 'info.json')):
+        dataset = CropDataset.open(dataset_path, mode='r+')
+    else:
+        dataset = CropDataset.create(dataset_path, capacity=len(samples))
+
+    # Etiquetas y recortes van a filas reservadas; el conteo y los metadatos solo se confirman si
+    # todos los trabajadores terminan, asi un frame ilegible no deja recortes en cero con etiqueta
+    start = dataset.allocate(len(samples))
+    rows = np.arange(start, start + len(samples))
+    labels = np.array([label for _, _, label in samples], dtype=np.uint8)
+    dataset.write_rows(rows, labels=labels)
+    dataset.flush()
+
+    by_frame = defaultdict(list)
+    for row, (frame_path, spot, _) in zip(rows, samples):
+        by_frame[frame_path].append((int(row), spot))
+
+    supersample = SpotWarper.supersample_for(quads) if quads is not None else None
+    Parallel(n_jobs=n_jobs)(delayed(_extract_frame)(frame_path, spots, jobs, dataset_path, quads, supersample)
+                            for frame_path, jobs in by_frame.items())
+
+    dataset.append_meta(rows, site, [os.path.basename(f) for f, _, _ in samples], [s for _, s, _ in samples])
+    dataset.commit(start, len(samples))
+    return CropDataset.open(dataset_path)
+
+
+def build_features(dataset, features_path, chunk=65536):
+    """Convierte los recortes del dataset en la matriz de entrada del modelo, en un memmap .npy."""
+    features = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float32,
+                                         shape=(len(dataset), N_FEATURES))
+    for start in range(0, len(dataset), chunk):
+        features[start:start + chunk] = crops_to_features(dataset.crops[start:start + chunk])
+    features.flush()
+    del features
+    return np.load(features_path, mmap_mode='r'), np.asarray(dataset.labels, dtype=np.int64)
+
+
+def train(X, y, n_jobs=-1, cv=5, test_size=0.2, seed=0):
+    """Busqueda de hiperparametros con validacion cruzada en paralelo y evaluacion en un conjunto aparte."""
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, shuffle=True,
+                                                        stratify=y, random_state=seed)
+    search = GridSearchCV(SVC(), PARAM_GRID, cv=cv, n_jobs=n_jobs)
+    search.fit(X_train, y_train)
+
+    y_pred = search.best_estimator_.predict(X_test)
+    report = {
+        'best_params': search.best_params_,
+        'cv_accuracy': float(search.best_score_),
+        'test_accuracy': float(accuracy_score(y_test, y_pred)),
+        'report': classification_report(y_test, y_pred, labels=[LABEL_EMPTY, LABEL_NOT_EMPTY],
+                                        target_names=['empty', 'not_empty'], zero_division=0),
+    }
+    return search.best_estimator_, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena model.p a partir de frames etiquetados")
+    parser.add_argument('--mask', help='Mascara con los spots marcados')
+    parser.add_argument('--frames', help='Directorio con los frames grabados')
+    labels = parser.add_mutually_exclusive_group()
+    labels.add_argument('--labels', help='CSV con columnas frame,spot,label')
+    labels.add_argument('--occupancy', help='occupancy.npy (frames x spots, True = ocupado)')
+    parser.add_argument('--frame-step', type=int, default=1, help='Usar uno de cada N frames (solo --occupancy)')
+    parser.add_argument('--polygons', action='store_true',
+                        help='Recortes rectificados de los cuadrilateros de la mascara (parking_manager3 --polygons)')
+    parser.add_argument('--dataset', default='dataset', help='Directorio del dataset de recortes')
+    parser.add_argument('--site', default='', help='Sitio al que pertenecen los frames')
+    parser.add_argument('--features', default='features.npy', help='Matriz de caracteristicas (memmap .npy)')
+    parser.add_argument('--out', default=MODEL_PATH)
+    parser.add_argument('--jobs', type=int, default=-1, help='Procesos para extraccion y validacion cruzada')
+    parser.add_argument('--cv', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.labels or args.occupancy:
+        if not (args.mask and args.frames):
+            parser.error("--labels/--occupancy requieren --mask y --frames")
+        components = load_components(args.mask)
+        spots = get_parking_spots_bboxes(components)
+        quads = get_parking_spots_quads(components) if args.polygons else None
+        if args.labels:
+            samples = read_labels_csv(args.labels, args.frames)
+        else:
+            samples = read_occupancy(args.occupancy, args.frames, args.frame_step)
+        if not samples:
+            parser.error("No hay muestras etiquetadas")
+
+        t0 = time.perf_counter()
+        dataset = build_dataset(samples, spots, args.dataset, args.site, args.jobs, quads)
+        print(f"{len(samples)} recortes agregados a {args.dataset} en {time.perf_counter() - t0:.1f} s")
+    else:
+        dataset = CropDataset.open(args.dataset)
+
+    t1 = time.perf_counter()
+    X, y = build_features(dataset, args.features)
+    print(f"{len(y)} muestras ({np.sum(y == LABEL_EMPTY)} vacias) -> {args.features}")
+
+    model, report = train(X, y, args.jobs, args.cv)
+    print(f"Entrenado en {time.perf_counter() - t1:.1f} s, mejores parametros {report['best_params']}")
+    print(f"Exactitud CV {report['cv_accuracy']:.4f}, prueba {report['test_accuracy']:.4f}")
+    print(report['report'])
+
+    with open(args.out, 'wb') as f:
+        pickle.dump(model, f)
+    print(f"Modelo guardado en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
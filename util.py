@@ -1,6 +1,5 @@
 import pickle
 
-from skimage.transform import resize
 import numpy as np
 import cv2
 
@@ -8,33 +7,177 @@ import cv2
 EMPTY = True
 NOT_EMPTY = False
 
-MODEL = pickle.load(open("model.p", "rb"))
+MODEL_PATH = "model.p"
+CROP_SIZE = (15, 15, 3)
+N_FEATURES = CROP_SIZE[0] * CROP_SIZE[1] * CROP_SIZE[2]
+CHUNK_SIZE = 64  # spots por tarea cuando se reparte el trabajo en un pool de hilos
 
-def empty_or_not(spot_bgr: np.ndarray) -> bool:
-    # Redimensionar y asegurar tipo
-    img_resized = resize(spot_bgr, (15, 15, 3), anti_aliasing=True)
-    img_resized = np.asarray(img_resized, dtype=np.float32)  # Asegura que sea ndarray
+# Se carga en el primer uso, para que train.py pueda importar este modulo sin un model.p previo
+MODEL = None
+
+
+def load_model(path):
+    # model.npz (numpy_model.py) se evalua solo con NumPy; model.p necesita scikit-learn
+    if path.endswith(".npz"):
+        from numpy_model import NumpyModel
+        return NumpyModel.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def get_model():
+    global MODEL
+    if MODEL is None:
+        MODEL = load_model(MODEL_PATH)
+    return MODEL
+
+
+def _linear_axis(n_in, n_out):
+    # Interpolacion lineal con centros de pixel y bordes en espejo, como skimage (ndi.zoom, grid_mode)
+    pos = (np.arange(n_out) + 0.5) * (n_in / n_out) - 0.5
+    i0 = np.floor(pos).astype(np.intp)
+    weight = pos - i0
+    if n_in == 1:
+        return np.zeros_like(i0), np.zeros_like(i0), weight
+    period = 2 * (n_in - 1)
+    i0, i1 = np.abs(i0) % period, np.abs(i0 + 1) % period
+    return np.where(i0 >= n_in, period - i0, i0), np.where(i1 >= n_in, period - i1, i1), weight
+
+
+def resize_spot(spot_bgr: np.ndarray) -> np.ndarray:
+    # Equivalente a skimage.transform.resize(spot_bgr, CROP_SIZE, anti_aliasing=True) pero en escala 0..255:
+    # suavizado gaussiano con sigma = (factor - 1) / 2 y luego interpolacion bilineal.
+    # El filtro lee el uint8 directamente; no se hace una copia float del recorte completo
+    h, w = spot_bgr.shape[:2]
+    img = spot_bgr
+    sigma_y = max(0.0, (h / CROP_SIZE[0] - 1) / 2)
+    sigma_x = max(0.0, (w / CROP_SIZE[1] - 1) / 2)
+    if sigma_x > 0 or sigma_y > 0:
+        kernels = [cv2.getGaussianKernel(2 * int(4 * s + 0.5) + 1, s, cv2.CV_64F) if s > 0 else np.ones((1, 1))
+                   for s in (sigma_x, sigma_y)]
+        img = cv2.sepFilter2D(img, cv2.CV_64F, kernels[0], kernels[1], borderType=cv2.BORDER_REFLECT_101)
+        img = img.reshape(h, w, -1)
+
+    r0, r1, wr = _linear_axis(h, CROP_SIZE[0])
+    c0, c1, wc = _linear_axis(w, CROP_SIZE[1])
+    wr, wc = wr[:, None, None], wc[None, :, None]
+    rows = img[r0] * (1 - wr) + img[r1] * wr
+    return rows[:, c0] * (1 - wc) + rows[:, c1] * wc
+
+
+def spot_crop(spot_bgr: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    # Recorte uint8 (15x15x3): la entrada del modelo y lo que se guarda en los datasets
+    resized = resize_spot(spot_bgr)
+    if out is None:
+        out = np.empty(CROP_SIZE, dtype=np.uint8)
+    np.rint(resized, out=resized)
+    np.copyto(out, resized, casting='unsafe')
+    return out
+
+
+def _crop_chunk(frame, boxes, out):
+    for (x, y, w, h), row in zip(boxes, out):
+        spot_crop(frame[y:y + h, x:x + w], out=row)
+
+
+def _chunks(n, chunk_size):
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
 
-    flat_data = np.array([img_resized.flatten()])  # Ahora sí, sin advertencias
 
-    y_output = MODEL.predict(flat_data)
+def extract_crops(frame: np.ndarray, boxes, pool=None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    # Recortes uint8 (N, 15, 15, 3) en el orden de boxes. Con un pool (concurrent.futures) cada
+    # bloque de spots escribe en sus propias filas, asi que el resultado no depende del orden de los hilos
+    crops = np.empty((len(boxes),) + CROP_SIZE, dtype=np.uint8)
+    if pool is None or len(boxes) <= chunk_size:
+        _crop_chunk(frame, boxes, crops)
+        return crops
+    futures = [pool.submit(_crop_chunk, frame, boxes[start:end], crops[start:end])
+               for start, end in _chunks(len(boxes), chunk_size)]
+    for future in futures:
+        future.result()
+    return crops
+
+
+def classify_crops(model, crops: np.ndarray, pool=None, chunk_size: int = CHUNK_SIZE, with_confidence=False):
+    # Vacio (True) / ocupado por recorte; con un pool, un predict por bloque y resultados en orden.
+    # with_confidence: devuelve (vacio, confianza) con predict_with_confidence
+    if len(crops) == 0:
+        empty = np.zeros(0, dtype=bool)
+        return (empty, np.zeros(0)) if with_confidence else empty
+    if with_confidence:
+        def predict(chunk):
+            y_output, confidence = predict_with_confidence(model, model_input(model, chunk))
+            return y_output == 0, confidence
+    else:
+        def predict(chunk):
+            return model.predict(model_input(model, chunk)) == 0
+    if pool is None or len(crops) <= chunk_size:
+        return predict(crops)
+    futures = [pool.submit(predict, crops[start:end]) for start, end in _chunks(len(crops), chunk_size)]
+    results = [future.result() for future in futures]
+    if with_confidence:
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+    return np.concatenate(results)
+
+
+def crops_to_features(crops: np.ndarray) -> np.ndarray:
+    # Lote de recortes uint8 (N, 15, 15, 3) -> matriz de entrada de un modelo de scikit-learn (N, 675)
+    return np.asarray(crops, dtype=np.float32).reshape(len(crops), N_FEATURES) / 255
+
+
+def model_input(model, crops: np.ndarray) -> np.ndarray:
+    # Los modelos exportados con la escala 1/255 en los pesos (pixel_input) reciben los uint8 tal cual
+    if getattr(model, "pixel_input", False):
+        return np.asarray(crops, dtype=np.uint8).reshape(len(crops), N_FEATURES)
+    return crops_to_features(crops)
+
+
+def empty_or_not(spot_bgr: np.ndarray) -> bool:
+    model = get_model()
+    flat_data = model_input(model, spot_crop(spot_bgr)[np.newaxis])
+
+    y_output = model.predict(flat_data)
     return y_output[0] == 0
 
 
+def empty_or_not_batch(spots_bgr) -> np.ndarray:
+    # Misma clasificacion que empty_or_not pero con una sola llamada a predict
+    if len(spots_bgr) == 0:
+        return np.zeros(0, dtype=bool)
+
+    crops = np.empty((len(spots_bgr),) + CROP_SIZE, dtype=np.uint8)
+    for i, spot_bgr in enumerate(spots_bgr):
+        spot_crop(spot_bgr, out=crops[i])
+
+    model = get_model()
+    y_output = model.predict(model_input(model, crops))
+    return y_output == 0
+
+
+def predict_with_confidence(model, flat_data: np.ndarray):
+    # Prediccion (0 = vacio) y confianza en [0.5, 1] a partir de predict_proba o de la distancia al margen
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(flat_data)
+        y_output = model.classes_[np.argmax(proba, axis=1)]
+        return y_output, proba.max(axis=1)
+
+    # Sin probabilidades: sigmoide de la distancia al hiperplano (en el margen, |d| = 1, da ~0.88)
+    decision = model.decision_function(flat_data)
+    y_output = model.classes_[(decision > 0).astype(np.intp)]
+    return y_output, 1.0 / (1.0 + np.exp(-2 * np.abs(decision)))
 
 
 def get_parking_spots_bboxes(connected_components):
     (totalLabels, label_ids, values, centroid) = connected_components
 
     slots = []
-    coef = 1
     for i in range(1, totalLabels):
 
         # Now extract the coordinate points
-        x1 = int(values[i, cv2.CC_STAT_LEFT] * coef)
-        y1 = int(values[i, cv2.CC_STAT_TOP] * coef)
-        w = int(values[i, cv2.CC_STAT_WIDTH] * coef)
-        h = int(values[i, cv2.CC_STAT_HEIGHT] * coef)
+        x1 = int(values[i, cv2.CC_STAT_LEFT])
+        y1 = int(values[i, cv2.CC_STAT_TOP])
+        w = int(values[i, cv2.CC_STAT_WIDTH])
+        h = int(values[i, cv2.CC_STAT_HEIGHT])
 
         slots.append([x1, y1, w, h])
 
@@ -0,0 +1,80 @@
+import json
+
+import cv2
+import numpy as np
+
+
+NO_ZONE = 0
+
+ZONE_COLORS = {
+    "entrada": (255, 0, 0),
+    "salida": (0, 255, 255),
+}
+DEFAULT_COLOR = (255, 255, 255)
+
+
+class ZoneMap:
+    """
+    Mapa de zonas rasterizado una sola vez en una imagen de etiquetas.
+
+    Cada pixel guarda el id de la zona que lo contiene (0 = ninguna), de modo que
+    clasificar cualquier cantidad de centroides es una sola indexacion de arreglo.
+
+    zones (list): Lista de dicts con "id", "name", "tipo" y "polygon" ([[x, y], ...]); una zona de
+        entrada puede traer "capacity" (spots a los que da acceso) para su rotacion en /analytics
+    width, height (int): Resolucion del frame
+    """
+
+    def __init__(self, zones, width, height):
+        self.width = width
+        self.height = height
+        self.zones = {int(z["id"]): z for z in zones}
+
+        if any(zone_id <= NO_ZONE for zone_id in self.zones):
+            raise ValueError("Los ids de zona deben ser mayores que 0")
+
+        dtype = np.uint8 if max(self.zones, default=0) < 256 else np.uint16
+        self.labels = np.zeros((height, width), dtype=dtype)
+        # Si dos zonas se solapan gana la que aparece despues en la configuracion
+        for zone_id, zone in self.zones.items():
+            polygon = np.asarray(zone["polygon"], dtype=np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(self.labels, [polygon], int(zone_id))
+
+        # Tablas id -> tipo / nombre para traducir etiquetas sin recorrer las zonas
+        self.kinds = np.array([None] * (max(self.zones, default=0) + 1), dtype=object)
+        self.names = np.array([None] * (max(self.zones, default=0) + 1), dtype=object)
+        for zone_id, zone in self.zones.items():
+            self.kinds[zone_id] = zone.get("tipo")
+            self.names[zone_id] = zone.get("name", str(zone_id))
+
+    @classmethod
+    def from_config(cls, path, width, height):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config["zones"], width, height)
+
+    def lookup(self, xs, ys):
+        """Devuelve los ids de zona de los puntos (xs, ys); 0 si estan fuera de toda zona o del frame."""
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        ids = np.zeros(xs.shape, dtype=self.labels.dtype)
+        ids[inside] = self.labels[ys[inside], xs[inside]]
+        return ids
+
+    def kind(self, zone_ids):
+        """Traduce ids de zona a su tipo ("entrada", "salida", ...) o None."""
+        return self.kinds[np.asarray(zone_ids, dtype=np.intp)]
+
+    def name(self, zone_ids):
+        """Traduce ids de zona a su nombre o None."""
+        return self.names[np.asarray(zone_ids, dtype=np.intp)]
+
+    def draw(self, frame):
+        for zone in self.zones.values():
+            color = ZONE_COLORS.get(zone.get("tipo"), DEFAULT_COLOR)
+            polygon = np.asarray(zone["polygon"], dtype=np.int32).reshape(-1, 1, 2)
+            cv2.polylines(frame, [polygon], True, color, 2)
+            x, y = polygon[:, 0, 0].min(), polygon[:, 0, 1].min()
+            cv2.putText(frame, zone.get("name", str(zone["id"])), (int(x), int(y) - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)